@@ -0,0 +1,27 @@
+###################################################################
+#
+# Benchmarks for the genotyping algorithm. They run against
+# synthetic genomes so that the input size can be dialed up
+# and down without needing real assemblies.
+#
+# This tool is a sample and distillation of the real application
+# hosted at: https://github.com/theMPatel/functional_genomics_tools
+#
+# Author: Milan Patel
+# Contact: https://github.com/theMPatel
+# Version 1.0
+#
+###################################################################
+
+import os
+import sys
+
+# The genotyping modules import the tools the same way the
+# application does, so put the application on the path
+base_path = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.realpath(__file__))),
+    'genomics_tools'
+)
+
+if base_path not in sys.path:
+    sys.path.append(base_path)
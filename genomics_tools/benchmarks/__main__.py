@@ -0,0 +1,106 @@
+###################################################################
+#
+# Runs the benchmarks from the commandline:
+#
+#   python -m benchmarks --output before.json
+#   python -m benchmarks --output after.json --compare before.json
+#
+# This tool is a sample and distillation of the real application
+# hosted at: https://github.com/theMPatel/functional_genomics_tools
+#
+# Author: Milan Patel
+# Contact: https://github.com/theMPatel
+# Version 1.0
+#
+###################################################################
+
+import argparse
+import sys
+
+from .suite import (
+    BENCHMARKS, run_suite,
+    save_results, load_results,
+    compare_results
+)
+
+def parse_cmdline():
+
+    parser = argparse.ArgumentParser(prog='python -m benchmarks')
+
+    parser.add_argument('--only', action='append',
+        choices=[benchmark.name for benchmark in BENCHMARKS],
+        help='Only run this benchmark, can be given more than once')
+
+    parser.add_argument('--quick', default=False, action='store_true',
+        help='Run tiny inputs just to make sure everything works')
+
+    parser.add_argument('--repeat',
+        help='How many times to time each benchmark', type=int, default=5)
+
+    parser.add_argument('--seed',
+        help='Seed for the synthetic genomes', type=int, default=0)
+
+    parser.add_argument('--output',
+        help='Save the results as json to this path', type=str)
+
+    parser.add_argument('--compare',
+        help='Compare against results saved by an earlier run', type=str)
+
+    parser.add_argument('--threshold',
+        help='How much slower or bigger counts as a regression',
+        type=float, default=0.1)
+
+    return parser.parse_args()
+
+def format_bytes(size):
+    for unit in ['B', 'KB', 'MB']:
+        if size < 1024.:
+            return '{:.1f} {}'.format(size, unit)
+
+        size /= 1024.
+
+    return '{:.1f} GB'.format(size)
+
+def report(result):
+    extra = ''.join(' {}={:.2f}'.format(key, value) \
+        for key, value in sorted(result.extra.items()))
+
+    print('{:<24} {:>9} {:>12.4g} {}/s {:>10.2f} ms {:>10}{}'.format(
+        result.name, result.size, result.throughput, result.unit,
+        result.best_seconds * 1000., format_bytes(result.peak_bytes), extra))
+
+    sys.stdout.flush()
+
+def main():
+    args = parse_cmdline()
+
+    print('{:<24} {:>9} {:>20} {:>13} {:>10}'.format(
+        'benchmark', 'size', 'throughput', 'best', 'peak mem'))
+
+    results = run_suite(names=args.only, quick=args.quick,
+        repeat=args.repeat, seed=args.seed, report=report)
+
+    if args.output:
+        save_results(args.output, results, seed=args.seed)
+        print('Saved results to: {}'.format(args.output))
+
+    if not args.compare:
+        return 0
+
+    regressions = 0
+    print('')
+    print('Compared to: {}'.format(args.compare))
+
+    for result, speed, memory, regressed in compare_results(
+        load_results(args.compare), results, threshold=args.threshold):
+
+        print('{:<24} {:>9} {:>8.2f}x speed {:>8.2f}x memory{}'.format(
+            result.name, result.size, speed, memory,
+            '  REGRESSED' if regressed else ''))
+
+        regressions += regressed
+
+    return 1 if regressions else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,328 @@
+###################################################################
+#
+# The benchmarks themselves. Each one builds its input for a
+# given size up front, then gets timed on its own and measured
+# for peak memory in a separate run so the tracing doesn't skew
+# the timings.
+#
+# This tool is a sample and distillation of the real application
+# hosted at: https://github.com/theMPatel/functional_genomics_tools
+#
+# Author: Milan Patel
+# Contact: https://github.com/theMPatel
+# Version 1.0
+#
+###################################################################
+
+from collections import OrderedDict, namedtuple
+from datetime import datetime
+import gc
+import io
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+from tools.align import (
+    GenotypeHit, GenotypeResults
+)
+
+from tools.fancy_tools import edit_distance
+from tools.tools import fasta_iterator
+
+from genotyping.ab_detection import (
+    Genotype, eliminate_overlap,
+    find_mutations
+)
+
+from .synthetic import (
+    CALLABLE_KINDS, FRAGMENT,
+    blast_line, make_genome,
+    random_sequence
+)
+
+# The thresholds the mutation finder runs with by default
+_PERCENT_IDENTITY = 0.9
+_MIN_RELATIVE_COVERAGE = 0.6
+
+Benchmark = namedtuple('Benchmark', ['name', 'unit', 'sizes', 'quick_sizes',
+    'setup'])
+
+BenchmarkResult = namedtuple('BenchmarkResult', ['name', 'size', 'unit',
+    'units', 'best_seconds', 'mean_seconds', 'throughput', 'peak_bytes',
+    'extra'])
+
+def _hits(genome):
+    return GenotypeResults().load_hits(io.StringIO(genome.blast_report()),
+        'blast')
+
+def _validated(genome):
+    genotypes = Genotype.find_regions(_hits(genome), genome.contig_sizes,
+        genome.database)
+
+    return {reference: genotype for reference, genotype in genotypes.items() \
+        if genotype.validate(_PERCENT_IDENTITY, _MIN_RELATIVE_COVERAGE,
+            genome.contig_sizes, True)}
+
+def setup_fasta_iterator(size, seed):
+    # size is the genome size in bases
+    genome = make_genome(genome_size=size, contigs=max(2, size // 35000),
+        genes=0, seed=seed)
+    text = genome.fasta()
+
+    def run():
+        for _ in fasta_iterator(io.StringIO(text)):
+            pass
+
+    return run, genome.length, {}
+
+def setup_from_blast(size, seed):
+    # size is the number of hit lines
+    genome = make_genome(genome_size=100000, contigs=20, genes=50, seed=seed)
+    lines = [genome.hit_lines[i % len(genome.hit_lines)] \
+        for i in range(size)]
+
+    def run():
+        for line in lines:
+            GenotypeHit.from_blast(line)
+
+    return run, size, {}
+
+def setup_find_mutations(size, seed):
+    # size is the number of planted genes
+    genome = make_genome(genome_size=size * 50000, contigs=max(2, size * 2),
+        genes=size, seed=seed)
+    results = _hits(genome)
+
+    def run():
+        return find_mutations(genome.database, results,
+            _MIN_RELATIVE_COVERAGE)
+
+    # Report back how many of the planted mutations were found,
+    # slow and wrong isn't worth much
+    found = set()
+    for reference, calls in run().items():
+        for call in calls:
+            found.add((reference, call.position))
+
+    expected = [(planted.gene_id, planted.codon_position) for planted \
+        in genome.planted if planted.kind in CALLABLE_KINDS]
+
+    recall = sum(key in found for key in expected) / max(1, len(expected))
+
+    return run, len(results.hits), {'recall': recall}
+
+def setup_validate(size, seed):
+    # size is the number of short hits at contig edges on top of
+    # one gene that is split across two contigs, the way repeats
+    # at the ends of a messy assembly show up
+    genome = make_genome(genome_size=20000, contigs=2, genes=1, seed=seed,
+        kinds=(FRAGMENT,))
+
+    reference = genome.planted[0].gene_id
+    sequence = genome.database.sequences[reference]
+    reference_len = len(sequence)
+    contig_sizes = genome.contig_sizes
+
+    rng = random.Random(seed)
+    lines = list(genome.hit_lines)
+
+    for i in range(size):
+        length = rng.randint(reference_len // 10, reference_len // 4)
+        start = rng.randrange(reference_len - length)
+        contig_id = 'edge{}'.format(i)
+        contig_sizes[contig_id] = length + rng.randint(1000, 50000)
+
+        lines.append(blast_line(contig_id, reference, reference_len,
+            sequence[start:start+length], sequence[start:start+length],
+            1, start + 1, start + length))
+
+    hits = [GenotypeHit.from_blast(line) for line in lines]
+
+    def run():
+        genotype = Genotype(reference, reference_len, hits)
+        genotype.validate(_PERCENT_IDENTITY, _MIN_RELATIVE_COVERAGE,
+            contig_sizes, True)
+
+    return run, len(hits), {}
+
+def setup_eliminate_overlap(size, seed):
+    # size is the number of planted genes
+    genome = make_genome(genome_size=size * 50000, contigs=max(2, size * 2),
+        genes=size, seed=seed)
+    validated = _validated(genome)
+
+    def run():
+        return eliminate_overlap(validated, _MIN_RELATIVE_COVERAGE)
+
+    regions = sum(len(genotype.predicted) for genotype in validated.values())
+    return run, regions, {}
+
+def setup_edit_distance(size, seed):
+    # size is the length of the two strings
+    rng = random.Random(seed)
+    string_a = random_sequence(rng, size)
+    string_b = random_sequence(rng, size)
+
+    def run():
+        edit_distance(string_a, string_b)
+
+    # The work grows with the size of the matrix
+    return run, size * size, {}
+
+BENCHMARKS = [
+    Benchmark('fasta_iterator', 'bases', [500000, 2000000, 5000000],
+        [50000], setup_fasta_iterator),
+    Benchmark('GenotypeHit.from_blast', 'hits', [1000, 10000, 100000],
+        [500], setup_from_blast),
+    Benchmark('find_mutations', 'hits', [10, 50, 200],
+        [10], setup_find_mutations),
+    Benchmark('Genotype.validate', 'hits', [8, 32, 128],
+        [8], setup_validate),
+    Benchmark('eliminate_overlap', 'regions', [10, 50, 200],
+        [10], setup_eliminate_overlap),
+    Benchmark('edit_distance', 'cells', [100, 300, 1000],
+        [50], setup_edit_distance),
+]
+
+def peak_memory(func):
+    """
+    Returns back the most memory python had allocated at once
+    while running func, in bytes
+    """
+    gc.collect()
+    tracemalloc.start()
+
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+
+    finally:
+        tracemalloc.stop()
+
+    return peak
+
+def run_benchmark(benchmark, size, repeat=5, seed=0):
+    """
+    Times one benchmark at one size
+
+    :param benchmark: The `Benchmark` to run
+    :param size: The size of the input
+    :param repeat: How many times to time it, the best run counts
+    :param seed: The seed for the synthetic input
+    """
+
+    func, units, extra = benchmark.setup(size, seed)
+
+    # Warm up, and get anything lazy out of the way
+    func()
+
+    timings = []
+    for _ in range(max(1, repeat)):
+        gc.collect()
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+
+    best = min(timings)
+
+    return BenchmarkResult(
+        name = benchmark.name,
+        size = size,
+        unit = benchmark.unit,
+        units = units,
+        best_seconds = best,
+        mean_seconds = sum(timings) / len(timings),
+        throughput = units / best if best > 0 else float('inf'),
+        peak_bytes = peak_memory(func),
+        extra = extra
+    )
+
+def run_suite(names=None, quick=False, repeat=5, seed=0, report=None):
+    """
+    Runs all of the benchmarks, or just the ones asked for
+
+    :param names: The names of the benchmarks to run, all if None
+    :param quick: Use the small sizes, for making sure things work
+    :param repeat: How many times to time each one
+    :param seed: The seed for the synthetic inputs
+    :param report: Called with each result as it comes in
+    """
+
+    results = []
+
+    for benchmark in BENCHMARKS:
+        if names and benchmark.name not in names:
+            continue
+
+        sizes = benchmark.quick_sizes if quick else benchmark.sizes
+
+        for size in sizes:
+            result = run_benchmark(benchmark, size, repeat=repeat, seed=seed)
+            results.append(result)
+
+            if report is not None:
+                report(result)
+
+    return results
+
+def save_results(path, results, seed=0):
+    """
+    Saves the results so that a later run can be compared to them
+
+    :param path: Where to write the results
+    :param results: The `BenchmarkResult`s
+    :param seed: The seed the inputs were made with
+    """
+
+    with open(path, 'w') as f:
+        json.dump({
+            'created': datetime.now().isoformat(),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'seed': seed,
+            'results': [result._asdict() for result in results]
+        }, f, indent=4)
+
+def load_results(path):
+    """
+    Loads results saved by `save_results`
+    """
+    with open(path, 'r') as f:
+        saved = json.load(f)
+
+    return [BenchmarkResult(**result) for result in saved['results']]
+
+def compare_results(baseline, results, threshold=0.1):
+    """
+    Lines up the results with an earlier run
+
+    :param baseline: The earlier `BenchmarkResult`s
+    :param results: The new `BenchmarkResult`s
+    :param threshold: How much slower or bigger counts as a regression
+    :returns: A list of (result, throughput ratio, memory ratio,
+        regressed) for the results that were in both runs
+    """
+
+    earlier = OrderedDict(((result.name, result.size), result) \
+        for result in baseline)
+
+    comparisons = []
+
+    for result in results:
+        before = earlier.get((result.name, result.size))
+
+        if before is None:
+            continue
+
+        speed = result.throughput / before.throughput \
+            if before.throughput else 1.
+        memory = result.peak_bytes / before.peak_bytes \
+            if before.peak_bytes else 1.
+
+        regressed = speed < 1. - threshold or memory > 1. + threshold
+        comparisons.append((result, speed, memory, regressed))
+
+    return comparisons
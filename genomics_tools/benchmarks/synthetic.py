@@ -0,0 +1,404 @@
+###################################################################
+#
+# Synthetic genomes for the benchmarks. Target genes are planted
+# into random backgrounds with known point mutations, indels and
+# genes split across two contigs, along with the BLAST hits that
+# aligning the references against them would produce.
+#
+# This tool is a sample and distillation of the real application
+# hosted at: https://github.com/theMPatel/functional_genomics_tools
+#
+# Author: Milan Patel
+# Contact: https://github.com/theMPatel
+# Version 1.0
+#
+###################################################################
+
+from collections import OrderedDict, defaultdict, namedtuple
+from itertools import product
+import random
+
+from tools.tools import (
+    codon_translation, reverse_complement
+)
+
+from genotyping.mutation_finder import compile_target
+
+# Planted genes cycle through these
+MUTATION = 'mutation'
+INDEL = 'indel'
+REVERSE = 'reverse'
+FRAGMENT = 'fragment'
+WILDTYPE = 'wildtype'
+
+KINDS = (MUTATION, INDEL, REVERSE, FRAGMENT, WILDTYPE)
+
+# The kinds of genes that find_mutations should call
+CALLABLE_KINDS = frozenset([MUTATION, INDEL, REVERSE])
+
+# How many positions of interest each gene has, only the
+# first one is ever mutated
+_TARGETS_PER_GENE = 3
+
+# How much of each end the secondary hit for a gene is missing
+_SECONDARY_TRIM = 30
+
+_BLAST_FIELDS = 'query acc.ver, subject acc.ver, % identity,' \
+    ' alignment length, mismatches, gap opens, q. start, q. end,' \
+    ' s. start, s. end, evalue, bit score, query seq, subject seq'
+
+_CODONS = [''.join(codon) for codon in product('ACGT', repeat=3) \
+    if codon_translation(''.join(codon)) != 'X']
+
+# Maps random bytes onto nucleotides
+_NUCLEOTIDES = bytes.maketrans(bytes(range(256)), b'ACGT' * 64)
+
+PlantedGene = namedtuple('PlantedGene', [
+    'gene_id', 'kind', 'contig_ids', 'codon_position', 'resistance_aa'])
+
+def random_sequence(rng, length):
+    """
+    Returns back a random DNA sequence
+
+    :param rng: The `random.Random` to draw from
+    :param length: The length of the sequence
+    """
+    if length <= 0:
+        return ''
+
+    data = rng.getrandbits(8 * length).to_bytes(length, 'little')
+    return data.translate(_NUCLEOTIDES).decode()
+
+def random_gene(rng, codons):
+    """
+    Returns back a random open reading frame as a list of codons
+
+    :param rng: The `random.Random` to draw from
+    :param codons: The number of codons in the gene
+    """
+    return ['ATG'] + [rng.choice(_CODONS) for _ in range(codons - 1)]
+
+def blast_line(contig_id, gene_id, reference_len, query_aln, reference_aln,
+    query_start, reference_start, reference_stop):
+    """
+    Creates a line of BLAST tabular output for an alignment,
+    in the format that align_blast_nodb asks for.
+
+    :param contig_id: The contig the alignment is on
+    :param gene_id: The reference that was aligned
+    :param reference_len: The full length of the reference
+    :param query_aln: The aligned query, gaps included
+    :param reference_aln: The aligned reference, gaps included
+    :param query_start: Where the alignment starts on the contig
+    :param reference_start: BLAST's s. start
+    :param reference_stop: BLAST's s. end
+    """
+
+    matches = 0
+    mismatches = 0
+    gap_opens = 0
+    in_gap = False
+
+    for query_nuc, reference_nuc in zip(query_aln, reference_aln):
+        gap = query_nuc == '-' or reference_nuc == '-'
+
+        if gap and not in_gap:
+            gap_opens += 1
+
+        elif not gap:
+            if query_nuc == reference_nuc:
+                matches += 1
+            else:
+                mismatches += 1
+
+        in_gap = gap
+
+    query_len = len(query_aln) - query_aln.count('-')
+
+    return '\t'.join(map(str, [
+        contig_id,
+        '{}|{}'.format(gene_id, reference_len),
+        '{:.3f}'.format(100. * matches / len(query_aln)),
+        len(query_aln),
+        mismatches,
+        gap_opens,
+        query_start,
+        query_start + query_len - 1,
+        reference_start,
+        reference_stop,
+        '0.0',
+        '{:.1f}'.format(1.8 * matches - 3. * mismatches),
+        query_aln,
+        reference_aln
+    ]))
+
+def trimmed_line(contig_id, gene_id, reference_len, query_aln, reference_aln,
+    query_start, reference_start, reference_stop, trim):
+    """
+    The same alignment as `blast_line` with trim columns taken
+    off of both ends, the way a second, slightly worse way of
+    aligning the same reference would come back.
+    """
+
+    def ungapped(aln):
+        return len(aln) - aln.count('-')
+
+    direction = 1 if reference_start <= reference_stop else -1
+
+    return blast_line(
+        contig_id, gene_id, reference_len,
+        query_aln[trim:-trim],
+        reference_aln[trim:-trim],
+        query_start + ungapped(query_aln[:trim]),
+        reference_start + direction * ungapped(reference_aln[:trim]),
+        reference_stop - direction * ungapped(reference_aln[-trim:])
+    )
+
+class SyntheticDatabase(object):
+    """
+    Stands in for the mutation finder's database with just
+    what the genotyping code asks of it
+    """
+
+    def __init__(self):
+        self.sequences = OrderedDict()
+        self.targets = defaultdict(list)
+        self.rna_genes = set()
+
+    def get_reflen(self, seq_id):
+        return len(self.sequences[seq_id])
+
+class SyntheticGenome(object):
+
+    def __init__(self):
+        self.contigs = OrderedDict()
+        self.planted = []
+        self.hit_lines = []
+        self.database = SyntheticDatabase()
+
+    @property
+    def contig_sizes(self):
+        return {contig_id: len(sequence) for contig_id, sequence \
+            in self.contigs.items()}
+
+    @property
+    def length(self):
+        return sum(len(sequence) for sequence in self.contigs.values())
+
+    def fasta(self, width=80):
+        """
+        Returns back the genome as fasta text
+
+        :param width: How many bases to put on each line
+        """
+        lines = []
+
+        for contig_id, sequence in self.contigs.items():
+            lines.append('>' + contig_id)
+            lines.extend(sequence[i:i+width] for i in \
+                range(0, len(sequence), width))
+
+        return '\n'.join(lines) + '\n'
+
+    def blast_report(self):
+        """
+        Returns back the hits as BLAST's -outfmt 7 would write them
+        """
+        header = [
+            '# BLASTN 2.7.1+',
+            '# Query: synthetic',
+            '# Fields: ' + _BLAST_FIELDS,
+            '# {} hits found'.format(len(self.hit_lines))
+        ]
+
+        return '\n'.join(header + self.hit_lines) + '\n'
+
+def make_genome(genome_size=5000000, contigs=150, genes=20, gene_length=1200,
+    seed=0, kinds=KINDS):
+    """
+    Creates a synthetic assembly with target genes planted in
+    it. Every gene gets a few positions of interest, and
+    depending on its kind the first of them is mutated to a
+    resistance codon, mutated with an indel upstream of it,
+    mutated on the reverse strand, split across the ends of two
+    contigs or left alone. Every planted gene comes with its
+    BLAST hit and a second, trimmed hit over the same spot.
+
+    :param genome_size: Roughly how many bases of background
+    :param contigs: How many contigs to spread them over
+    :param genes: How many target genes to plant
+    :param gene_length: The length of each gene in bases
+    :param seed: The seed, the same seed gives the same genome
+    :param kinds: The kinds of genes to cycle through
+    """
+
+    rng = random.Random(seed)
+    genome = SyntheticGenome()
+    database = genome.database
+
+    codons = max(gene_length // 3, 60)
+    contigs = max(contigs, 2)
+
+    # What goes at the start, in the middle and at the end of
+    # each contig
+    heads = {}
+    tails = {}
+    inserts = defaultdict(list)
+    boundaries = list(range(contigs - 1))
+    rng.shuffle(boundaries)
+
+    for i in range(genes):
+        gene_id = 'gene{}'.format(i)
+        kind = kinds[i % len(kinds)]
+
+        reference = random_gene(rng, codons)
+        database.sequences[gene_id] = ''.join(reference)
+
+        positions = rng.sample(range(20, codons - 20), _TARGETS_PER_GENE)
+
+        for j, position in enumerate(positions):
+            reference_codon = reference[position - 1]
+            reference_aa = codon_translation(reference_codon)
+            resistance_codon = rng.choice([codon for codon in _CODONS \
+                if codon_translation(codon) != reference_aa])
+
+            database.targets[gene_id].append(compile_target(
+                gene_id = gene_id,
+                gene_name = gene_id,
+                codon_position = position,
+                reference_codon = [reference_codon],
+                reference_aa = [reference_aa],
+                resistance_aa = [codon_translation(resistance_codon)],
+                resistance = ['drug{}'.format(j)],
+                pm_ids = ['PM{}.{}'.format(i, j)],
+                coding_gene = True
+            ))
+
+            if j == 0:
+                planted_codon = resistance_codon
+
+        position = positions[0]
+        query = list(reference)
+
+        if kind != WILDTYPE:
+            query[position - 1] = planted_codon
+
+        query = ''.join(query)
+        reference = ''.join(reference)
+        query_aln = query
+        reference_aln = reference
+
+        if kind == INDEL:
+            # Somewhere upstream of the mutation, in frame
+            at = 3 * rng.randint(5, position - 6)
+
+            if i % 2:
+                inserted = random_sequence(rng, 3)
+                query_aln = query[:at] + inserted + query[at:]
+                reference_aln = reference[:at] + '---' + reference[at:]
+
+            else:
+                query_aln = query[:at] + '---' + query[at+3:]
+
+            query = query_aln.replace('-', '')
+
+        planted = PlantedGene(
+            gene_id = gene_id,
+            kind = kind,
+            contig_ids = [],
+            codon_position = position,
+            resistance_aa = None if kind == WILDTYPE else \
+                codon_translation(planted_codon)
+        )
+
+        genome.planted.append(planted)
+
+        if kind == FRAGMENT and boundaries:
+            # Split between the end of one contig and the
+            # start of the next, neither half covers enough
+            # of the gene to count on its own
+            boundary = boundaries.pop()
+            cut = 3 * rng.randint(int(codons * 0.42), int(codons * 0.58))
+
+            tails[boundary] = (planted, query_aln[:cut], reference_aln[:cut])
+            heads[boundary + 1] = (planted, query_aln[cut:],
+                reference_aln[cut:], cut)
+
+        else:
+            inserts[rng.randrange(contigs)].append(
+                (planted, query_aln, reference_aln))
+
+    base_size = max(genome_size // contigs, 2 * gene_length)
+
+    for index in range(contigs):
+        contig_id = 'contig{}'.format(index + 1)
+        background = int(base_size * rng.uniform(0.5, 1.5))
+        here = inserts[index]
+
+        # Split the background up around the planted genes
+        cuts = sorted(rng.randrange(background + 1) for _ in here)
+        cuts = [0] + cuts + [background]
+
+        parts = []
+        length = 0
+        pending = []
+
+        if index in heads:
+            planted, query_aln, reference_aln, cut = heads[index]
+            sequence = query_aln.replace('-', '')
+            pending.append((planted, query_aln, reference_aln, length + 1,
+                cut + 1, len(database.sequences[planted.gene_id])))
+            parts.append(sequence)
+            length += len(sequence)
+
+        for k, (planted, query_aln, reference_aln) in enumerate(here):
+            chunk = random_sequence(rng, cuts[k + 1] - cuts[k])
+            parts.append(chunk)
+            length += len(chunk)
+
+            reference_len = len(database.sequences[planted.gene_id])
+            sequence = query_aln.replace('-', '')
+
+            if planted.kind == REVERSE:
+                # BLAST hands back reverse hits on the plus strand
+                # of the query with the reference coordinates flipped
+                sequence = reverse_complement(sequence)
+                query_aln = reverse_complement(query_aln)
+                reference_aln = reverse_complement(reference_aln)
+                pending.append((planted, query_aln, reference_aln,
+                    length + 1, reference_len, 1))
+
+            else:
+                pending.append((planted, query_aln, reference_aln,
+                    length + 1, 1, reference_len))
+
+            parts.append(sequence)
+            length += len(sequence)
+
+        chunk = random_sequence(rng, cuts[-1] - cuts[-2])
+        parts.append(chunk)
+        length += len(chunk)
+
+        if index in tails:
+            planted, query_aln, reference_aln = tails[index]
+            pending.append((planted, query_aln, reference_aln, length + 1,
+                1, len(reference_aln) - reference_aln.count('-')))
+            parts.append(query_aln.replace('-', ''))
+
+        genome.contigs[contig_id] = ''.join(parts)
+
+        for planted, query_aln, reference_aln, query_start, \
+            reference_start, reference_stop in pending:
+
+            planted.contig_ids.append(contig_id)
+            reference_len = len(database.sequences[planted.gene_id])
+            hit = (contig_id, planted.gene_id, reference_len, query_aln,
+                reference_aln, query_start, reference_start, reference_stop)
+
+            genome.hit_lines.append(blast_line(*hit))
+
+            if planted.kind != FRAGMENT:
+                genome.hit_lines.append(trimmed_line(*hit,
+                    trim=_SECONDARY_TRIM))
+
+    return genome
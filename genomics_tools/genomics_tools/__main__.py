@@ -15,13 +15,12 @@
 
 import argparse
 from collections import namedtuple 
-import importlib
+import functools
 import json
 import os
 import sys
 import tempfile
-import traceback
-import uuid
+import threading
 
 this_file = os.path.realpath(__file__)
 base_path = os.path.dirname(this_file)
@@ -35,26 +34,50 @@ from tools.environment import (
     ResultWriter, log_message,
     log_progress, log_error,
     log_exception, log_algo_params,
-    get_stack_len, set_base_depth,
-    populate_syspath, find_directory_on_path,
+    get_stack_len, set_base_depth
 )
 
-from genotyping import mutation_finder
+from tools.discovery import (
+    ResolutionCache, ToolLocator
+)
+
+from tools.manifest import (
+    RunManifest, RUNNING,
+    DONE, FAILED
+)
+
+from tools.scheduler import (
+    WorkStealingPool, schedule_samples,
+    plan_threads, log_thread_plans,
+    load_calibration, save_calibration
+)
+
+from tools.progress import ProgressTracker
+from tools.registry import (
+    SpeciesRegistry, read_species_manifest
+)
+from tools.resources import (
+    peak_rss, summarize_metrics
+)
+from tools.scratch import ScratchSpace
+
+from tools.timing import Tracer
+
+# Everything else is imported where it's needed. A lot of short
+# runs get launched at once on the cluster and most of them only
+# ever need a small part of the tooling, so there's no sense in
+# paying for all of it on every start.
 
 MutationFinderSettings = namedtuple("Settings", [
     'query',
     'version',
     'database',
+    'acquired_database',
     'percent_identity',
     'min_relative_coverage'
 ])
 
 
-# When you run the python interpreter without the -O flag
-# the below __debug__ variable will be true.
-if __debug__:
-    import pdb
-
 class MyArgumentParser(argparse.ArgumentParser):
 
     # Override to split space based cmdline args that
@@ -73,27 +96,373 @@ def parse_cmdline():
     parser.add_argument('--tempdir',
         help='Temporary shared directory', type=str)
 
+    parser.add_argument('--scratchdir',
+        help='Memory backed directory for the temp files of each'
+        ' sample, /dev/shm if there is one', type=str)
+
+    parser.add_argument('--scratch-mb',
+        help='Most megabytes of temp files to keep in --scratchdir at'
+        ' once, the rest go in --tempdir. 0 always uses --tempdir',
+        type=int, default=1024)
+
     parser.add_argument('--resultsdir',
         help='Results directory', type=str)
 
     parser.add_argument('--databasedir',
-        help='Shared directory', type=str)
+        help='Directory with the pointfinder database, searched for on'
+        ' the path if not given', type=str)
+
+    parser.add_argument('--species',
+        help='Species of the samples that are not in --species-manifest',
+        type=str, default='escherichia_coli')
+
+    parser.add_argument('--species-manifest',
+        help='File with the file name and species of each sample,'
+        ' separated by a tab or a comma', type=str)
+
+    parser.add_argument('--species-genomes',
+        help='Directory with a directory of reference genomes for each'
+        ' species, used to detect the species of samples that are not'
+        ' in --species-manifest', type=str)
+
+    parser.add_argument('--acquired-db',
+        help='Directory with a database of acquired resistance genes to'
+        ' look for in the same alignment as the point mutations', type=str)
+
+    parser.add_argument('--blast-bin',
+        help='Directory with the BLAST+ executables, searched for on'
+        ' the path if not given', type=str)
+
+    parser.add_argument('--cachedir',
+        help='Cache directory shared between samples and runs, what'
+        ' is worth keeping between runs goes in ~/.cache/genomics_tools'
+        ' if not given', type=str)
+
+    parser.add_argument('--result-cache-mb',
+        help='Size limit in megabytes for cached sample results,'
+        ' 0 disables the cache', type=int, default=512)
+
+    parser.add_argument('--hitsdir',
+        help='Directory to keep the unfiltered alignment hits for'
+        ' each sample in', type=str)
+
+    parser.add_argument('--rethreshold', default=False, action='store_true',
+        help='Re-interpret the hits saved in --hitsdir instead of'
+        ' aligning again')
+
+    parser.add_argument('--percent-identity',
+        help='Minimum identity of an alignment', type=float, default=0.9)
+
+    parser.add_argument('--min-relative-coverage',
+        help='Minimum coverage of a reference gene', type=float,
+        default=0.6)
 
     parser.add_argument("--run", default=False, action="store_true")
 
+    parser.add_argument('--daemon',
+        help='Stay up and run samples sent to a unix socket at this path',
+        type=str)
+
+    parser.add_argument('--submit',
+        help='Send the samples to a daemon listening at this socket path',
+        type=str)
+
+    parser.add_argument('--stop-daemon', default=False, action='store_true',
+        help='Ask the daemon at --submit to shut down')
+
+    parser.add_argument('--workers',
+        help='Number of samples to run at once, picked from the'
+        ' number of threads and the queue if not given', type=int)
+
+    parser.add_argument('--query-shards',
+        help='Cut each sample into this many pieces and align them all'
+        ' at once, for getting one big sample through quickly',
+        type=int, default=1)
+
+    parser.add_argument('--reference-shards',
+        help='Split the references into this many pieces and align'
+        ' against them all at once, for large reference panels',
+        type=int, default=1)
+
+    parser.add_argument('--calibrate', default=False, action='store_true',
+        help='Time BLASTn on this machine before the run and keep the'
+        ' timings in --cachedir for deciding how to split up threads')
+
+    parser.add_argument('--calibrate-with',
+        help='Calibrate with this sample instead of one from the queue,'
+        ' needed with --daemon and --watch since they start without'
+        ' any samples', type=str)
+
+    parser.add_argument('--watch',
+        help='Keep watching this directory and run new samples as they'
+        ' show up', type=str)
+
+    parser.add_argument('--settle-time',
+        help='Seconds a watched file must stay unchanged before it is'
+        ' picked up', type=float, default=5.)
+
+    parser.add_argument('--resume', default=False, action='store_true',
+        help='Skip the samples that already finished in the run'
+        ' recorded in --resultsdir')
+
+    parser.add_argument('--profile', default=False, action='store_true',
+        help='Write a cProfile and memory allocation profile for each'
+        ' sample into the logs directory')
+
+    parser.add_argument('--profile-every',
+        help='Only profile every Nth sample', type=int, default=1)
+
+    parser.add_argument('--summarize-profiles',
+        help='Merge the sample profiles in this directory and print'
+        ' the slowest functions', type=str)
+
+    parser.add_argument('--debug', default=False, action='store_true',
+        help='Drop into the debugger if anything goes wrong')
+
+    parser.add_argument('samples', nargs='*',
+        help='Sample paths to --submit')
+
     args, remaining = parser.parse_known_args()
 
+    if args.rethreshold and not args.hitsdir:
+        parser.error('--rethreshold requires --hitsdir')
+
+    if args.calibrate_with:
+        args.calibrate = True
+
+    elif args.calibrate and (args.daemon or args.watch):
+        parser.error('--calibrate with --daemon or --watch requires'
+            ' --calibrate-with')
+
+    # Clients don't need any directories of their own
+    if args.submit or args.summarize_profiles:
+        return args, remaining
+
     # I will instruct you to use --run to do a test run of the software!
-    if args.run:
-        tempdir = tempfile.mkdtemp()
-        args.tempdir = os.path.join(tempdir, "tmp")
-        args.resultsdir = os.path.join(tempdir)
+    # A daemon can be pointed at real directories instead.
+    if args.run or args.daemon or args.watch:
+        if not args.resultsdir:
+            if args.resume:
+                parser.error('--resume requires the --resultsdir of the'
+                    ' run to resume')
+
+            args.resultsdir = tempfile.mkdtemp()
+
+        if not args.tempdir:
+            args.tempdir = os.path.join(args.resultsdir, "tmp")
     else:
         sys.exit(0)
 
     #return the arguments object
     return args, remaining
 
+def run_sample(query_path, base_settings, env, result_name=None,
+    profiler=None):
+    """
+    Runs the mutation finder on a single sample with its
+    own temp directory.
+
+    :param query_path: The path to the sample
+    :param base_settings: The settings shared by all samples
+    :param env: The environment shared by all samples
+    :param result_name: The file name for the results, a random
+        one is picked if not provided
+    :param profiler: A `SampleProfiler` if we are profiling
+    """
+
+    from genotyping import mutation_finder
+
+    settings = sample_settings(query_path, base_settings)
+
+    sample_env = env.copy()
+
+    # The scratch space goes away as soon as the results
+    # have been written
+    with ScratchSpace.current.sample(query_path) as tempdir:
+        sample_env.tempdir = tempdir
+
+        if profiler is None:
+            return mutation_finder.main(settings, sample_env,
+                result_name=result_name)
+
+        with profiler.profile(query_path):
+            return mutation_finder.main(settings, sample_env,
+                result_name=result_name)
+
+def sample_settings(query_path, base_settings):
+    """
+    Returns back the settings for a single sample, using the
+    database for its species.
+
+    :param query_path: The path to the sample
+    :param base_settings: The settings shared by all samples
+    """
+    return base_settings._replace(query=query_path,
+        database=SpeciesRegistry.current.database_for(query_path))
+
+def run_sample_safely(query_path, base_settings, env, profiler=None):
+    """
+    Runs a single sample and reports back whether it worked
+    instead of raising, so one bad sample doesn't stop the rest.
+    """
+    try:
+        run_sample(query_path, base_settings, env, profiler=profiler)
+
+    except Exception:
+        log_exception('Failed running sample: {}'.format(query_path))
+        return False
+
+    return True
+
+def watch_samples(args, env, submit, cache_dir, stop=None):
+    """
+    Watches the --watch directory and submits every new sample
+    that finishes arriving. Anything whose content was already
+    processed is skipped.
+
+    :param args: The parsed commandline arguments
+    :param env: The environment shared by all samples
+    :param submit: Called with a sample path and a completion callback
+    :param cache_dir: Where the ledger of processed samples is kept
+    :param stop: An optional `threading.Event` to stop watching
+    """
+    from tools.watcher import (
+        DirectoryWatcher, ContentLedger,
+        watch_directory
+    )
+
+    ledger = ContentLedger(os.path.join(cache_dir, 'processed.txt'))
+    log_message('Using ledger of {} processed samples at: {}'.format(
+        len(ledger), ledger.path))
+
+    watcher = DirectoryWatcher(args.watch, settle_time=args.settle_time)
+    watch_directory(watcher, ledger, submit, stop=stop)
+
+def user_cache_dir():
+    """
+    Returns back the cache directory for this user, where the
+    tools that were found, the BLASTn calibration and such are
+    kept between runs when no --cachedir is given
+    """
+    return os.path.join(os.environ.get('XDG_CACHE_HOME') or \
+        os.path.expanduser('~/.cache'), 'genomics_tools')
+
+def calibrate_threads(sample, base_settings, env):
+    """
+    Times BLASTn with a range of thread counts on a sample so
+    that the thread plans are based on this machine.
+
+    :param sample: The path to a representative sample
+    :param base_settings: The settings shared by all samples
+    :param env: The environment shared by all samples
+    """
+    from genotyping import mutation_finder
+    from tools.align import (
+        BLASTSettings, calibrate_blast
+    )
+
+    log_message('Calibrating BLASTn threads with: {}'.format(sample))
+
+    _, _, references = mutation_finder.load_references(
+        sample_settings(sample, base_settings))
+    subject = references.export_cached(env.cachedir)
+
+    blast_settings = BLASTSettings(
+        task='blastn',
+        identity=base_settings.percent_identity,
+        relative_minlen=0,
+        absolute_minlen=0,
+        include_sequences=True
+    )
+
+    thread_counts = [1]
+    while thread_counts[-1] * 2 <= env.threads:
+        thread_counts.append(thread_counts[-1] * 2)
+
+    thread_counts.append(env.threads)
+
+    return calibrate_blast(sample, subject, blast_settings, env,
+        thread_counts)
+
+def plan_workers(args, env, timings, costs=None):
+    """
+    Splits our threads between samples and BLASTn and returns
+    back how many samples to run at once. The BLASTn threads
+    are set on the environment for every sample to pick up.
+
+    :param args: The parsed commandline arguments
+    :param env: The environment shared by all samples
+    :param timings: The BLASTn calibration, if we have one
+    :param costs: The estimated cost of each queued sample, None
+        when they come in one at a time
+    """
+    plans = plan_threads(env.threads, costs=costs, timings=timings,
+        workers=args.workers)
+
+    log_thread_plans(plans, timings is not None)
+
+    env.blast_threads = plans[0].threads
+    return plans[0].workers
+
+def write_trace(env):
+    """
+    Writes the timeline of everything that ran so far, or of
+    what hasn't been written out yet if the trace is rotating
+    """
+    if Tracer.current.rotate_path is not None:
+        trace_path = Tracer.current.rotate()
+
+    else:
+        trace_path = Tracer.current.write(
+            os.path.join(env.logdir, 'trace.json'))
+
+    if trace_path is not None:
+        log_message("Wrote run timeline to: {}".format(trace_path))
+
+def write_run_summary(env, result_names):
+    """
+    Rolls the metrics of every sample up into percentiles so
+    that we know how much memory and cpu to ask for next time
+
+    :param env: The environment shared by all samples
+    :param result_names: The result names of the samples in the run
+    """
+    metrics = []
+
+    for result_name in result_names:
+        path = os.path.join(env.metricsdir, result_name)
+
+        # Samples that failed early might not have any
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                metrics.append(json.load(f))
+
+    summary = summarize_metrics(metrics)
+
+    # The samples share this process, so its memory can't be
+    # split up between them. It is the most the run needed.
+    summary['process_peak_rss'] = peak_rss()
+
+    summary_path = os.path.join(os.path.dirname(env.metricsdir),
+        'run_summary.json')
+
+    with open(summary_path, 'w') as f:
+        json.dump(summary, f, indent=4)
+
+    log_message("Wrote run summary for {} samples to: {}".format(
+        summary['samples'], summary_path))
+
+    if summary['process_peak_rss'] is not None:
+        log_message("process_peak_rss: {:.1f} MB".format(
+            summary['process_peak_rss'] / 1024. / 1024.), extra=1)
+
+    if 'blastn_max_rss' in summary:
+        blastn = summary['blastn_max_rss']
+        log_message("blastn_max_rss: median {:.1f} MB, p95 {:.1f} MB, max"
+            " {:.1f} MB".format(blastn['p50'] / 1024. / 1024.,
+                blastn['p95'] / 1024. / 1024.,
+                blastn['max'] / 1024. / 1024.), extra=1)
+
 def main_throw_args(args, remaining):
     # Actually calls the genotyping algorithm
 
@@ -101,59 +470,300 @@ def main_throw_args(args, remaining):
     env.setup(vars(args))
     initialize_logging(env.logdir)
     ResultWriter(env.resultsdir)
+
+    # Runs that don't end write their timeline out as they go
+    Tracer(rotate_path=os.path.join(env.logdir, 'trace.json') \
+        if args.daemon or args.watch else None)
     
     log_message('Initializing..')
-    
-    path = os.environ["PATH"]
-    database_dir = find_directory_on_path("pointfinder_db", path)
-    sequence_dir = find_directory_on_path("sequence_data", path)
-    ecoli_db_dir = os.path.join(database_dir, "escherichia_coli")
-    
+
+    # What is worth having on the next run is kept there even
+    # without a --cachedir. The exports and cached results of a
+    # run without one stay with the run.
+    cache_dir = env.cachedir or user_cache_dir()
+
+    if env.cachedir is None:
+        env.cachedir = os.path.join(env.tempdir, 'cache')
+
+    # Finding the tools and data is slow on network drives, remember
+    # where they were for the next run
+    locator = ToolLocator(_tools_dirs,
+        cache=ResolutionCache(os.path.join(cache_dir, 'discovery.json')),
+        bin_dir=args.blast_bin)
+
+    database_dir = env.databasedir or locator.directory("pointfinder_db")
+
+    detector = None
+
+    if args.species_genomes:
+        from tools.sketch import SketchIndex
+
+        # Sketching the references only happens the first time
+        detector = SketchIndex(args.species_genomes,
+            cache_path=os.path.join(cache_dir, 'species_sketches.json')
+            ).detect
+
+    # Each sample gets the database for its species when it runs
+    registry = SpeciesRegistry(database_dir,
+        samples=read_species_manifest(args.species_manifest) \
+            if args.species_manifest else None,
+        default=args.species,
+        detector=detector)
+
     base_settings = MutationFinderSettings(query="", version="1.0.0",
-                                            database=ecoli_db_dir,
-                                            percent_identity=0.9,
-                                            min_relative_coverage=0.6)
+                                            database=None,
+                                            acquired_database=args.acquired_db,
+                                            percent_identity=args.percent_identity,
+                                            min_relative_coverage=args.min_relative_coverage)
+
+    scratch = ScratchSpace(env.tempdir, memory_dir=args.scratchdir,
+        limit=args.scratch_mb * 1024 * 1024)
 
     log_message("Using temp directory: {}".format(env.tempdir))
+
+    if scratch.memory_dir is not None:
+        log_message("Using scratch directory: {} for up to {} MB".format(
+            scratch.memory_dir, args.scratch_mb))
+    log_message("Using cache directory: {}".format(env.cachedir))
     log_message("Using results directory: {}".format(env.resultsdir))
     log_message("Using database: {}".format(database_dir))
-    log_message("Using sequences from: {}".format(sequence_dir))
-    log_progress(0)
+    log_message("Found databases for species: {}".format(
+        ", ".join(registry.species)))
+
+    if args.acquired_db:
+        log_message("Using acquired gene database: {}".format(
+            args.acquired_db))
 
     # Set's the base depth for logging so that we can get tabbed log
     # files that mimic the execution flow of the program
     set_base_depth(-(get_stack_len()))
-    base_temp = env.tempdir
-    for file in os.listdir(sequence_dir):
-        query_path = os.path.join(sequence_dir, file)
-
-        settings = MutationFinderSettings(
-            query=query_path,
-
-            database=base_settings.database,
-            version=base_settings.version,
-            percent_identity=base_settings.percent_identity,
-            min_relative_coverage=base_settings.min_relative_coverage
-        )
-        env.tempdir = os.path.join(base_temp, str(uuid.uuid4()))
-    
-        # Actually, the below is a major refactor of the original
-        # project layout. Before we were actually dynamically importing
-        # the modules that a client wanted to run. This particular file
-        # served as the insertion point for any and all modules the client
-        # was aware it could run and which one in particular would come
-        # in as a cmdline argument. We would import that class dynamically
-        # and run it's main method.
-        mutation_finder.main(settings, env)
-        log_message("")
 
-        
-    # And we are done!
-    log_progress(100)
-    log_message('Done running algorithm: {}!'.format(
-        "Mutation Finder"))
-    log_message("You can find the json formatted version of these "
-            "results at: {}".format(env.resultsdir))
+    calibration_path = os.path.join(cache_dir, 'blast_calibration.json')
+    timings = load_calibration(calibration_path)
+
+    if timings is not None:
+        log_message("Using BLASTn calibration from: {}".format(
+            calibration_path))
+
+    profiler = None
+
+    if args.profile:
+        from tools.profiling import SampleProfiler
+
+        profiler = SampleProfiler(os.path.join(env.logdir, 'profiles'),
+            every=args.profile_every)
+        log_message("Profiling every {} sample(s) into: {}".format(
+            args.profile_every, profiler.directory))
+
+    try:
+        if args.daemon or args.watch:
+            from genotyping import mutation_finder
+
+            # Load the database up front so the first sample
+            # doesn't have to wait for it. The other species are
+            # loaded when their first sample comes in.
+            if registry.default in registry.species:
+                mutation_finder.load_references(base_settings._replace(
+                    database=registry.database(registry.default)))
+
+            if args.calibrate:
+                timings = calibrate_threads(args.calibrate_with, base_settings,
+                    env)
+                save_calibration(calibration_path, timings)
+
+            workers = plan_workers(args, env, timings)
+
+        if args.daemon:
+            from tools.daemon import SampleServer
+
+            server = SampleServer(
+                args.daemon,
+                functools.partial(run_sample, base_settings=base_settings,
+                    env=env, profiler=profiler),
+                workers=workers
+            )
+
+            if args.watch:
+                # Samples dropped into the watched directory go
+                # through the same workers as the socket
+                def submit(query_path, done):
+                    server.submit(query_path, lambda response:
+                        done(response['status'] == 'done'))
+
+                stop = threading.Event()
+                watcher = threading.Thread(target=watch_samples,
+                    args=(args, env, submit, cache_dir, stop), daemon=True)
+                watcher.start()
+
+            try:
+                server.serve()
+            finally:
+                if args.watch:
+                    stop.set()
+
+                write_trace(env)
+
+            return
+
+        if args.watch:
+            from concurrent.futures import ThreadPoolExecutor
+
+            pool = ThreadPoolExecutor(max_workers=workers,
+                thread_name_prefix='worker')
+
+            def submit(query_path, done):
+                future = pool.submit(run_sample_safely, query_path,
+                    base_settings, env, profiler)
+                future.add_done_callback(lambda f: done(f.result()))
+
+            try:
+                watch_samples(args, env, submit, cache_dir)
+            finally:
+                pool.shutdown(wait=True)
+                write_trace(env)
+
+            return
+
+        sequence_dir = locator.directory("sequence_data")
+        log_message("Using sequences from: {}".format(sequence_dir))
+
+        manifest = RunManifest(os.path.join(args.resultsdir, 'manifest.jsonl'),
+            resume=args.resume)
+
+        samples = []
+        for file in sorted(os.listdir(sequence_dir)):
+            query_path = os.path.join(sequence_dir, file)
+            samples.append(query_path)
+
+            # The samples all come from one directory so their
+            # names are enough to keep their results apart
+            manifest.add(query_path, ResultWriter.current.result_path(
+                file + '.json'))
+
+        log_message("Tracking run in manifest: {}".format(manifest.path))
+
+        if args.resume:
+            log_message("Resuming run, {} of {} samples already done".format(
+                sum(manifest.is_done(sample) for sample in samples),
+                len(samples)))
+
+        log_progress(0)
+
+        if args.resume:
+            samples = [sample for sample in samples \
+                if not manifest.is_done(sample)]
+
+        def process(sample):
+            manifest.mark(sample, RUNNING)
+
+            try:
+                run_sample(sample, base_settings, env,
+                    result_name=os.path.basename(manifest[sample].output),
+                    profiler=profiler)
+
+            except Exception as e:
+                # Keep going, the failed samples can be
+                # picked up again with --resume
+                log_exception('Failed running sample: {}'.format(sample))
+                manifest.mark(sample, FAILED, error=str(e))
+
+            else:
+                manifest.mark(sample, DONE)
+
+            finally:
+                progress.sample_done(sample)
+
+            log_message("")
+
+        costs = schedule_samples(samples)
+        groups = registry.group(samples)
+
+        if args.calibrate_with:
+            timings = calibrate_threads(args.calibrate_with, base_settings,
+                env)
+            save_calibration(calibration_path, timings)
+
+        elif args.calibrate and samples:
+            # Something in the middle of the queue is the best
+            # guess at what a typical sample looks like
+            runnable = set(sample for species, members in groups.items() \
+                if species in registry.species for sample in members)
+            ordered = sorted((i for i in range(len(samples)) \
+                if samples[i] in runnable), key=lambda i: costs[i])
+
+            if ordered:
+                sample = samples[ordered[len(ordered) // 2]]
+                timings = calibrate_threads(sample, base_settings, env)
+                save_calibration(calibration_path, timings)
+
+        progress = ProgressTracker(samples, costs)
+        pool = WorkStealingPool(plan_workers(args, env, timings, costs=costs))
+        sample_costs = dict(zip(samples, costs))
+
+        for species, members in groups.items():
+            log_message("Running {} sample(s) of species: {}".format(
+                len(members), species))
+
+        # Every species goes through the pool at once so that no
+        # worker sits idle waiting on the tail of one species. A
+        # database is only loaded once however many samples use it.
+        ordered = [sample for members in groups.values() \
+            for sample in members]
+
+        try:
+            pool.map(process, ordered,
+                [sample_costs[sample] for sample in ordered])
+
+        finally:
+            progress.close()
+
+        write_trace(env)
+
+        write_run_summary(env, [os.path.basename(state.output) \
+            for state in manifest])
+
+        counts = manifest.counts()
+        log_message("Finished {} samples, {} failed".format(
+            counts[DONE], counts[FAILED]))
+
+        # And we are done!
+        log_progress(100)
+        log_message('Done running algorithm: {}!'.format(
+            "Mutation Finder"))
+        log_message("You can find the json formatted version of these "
+                "results at: {}".format(env.resultsdir))
+
+        if counts[FAILED]:
+            raise RuntimeError('{} sample(s) failed, rerun with --resume and'
+                ' --resultsdir {} to retry them'.format(
+                    counts[FAILED], args.resultsdir))
+
+    finally:
+        if profiler is not None:
+            profiler.close()
+
+def main_submit(args):
+    """
+    Sends samples to a running daemon and prints back what
+    it tells us.
+    """
+    from tools.daemon import (
+        submit_samples, shutdown_server
+    )
+
+    if args.stop_daemon:
+        shutdown_server(args.submit)
+        return
+
+    failed = 0
+    for response in submit_samples(args.submit, args.samples):
+        print(json.dumps(response))
+
+        if response.get('status') != 'done':
+            failed += 1
+
+    if failed:
+        raise RuntimeError('{} sample(s) failed'.format(failed))
 
 _tools_dirs = [
     os.path.normpath(os.path.expanduser("~/.tools")),
@@ -168,13 +778,45 @@ def main_throw():
         
     # Parse cmdline arguments
     args, remaining = parse_cmdline()
-    
-    # Update the path to add all the directories that might have
-    # our tools.
-    populate_syspath(_tools_dirs)
+
+    if not args.debug:
+        run_command(args, remaining)
+        return
+
+    # Only load the debugger when it was asked for
+    import pdb
+
+    try:
+        run_command(args, remaining)
+
+    except Exception:
+        pdb.post_mortem()
+        raise
+
+def run_command(args, remaining):
+    """
+    Runs whichever command the commandline arguments asked for
+    """
+
+    if args.submit:
+        main_submit(args)
+        return
+
+    if args.summarize_profiles:
+        from tools.profiling import summarize_profiles
+
+        if not summarize_profiles(args.summarize_profiles):
+            raise RuntimeError('No profiles found in: {}'.format(
+                args.summarize_profiles))
+        return
 
     # Run the main program with arguments
-    main_throw_args(args, remaining)
+    try:
+        main_throw_args(args, remaining)
+
+    finally:
+        if ScratchSpace.current is not None:
+            ScratchSpace.current.close()
 
 def _main():
 
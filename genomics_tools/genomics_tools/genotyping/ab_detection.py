@@ -18,13 +18,18 @@ from tools.environment import (
 
 from tools.align import (
     BLASTSettings, create_blastdb,
-    align_blast_nodb, GenotypeHit
+    align_blast_nodb, align_blast_sharded,
+    GenotypeHit,
+    GenotypeResults
 )
 
 from tools.tools import (
-    reverse_complement, codon_translation
+    reverse_complement, codon_translation,
+    fasta_index_path
 )
 
+from tools.timing import span
+
 import os
 from itertools import combinations, product
 from tools.fancy_tools import Disjointset, binary_search
@@ -32,8 +37,42 @@ from collections import defaultdict, namedtuple
 
 GenotypeRegion = namedtuple('GenotypeRegion', ['coverage', 'identity', 'locations'])
 
+# A mutation found in a hit. Only the coordinates of the hit and
+# a small window of the alignment around the mutation are kept,
+# so the hit and its full aligned sequences can be let go of as
+# soon as the mutation is found.
+MutationCall = namedtuple('MutationCall', [
+    'locus',
+    'reference_id',
+    'contig_id',
+    'identity',
+    'coverage',
+    'query_start',
+    'query_stop',
+    'reference_start',
+    'reference_stop',
+    'position',
+    'reference_codon',
+    'query_codon',
+    'query_aa',
+    'aa_mutation',
+    'resistance',
+    'iscoding',
+    'reference',
+    'query'
+])
+
+# How much two hits of the same reference on the same contig
+# have to overlap, on both of them, to be the same region
+MIN_DUPLICATE_OVERLAP = 0.5
+
+# What each of the databases is called in the combined
+# references used by `genotype_detector`
+POINT_MUTATIONS = 'point'
+ACQUIRED_GENES = 'acquired'
+
 def mutation_detector(sequence_database, query_path, percent_identity,
-    min_relative_coverage, env):
+    min_relative_coverage, env, hits_path=None, rethreshold=False):
     """
     The primary dispatcher and external interface for the mutation 
     detection pipeline.
@@ -45,13 +84,192 @@ def mutation_detector(sequence_database, query_path, percent_identity,
     :param min_relative_coverage: The minimum coverage in alignment for
         a gene.
     :param env: The env object to retrieve information from
+    :param hits_path: Where to keep the unfiltered alignment hits
+        for this query so that it can be re-thresholded later
+    :param rethreshold: Whether to load the hits from hits_path
+        instead of aligning the query again
     """
-    
+
+    results = load_or_align(sequence_database, query_path,
+        percent_identity, env, hits_path, rethreshold)
+
+    log_message('Searching for mutations...')
+    with span('find_mutations'):
+        interpretations = find_mutations(
+            sequence_database,
+            results,
+            min_relative_coverage)
+
+    log_message('Retained {} gene regions after gene analysis'.format(
+        len(interpretations)))
+
+    return interpretations
+
+def genotype_detector(references, query_path, percent_identity,
+    min_relative_coverage, env, hits_path=None, rethreshold=False):
+    """
+    Finds both the point mutations and the acquired genes in a
+    query from a single alignment against the combined references
+    of the two databases.
+
+    :param references: The `CombinedReferences` holding the point
+        mutation database as POINT_MUTATIONS and the acquired gene
+        database as ACQUIRED_GENES
+    :param query_path: The path to the query_file to search in.
+    :param percent_identity: The minimum percent identity for alignment
+        matches.
+    :param min_relative_coverage: The minimum coverage in alignment for
+        a gene.
+    :param env: The env object to retrieve information from
+    :param hits_path: Where to keep the unfiltered alignment hits
+        for this query so that it can be re-thresholded later
+    :param rethreshold: Whether to load the hits from hits_path
+        instead of aligning the query again
+    :returns: The mutations and the acquired genes
+    """
+
+    results = load_or_align(references, query_path,
+        percent_identity, env, hits_path, rethreshold)
+
+    split = split_results(references, results)
+
+    log_message('Searching for mutations...')
+    with span('find_mutations'):
+        interpretations = find_mutations(
+            references.databases[POINT_MUTATIONS],
+            split[POINT_MUTATIONS],
+            min_relative_coverage)
+
+    log_message('Retained {} gene regions after gene analysis'.format(
+        len(interpretations)))
+
+    contig_sizes = {contig: length for contig, _, length in \
+        fasta_index_path(query_path)}
+
+    log_message('Searching for acquired genes...')
+    with span('find_acquired_genes'):
+        genes = find_acquired_genes(
+            references.databases[ACQUIRED_GENES],
+            split[ACQUIRED_GENES],
+            contig_sizes,
+            percent_identity,
+            min_relative_coverage)
+
+    log_message('Found {} acquired genes'.format(len(genes)))
+
+    return interpretations, genes
+
+def load_or_align(sequence_database, query_path, percent_identity, env,
+    hits_path=None, rethreshold=False):
+    """
+    Returns back the hits of the query against the references,
+    either from the hits saved by an earlier run or by aligning
+    it again.
+
+    :param sequence_database: The reference sequences to use.
+    :param query_path: The path to the query_file to align.
+    :param percent_identity: The minimum percent identity for alignment
+        matches.
+    :param env: The env object to retrieve information from
+    :param hits_path: Where the unfiltered hits for this query go
+    :param rethreshold: Whether to load the hits from hits_path
+        instead of aligning the query again
+    """
+
+    if rethreshold:
+        if hits_path is None or not os.path.exists(hits_path):
+            raise RuntimeError('Missing saved hits for query: {}'.format(
+                query_path))
+
+        log_message('Loading saved hits from: {}'.format(hits_path))
+
+        with span('hit parsing'):
+            results = GenotypeResults().load_hits(hits_path, 'blast')
+
+    else:
+        results = align_query(sequence_database, query_path,
+            percent_identity, env, hits_path)
+
+    # Saved hits come back unfiltered so apply the
+    # identity threshold here instead
+    if hits_path:
+        results = results.filter(percent_identity)
+
+    return results
+
+def split_results(references, results):
+    """
+    Hands the hits against combined references back to the
+    database each reference came from, under the reference id
+    that database knows it by.
+
+    :param references: The `CombinedReferences` that were aligned to
+    :param results: The hits against the combined references
+    :returns: A mapping of database name to its `GenotypeResults`
+    """
+
+    split = {name: GenotypeResults() for name in references.databases}
+
+    for hit in results.hits:
+        name, hit.reference_id = references.split_reference(
+            hit.reference_id)
+        split[name].hits.append(hit)
+
+    return split
+
+def find_acquired_genes(sequence_database, results, contig_sizes,
+    percent_identity, min_relative_coverage):
+    """
+    Finds the genes from the database that are present in the
+    query, including those broken over two contigs
+
+    :param sequence_database: The database of acquired genes
+    :param results: The hits against the acquired genes
+    :param contig_sizes: A mapping of contig id to its length
+    :param percent_identity: The minimum identity for a gene
+    :param min_relative_coverage: The minimum coverage of a gene
+    :returns: A mapping of references to their `GenotypeRegion`s
+    """
+
+    genotypes = Genotype.find_regions(results, contig_sizes,
+        sequence_database)
+
+    validated = {
+        reference: genotype for reference, genotype in genotypes.items() \
+            if genotype.validate(percent_identity, min_relative_coverage,
+                contig_sizes, True)
+    }
+
+    return eliminate_overlap(validated, min_relative_coverage)
+
+def align_query(sequence_database, query_path, percent_identity, env,
+    hits_path=None):
+    """
+    Aligns the query against the exported reference sequences.
+
+    :param sequence_database: The reference sequences to use.
+    :param query_path: The path to the query_file to align.
+    :param percent_identity: The minimum percent identity for alignment
+        matches.
+    :param env: The env object to retrieve information from
+    :param hits_path: If provided, the hits are written here without
+        applying the percent identity
+    """
+
     log_message('Exporting references...')
-    reference_dir = os.path.join(env.tempdir, 'blastdb')
-    valid_dir(reference_dir)
-    reference_path = os.path.join(reference_dir, 'references.fasta')
-    sequence_database.export_sequences(reference_path)
+
+    # The export is the same for every sample that uses this
+    # database, so share it whenever we have somewhere to put it
+    with span('reference export'):
+        if env.cachedir:
+            reference_path = sequence_database.export_cached(env.cachedir)
+
+        else:
+            reference_dir = os.path.join(env.tempdir, 'blastdb')
+            valid_dir(reference_dir)
+            reference_path = os.path.join(reference_dir, 'references.fasta')
+            sequence_database.export_sequences(reference_path)
+
     log_message('Successfully exported reference database...')
 
     # Create the path to the blast database
@@ -62,34 +280,46 @@ def mutation_detector(sequence_database, query_path, percent_identity,
     log_message('Successfully created blast database!')
 
     # Return the sequences so that we can search for
-    # point mutations
+    # point mutations. If we are keeping the hits around,
+    # let everything through so that the saved hits can be
+    # filtered differently later on
     blast_settings = BLASTSettings(
         task = 'blastn',
-        identity = percent_identity,
+        identity = 0. if hits_path else percent_identity,
         relative_minlen = 0,
         absolute_minlen = 0,
         include_sequences = True
         )
 
     log_message('BLASTing query genome against reference database')
-    results = align_blast_nodb(
-        query_path,
-        reference_path,
-        blast_settings,
-        env
-    )
 
-    log_message('Successfully BLASTed query genome against reference database')
-    log_message('Searching for mutations...')
-    interpretations = find_mutations(
-        sequence_database,
-        results,
-        min_relative_coverage)
+    if env.query_shards > 1 or env.reference_shards > 1:
+        # Spread one big sample or a big set of
+        # references over many BLASTn
+        results = align_blast_sharded(
+            query_path,
+            reference_path,
+            blast_settings,
+            env,
+            query_shards=env.query_shards,
+            reference_shards=env.reference_shards,
+            outputfile=hits_path
+        )
 
-    log_message('Retained {} gene regions after gene analysis'.format(
-        len(interpretations)))
+    else:
+        results = align_blast_nodb(
+            query_path,
+            reference_path,
+            blast_settings,
+            env,
+            outputfile=hits_path
+        )
 
-    return interpretations
+    if hits_path:
+        log_message('Saved unfiltered hits to: {}'.format(hits_path))
+
+    log_message('Successfully BLASTed query genome against reference database')
+    return results
 
 def find_mutations(sequence_database, results, min_relative_coverage):
     """
@@ -111,11 +341,39 @@ def find_mutations(sequence_database, results, min_relative_coverage):
 
     # Store the found resistance:
     mutation_results = defaultdict(list)
+    duplicates = 0
+
     for reference, hits in regions.items():
-        targets = sequence_database.targets[reference]
+        targets = sequence_database.targets.get(reference, ())
+
+        # A hit too short to count can't vouch for a target,
+        # so it can't keep the other hits from checking it
+        hits = [hit for hit in hits \
+            if hit.relative_len >= min_relative_coverage]
+
+        # Best hit first. A target that a better hit of the same
+        # region already called isn't checked again, but one it
+        # didn't call still is, another hit might align it better
+        called = {}
+        calls = []
+
+        for i, better in rank_hits(hits):
+            hit = hits[i]
+            called[i] = set()
+
+            ref_start = hit.reference_start
+            ref_stop = hit.reference_stop
+
+            # Only the targets in the part of the reference
+            # that the hit covers can be checked
+            covered = [k for k, target in enumerate(targets) \
+                if ref_start <= target.start and target.end <= ref_stop]
 
-        for hit in hits:
-            if hit.relative_len < min_relative_coverage:
+            done = set().union(*(called[j] for j in better))
+            duplicates += sum(k in done for k in covered)
+            covered = [k for k in covered if k not in done]
+
+            if not covered:
                 continue
 
             # Store the gap positions for each of the sequences.
@@ -131,22 +389,97 @@ def find_mutations(sequence_database, results, min_relative_coverage):
                 # Insertions
                 ref_gaps = [i for i, s in enumerate(hit.reference_seq) if s == '-']
 
-            for target in targets:
+            for k in covered:
+                target = targets[k]
+
                 if target.coding_gene:
-                    results = validate_coding_gene(hit, target, ref_gaps,
+                    call = validate_coding_gene(hit, target, ref_gaps,
                                                     query_gaps)
-                    if results:
-                        mutation_results[hit.reference_id].append(results)
 
                 else:
-                    results = validate_noncoding_gene(hit, target, ref_gaps,
+                    call = validate_noncoding_gene(hit, target, ref_gaps,
                                                         query_gaps)
 
-                    if results:
-                        mutation_results[hit.reference_id].append(results)
+                if call:
+                    called[i].add(k)
+                    calls.append((i, call))
+
+        # Report them in the order the hits came in
+        calls.sort(key=lambda pair: pair[0])
+
+        for _, call in calls:
+            mutation_results[reference].append(call)
+
+    if duplicates:
+        log_message('Skipped {} targets already called by a better'
+            ' hit'.format(duplicates))
 
     return mutation_results
 
+def span_overlap(start1, stop1, start2, stop2):
+    """
+    Returns back how much of the shorter of two inclusive spans
+    the other one covers
+
+    :param start1: The start of the first span
+    :param stop1: The stop of the first span
+    :param start2: The start of the second span
+    :param stop2: The stop of the second span
+    """
+
+    overlap = min(stop1, stop2) - max(start1, start2) + 1
+    shorter = min(stop1 - start1, stop2 - start2) + 1
+
+    return max(0, overlap) / float(shorter)
+
+def rank_hits(hits, min_overlap=MIN_DUPLICATE_OVERLAP):
+    """
+    Orders hits best first and works out which better hits each
+    one is a duplicate of. BLAST often reports a few overlapping
+    HSPs for the same part of a reference, which would otherwise
+    all report the same mutation. Hits have to overlap on the
+    reference and on the contig to be the same region, so every
+    copy of a repeated gene (rRNA operons) is still checked on
+    its own.
+
+    :param hits: The hits to rank
+    :param min_overlap: How much of the shorter hit has to be
+        covered on both the reference and the contig
+    :returns: (index, better) for every hit, best first. better
+        holds the indices of the better hits of the same region.
+    """
+
+    # Best scoring first, ties are broken by position so that
+    # the same hits always win no matter what order they came in
+    ranked = sorted(range(len(hits)), key=lambda i: (
+        -hits[i].bitscore,
+        -hits[i].identity,
+        hits[i].query_id,
+        hits[i].query_start,
+        hits[i].reference_start,
+        hits[i].query_stop,
+        hits[i].reference_stop
+    ))
+
+    seen = defaultdict(list)
+    order = []
+
+    for i in ranked:
+        hit = hits[i]
+        region = (hit.reference_id, hit.query_id, hit.forward)
+
+        better = [j for j in seen[region] \
+            if span_overlap(hit.reference_start, hit.reference_stop,
+                hits[j].reference_start, hits[j].reference_stop) >= \
+                min_overlap \
+            and span_overlap(hit.query_start, hit.query_stop,
+                hits[j].query_start, hits[j].query_stop) >= min_overlap]
+
+        seen[region].append(i)
+        order.append((i, better))
+
+    return order
+
 def validate_coding_gene(hit, target, ref_gaps, query_gaps, **kwargs):
     """
     Cross references the hit against the target including any insertions
@@ -156,9 +489,11 @@ def validate_coding_gene(hit, target, ref_gaps, query_gaps, **kwargs):
     :param target: The database target that maps to the hit
     :param ref_gaps: A list of gap indices in the reference sequence
     :param query_gaps: A list of gap indices in the query sequence
+    :returns: A `MutationCall`, or None if the query doesn't have
+        the mutation
     """
 
-    default_return = {}
+    default_return = None
     ref_start = hit.reference_start
     ref_stop = hit.reference_stop
     query_start = hit.query_start
@@ -172,28 +507,14 @@ def validate_coding_gene(hit, target, ref_gaps, query_gaps, **kwargs):
     resistance_aas = target.resistance_aa
     resistances = target.resistance
 
-    # The sequences come back from blast as the reverse
-    # complement of the reference, thus we need to reverse
-    # them back to get a sequence in the same orientation
-    # as the reference sequence ***IF*** the alignment is a
-    # reverse alignment
-    if not hit.forward:
-        hit_ref_seq = reverse_complement(hit_ref_seq)
-        hit_query_seq = reverse_complement(hit_query_seq)
-
     # The positional information for the coding genes
     # is stored as the position of the codon
     # i.e. codon 415 is nucleotide position 415*3
-    # Get the positional information for this target
-    # These are the (1-indexed) values which we
-    # transform into the (0-indexed) position.
-    # You could leave the end position without
-    # subtracting 1 to make list slicing easier
-    # Instead, I've left this here for the next
-    # person so they can understand what is really
-    # happening
-    start = (codon_position * 3) - 3
-    end = (codon_position * 3 ) - 1
+    # The target already holds the (0-indexed) first
+    # and last nucleotide of the codon, see
+    # `compile_target`
+    start = target.start
+    end = target.end
 
     # If the codon does not exist within the
     # range of the hit, obviously it can't
@@ -202,7 +523,16 @@ def validate_coding_gene(hit, target, ref_gaps, query_gaps, **kwargs):
     # the start and stop will be the absolute
     # start and stop within the reference sequence
     if start < ref_start or end > ref_stop:
-        return {}
+        return default_return
+
+    # The sequences come back from blast as the reverse
+    # complement of the reference, thus we need to reverse
+    # them back to get a sequence in the same orientation
+    # as the reference sequence ***IF*** the alignment is a
+    # reverse alignment
+    if not hit.forward:
+        hit_ref_seq = reverse_complement(hit_ref_seq)
+        hit_query_seq = reverse_complement(hit_query_seq)
 
     # Create the indices for the returned
     # query string
@@ -218,7 +548,7 @@ def validate_coding_gene(hit, target, ref_gaps, query_gaps, **kwargs):
 
     # The case where the mutation is the result of an
     # insertion
-    if '-' not in reference_codons:
+    if not target.insertion:
         while hit_ref_seq[string_start+ins_offset] == '-' and \
             string_end+ins_offset+1 < len(hit_ref_seq):
             
@@ -253,7 +583,7 @@ def validate_coding_gene(hit, target, ref_gaps, query_gaps, **kwargs):
     # binary_search will return -1 if there are no dels
     del_offset = max_dels + 1
 
-    if '-' not in resistance_aas:
+    if not target.deletion:
         while hit_query_seq[string_start + del_offset] == '-' and \
             string_end + del_offset + 1 < len(hit_query_seq):
 
@@ -278,21 +608,27 @@ def validate_coding_gene(hit, target, ref_gaps, query_gaps, **kwargs):
 
     if query_translation in resistance_aas:
 
-        return {
-            'locus' : target.gene_id,
-            'identity' : hit.identity,
-            'contig_id' : hit.query_id,
-            'query_codon': hit_query_codon,
-            'query_aa' : query_translation,
-            'position': codon_position,
-            'aa_mutation' : '{}->{}'.format(
+        return MutationCall(
+            locus = target.gene_id,
+            reference_id = hit.reference_id,
+            contig_id = hit.query_id,
+            identity = hit.identity,
+            coverage = hit.relative_len,
+            query_start = hit.query_start,
+            query_stop = hit.query_stop,
+            reference_start = hit.reference_start,
+            reference_stop = hit.reference_stop,
+            position = codon_position,
+            reference_codon = hit_ref_codon,
+            query_codon = hit_query_codon,
+            query_aa = query_translation,
+            aa_mutation = '{}->{}'.format(
                 reference_aas[0], query_translation),
-            'resistance' : resistances,
-            'hit': hit,
-            'iscoding' : target.coding_gene,
-            'reference': hit_ref_seq[ref_slice],
-            'query' : hit_query_seq[query_slice]
-        }
+            resistance = resistances,
+            iscoding = target.coding_gene,
+            reference = hit_ref_seq[ref_slice],
+            query = hit_query_seq[query_slice]
+        )
 
     return default_return
 
@@ -305,9 +641,11 @@ def validate_noncoding_gene(hit, target, ref_gaps, query_gaps, **kwargs):
     :param target: The database target that maps to the hit
     :param ref_gaps: A list of gap indices in the reference sequence
     :param query_gaps: A list of gap indices in the query sequence
+    :returns: A `MutationCall`, or None if the query doesn't have
+        the mutation
     """
 
-    default_return = {}
+    default_return = None
     ref_start = hit.reference_start
     ref_stop = hit.reference_stop
     query_start = hit.query_start
@@ -336,13 +674,10 @@ def validate_noncoding_gene(hit, target, ref_gaps, query_gaps, **kwargs):
     #   -11 -10 -9  -8  -7  -6  -5  -4  -3  -2  -1   1
     #    C   A   A   T   C   T   A   A   C   G   C   A
     # 
-    if codon_position < 0:
-        start = codon_position + 53
-
     # If it's not negative, then its a 16s or 23s
-    # RNA gene
-    else:
-        start = codon_position - 1
+    # RNA gene. Either way the target already holds
+    # the (0-indexed) position, see `compile_target`
+    start = target.start
 
     # If the nucleotide does not exist within the
     # range of the hit, obviously it can't
@@ -367,7 +702,7 @@ def validate_noncoding_gene(hit, target, ref_gaps, query_gaps, **kwargs):
     # first nucleotide in the codon
     ins_offset = max_ins + 1
 
-    if '-' not in reference_codons:
+    if not target.insertion:
         while hit_ref_seq[string_start+ins_offset] == '-' and \
             string_start+ins_offset+1 < len(hit_ref_seq):
             
@@ -390,7 +725,7 @@ def validate_noncoding_gene(hit, target, ref_gaps, query_gaps, **kwargs):
 
     del_offset = max_dels + 1
 
-    if '-' not in resistance_aas:
+    if not target.deletion:
         while hit_query_seq[string_start + del_offset] == '-' and \
             string_start + del_offset + 1 < len(hit_query_seq):
 
@@ -412,20 +747,26 @@ def validate_noncoding_gene(hit, target, ref_gaps, query_gaps, **kwargs):
     # nuc that is known
     if hit_query_nucleotide in resistance_aas:
 
-        return {
-            'locus' : target.gene_id,
-            'identity' : hit.identity,
-            'contig_id' : hit.query_id,
-            'query_codon': hit_query_nucleotide,
-            'position': codon_position,
-            'reference_nuc' : hit_ref_nucleotide,
-            'resistance' : resistances,
-            'aa_mutation' : '',
-            'hit': hit,
-            'iscoding' : target.coding_gene,
-            'reference': hit_ref_seq[ref_slice],
-            'query' : hit_query_seq[query_slice]
-        }
+        return MutationCall(
+            locus = target.gene_id,
+            reference_id = hit.reference_id,
+            contig_id = hit.query_id,
+            identity = hit.identity,
+            coverage = hit.relative_len,
+            query_start = hit.query_start,
+            query_stop = hit.query_stop,
+            reference_start = hit.reference_start,
+            reference_stop = hit.reference_stop,
+            position = codon_position,
+            reference_codon = hit_ref_nucleotide,
+            query_codon = hit_query_nucleotide,
+            query_aa = '',
+            aa_mutation = '',
+            resistance = resistances,
+            iscoding = target.coding_gene,
+            reference = hit_ref_seq[ref_slice],
+            query = hit_query_seq[query_slice]
+        )
 
     return default_return
 
@@ -510,7 +851,7 @@ def eliminate_overlap(regions, min_merge_overlap):
     """
 
     # Create a flat list of all of the hits
-    regions = [hit for region in regions.itervalues() for \
+    regions = [hit for region in regions.values() for \
         hit in region.predicted]
 
     dset = Disjointset(len(regions))
@@ -665,7 +1006,7 @@ class Genotype(object):
 
 
                 # Get the coverage of the two fragments
-                coverage = float(len(filter(None, mask))) / float(
+                coverage = float(len(list(filter(None, mask)))) / float(
                     self._reference_len)
 
                 # Get the real coverage, in case the calculated
@@ -681,8 +1022,8 @@ class Genotype(object):
                     # divided by its relative coverage
                     # which comes out to be just the number of
                     # items in the mask greater than 0
-                    identity = sum(mask) / coverage * float(
-                        self._reference_len)
+                    identity = sum(mask) / (coverage * float(
+                        self._reference_len))
 
                     if identity >= percent_identity:
 
@@ -714,15 +1055,13 @@ class Genotype(object):
 
             to_check = best_hits.pop()
 
-            for accepted in self._predicted:
-
-                if not encompassed(
+            if not any(encompassed(
                     accepted.locations,
                     to_check.locations,
                     min_relative_coverage
-                ):
+                ) for accepted in self._predicted):
 
-                    self._predicted.append(to_check)
+                self._predicted.append(to_check)
 
         # For this genotype save the coverage and 
         # identity
@@ -745,7 +1084,7 @@ class Genotype(object):
         for reference, hits in hit_regions.items():
 
             # Get the length of the reference
-            reference_len = len(sequence_database.get_refseq(reference))
+            reference_len = sequence_database.get_reflen(reference)
 
             # Create the genotype object that will hold all hits for a
             # particular reference
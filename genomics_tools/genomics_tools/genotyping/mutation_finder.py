@@ -18,23 +18,38 @@ from tools.environment import (
 )
 
 from tools.dbinfo import (
-    DbInfo, SequenceInfo
+    DbInfo, SequenceInfo,
+    CombinedReferences
 )
 
+# The mutation database below takes over the name, the acquired
+# genes are held in a plain database
+from tools.dbinfo import DbInfo as GeneDbInfo
+
 from tools.tools import (
-    is_fasta, parse_fasta
+    is_fasta, hash_file
+)
+
+from tools.cache import (
+    ResultCache, make_key
+)
+
+from tools.timing import (
+    SampleTimer, span
 )
 
 from tools.fancy_tools import pretty_aln
 
 from .ab_detection import (
-    mutation_detector
+    mutation_detector, genotype_detector,
+    POINT_MUTATIONS, ACQUIRED_GENES
 )
 
 import os
 import json
 from functools import partial
 from collections import namedtuple, defaultdict
+import threading
 import uuid
 
 MutationTarget = namedtuple('MutationTarget', [
@@ -46,10 +61,78 @@ MutationTarget = namedtuple('MutationTarget', [
     'resistance_aa', 
     'resistance', 
     'pm_ids',
-    'coding_gene'
+    'coding_gene',
+    'start',
+    'end',
+    'insertion',
+    'deletion'
 ])
 
-def main(settings, env):
+def compile_target(gene_id, gene_name, codon_position, reference_codon,
+    reference_aa, resistance_aa, resistance, pm_ids, coding_gene):
+    """
+    Creates a `MutationTarget` laid out for the checks that are made
+    against it for every hit. The alleles become frozensets, and
+    where the target sits in the reference and whether it is an
+    insertion or a deletion are worked out once here.
+
+    :param gene_id: The reference the target is in
+    :param gene_name: The name of the gene
+    :param codon_position: The codon for coding genes, otherwise the
+        nucleotide. Negative positions are in the promoter.
+    :param reference_codon: The codons or nucleotides of the reference
+    :param reference_aa: The amino acids of the reference
+    :param resistance_aa: The amino acids, or nucleotides for
+        non-coding genes, that give resistance
+    :param resistance: The antibiotics it gives resistance to
+    :param pm_ids: The ids of the point mutation
+    :param coding_gene: Whether the gene codes for a protein
+    """
+
+    if coding_gene:
+        # The codon's first and last nucleotide, 0-indexed
+        start = (codon_position * 3) - 3
+        end = (codon_position * 3) - 1
+
+    else:
+        # The ampC promoter positions count back from the
+        # end of the 53 bp promoter
+        start = codon_position + 53 if codon_position < 0 else \
+            codon_position - 1
+        end = start
+
+    return MutationTarget(
+        gene_id = gene_id,
+        gene_name = gene_name,
+        codon_position = codon_position,
+        reference_codon = frozenset(reference_codon),
+        reference_aa = tuple(reference_aa),
+        resistance_aa = frozenset(resistance_aa),
+        resistance = list(resistance),
+        pm_ids = tuple(pm_ids),
+        coding_gene = coding_gene,
+        start = start,
+        end = end,
+        insertion = '-' in reference_codon,
+        deletion = '-' in resistance_aa
+    )
+
+def main(settings, env, result_name=None):
+
+    if result_name is None:
+        result_name = str(uuid.uuid4()) + '.json'
+
+    timer = SampleTimer(settings.query)
+
+    try:
+        with timer:
+            return run(settings, env, result_name)
+
+    finally:
+        if env.metricsdir:
+            timer.write(os.path.join(env.metricsdir, result_name))
+
+def run(settings, env, result_name):
 
     log_message('Starting running mutation finder algorithm')
     log_algo_version(
@@ -66,29 +149,87 @@ def main(settings, env):
     log_message('Loading resistance sequences and associated'
         ' information')
 
-    sequence_database = DbInfo(
-        database_path, seq_parser = sequence_parser)
+    if settings.acquired_database:
+        log_message('Acquired gene database found at: {}'.format(
+            settings.acquired_database))
 
-    # Load the mutation targets
-    sequence_database.load_extras()
+    with span('database load'):
+        sequence_database, acquired_database, references = \
+            load_references(settings)
 
     log_message('Successfully loaded sequences and metadata!')
-    log_message('Running mutation finder pipeline...')
-
-    # The results will come back without being filtered
-    results = mutation_detector(
-        sequence_database,
-        settings.query,
-        settings.percent_identity,
-        settings.min_relative_coverage,
-        env
-    )
 
-    final_results, antibios_out = sequence_database.results_parser(
-        results, f=results_parser)
+    result_cache = None
+    cached = None
+    hits_path = raw_hits_path(settings, references, env)
+
+    if env.cachedir and env.result_cache_size:
+        result_cache = ResultCache(
+            os.path.join(env.cachedir, 'results'),
+            env.result_cache_size
+        )
+        cache_key = result_cache_key(settings, references)
+
+        # Cached results don't come with the hits, align again
+        # if we were asked to keep them and don't have them yet
+        if hits_path is None or os.path.exists(hits_path):
+            cached = result_cache.get(cache_key)
+
+    if cached is not None:
+        log_message('Found cached results for this query, skipping'
+            ' the mutation finder pipeline')
+
+        final_results = cached['results']
+        antibios_out = cached['notes']
+
+    else:
+        log_message('Running mutation finder pipeline...')
+        genes = None
+
+        # The results will come back without being filtered
+        if acquired_database is None:
+            results = mutation_detector(
+                sequence_database,
+                settings.query,
+                settings.percent_identity,
+                settings.min_relative_coverage,
+                env,
+                hits_path = hits_path,
+                rethreshold = env.rethreshold
+            )
+
+        else:
+            # Both predictions come out of the same alignment
+            results, genes = genotype_detector(
+                references,
+                settings.query,
+                settings.percent_identity,
+                settings.min_relative_coverage,
+                env,
+                hits_path = hits_path,
+                rethreshold = env.rethreshold
+            )
+
+        with span('results_parser'):
+            final_results, antibios_out = sequence_database.results_parser(
+                results, f=results_parser)
+
+            if genes is not None:
+                final_results['acquired'] = acquired_database.results_parser(
+                    genes)
+                acquired_notes(acquired_database, final_results['acquired'],
+                    antibios_out)
+
+        if result_cache is not None:
+            result_cache.put(cache_key, {
+                'results': final_results,
+                'notes': antibios_out
+            })
 
     log_message('Writing results out...', extra=1)
-    write_results(str(uuid.uuid4()) + '.json', json.dumps(final_results))
+
+    with span('result writing'):
+        write_results(result_name, json.dumps(final_results))
 
     # Success!
     log_message('Successfully ran mutation finder algorithm!')
@@ -96,8 +237,125 @@ def main(settings, env):
     for result in final_results['extra']:
         log_result_nicely(result)
 
+    for result in final_results.get('acquired', {}).get('extra', []):
+        log_gene_nicely(result)
+
     return antibios_out
 
+# Databases stay loaded for the life of the process so that
+# every sample after the first one gets them for free. A long
+# running process needs a restart to pick up database updates.
+_databases = {}
+_databases_lock = threading.Lock()
+
+def load_database(database_path):
+    """
+    Returns back the loaded database for a path, loading it
+    the first time it is asked for.
+
+    :param database_path: The path to the database directory
+    """
+
+    with _databases_lock:
+        if database_path not in _databases:
+
+            # The sequences are only needed for the export, which
+            # is cached, so don't hold on to them
+            sequence_database = DbInfo(
+                database_path, seq_parser = sequence_parser, lazy = True)
+
+            # Load the mutation targets
+            sequence_database.load_extras()
+            _databases[database_path] = sequence_database
+
+        return _databases[database_path]
+
+def load_acquired_database(database_path):
+    """
+    Returns back the loaded acquired gene database for a path,
+    loading it the first time it is asked for.
+
+    :param database_path: The path to the database directory
+    """
+
+    key = (ACQUIRED_GENES, database_path)
+
+    with _databases_lock:
+        if key not in _databases:
+            _databases[key] = GeneDbInfo(database_path, lazy = True)
+
+        return _databases[key]
+
+def load_references(settings):
+    """
+    Returns back the mutation database, the acquired gene database
+    and the references to align against. When there is no acquired
+    gene database the references are just the mutation database,
+    otherwise they are both databases combined so that the query
+    only has to be aligned once.
+
+    :param settings: The settings for this run
+    """
+
+    sequence_database = load_database(settings.database)
+
+    if not settings.acquired_database:
+        return sequence_database, None, sequence_database
+
+    acquired_database = load_acquired_database(settings.acquired_database)
+    key = (settings.database, settings.acquired_database)
+
+    with _databases_lock:
+        if key not in _databases:
+            _databases[key] = CombinedReferences([
+                (POINT_MUTATIONS, sequence_database),
+                (ACQUIRED_GENES, acquired_database)
+            ])
+
+        return sequence_database, acquired_database, _databases[key]
+
+def raw_hits_path(settings, sequence_database, env):
+    """
+    Returns back where the unfiltered hits for a query are
+    kept, if we are keeping them at all. The hits are grouped
+    by database snapshot so that hits from an older database
+    never get re-thresholded against a newer one.
+
+    :param settings: The settings for this run
+    :param sequence_database: The loaded database
+    :param env: The env object to retrieve information from
+    """
+    if not env.hitsdir:
+        return None
+
+    return os.path.join(
+        env.hitsdir,
+        sequence_database.version[:12],
+        os.path.basename(settings.query) + '.hits.txt'
+    )
+
+def result_cache_key(settings, sequence_database):
+    """
+    Creates the key for the results of a query. Everything
+    that could change the results goes in: the bytes of the
+    query genome, the database snapshot and the settings. The
+    paths are left out so that resubmitted samples still hit.
+
+    :param settings: The settings for this run
+    :param sequence_database: The loaded database, or the combined
+        references when looking for acquired genes too
+    """
+    parameters = settings._asdict()
+    del parameters['query']
+    del parameters['database']
+    del parameters['acquired_database']
+
+    return make_key(
+        hash_file(settings.query),
+        sequence_database.version,
+        parameters
+    )
+
 def log_result_nicely(result, extra=-1):
     """
     Helper function for printing out results
@@ -119,6 +377,41 @@ def log_result_nicely(result, extra=-1):
     
     log_message("Query", extra=extra)
 
+def log_gene_nicely(result, extra=-1):
+    """
+    Helper function for printing out acquired genes
+    to the console for portfolio uses
+
+    :param result: The result to print out
+    :param extra: Any extra tabs to add
+    """
+    log_message("", extra=extra)
+    log_message("Acquired gene: {}".format(result['locus']), extra=extra)
+    log_message("Match: {}".format(result['identity']*100), extra=extra)
+    log_message("Coverage: {}".format(result['coverage']*100), extra=extra)
+
+    for hit in result['hits']:
+        log_message("Contig: {} ({}-{})".format(hit['contig_id'],
+            hit['query_start'], hit['query_stop']), extra=extra)
+
+def acquired_notes(acquired_database, acquired_results, notes_out):
+    """
+    Adds the antibiotics that the acquired genes give resistance
+    to onto the notes of the mutations
+
+    :param acquired_database: The acquired gene database
+    :param acquired_results: The parsed acquired gene results
+    :param notes_out: The notes from the mutations
+    """
+
+    for locus, present in acquired_results['results'].items():
+        if locus not in acquired_database.notes:
+            continue
+
+        for r in acquired_database.notes[locus].antibiotic:
+            notes_out['results'][r] = notes_out['results'].get(r, False) \
+                or present
+
 def sequence_parser(header, sequence):
     """
     Function that serves to create SequenceInfo objects.
@@ -147,10 +440,9 @@ class DbInfo(DbInfo):
             if not is_fasta(file_path):
                 continue
 
-            sequences = parse_fasta(file_path)
-            for seq_id, sequence in sequences.items():
+            for seq_id, sequence, location in self.load_fasta(file_path):
                 seq_info = seq_parser(seq_id, sequence)
-                self._sequences[seq_id] = seq_info
+                self.add_sequence(seq_id, seq_info, location)
 
         # Load notes if they exist
         file_path = os.path.join(dirpath, 'notes.txt')
@@ -168,7 +460,7 @@ class DbInfo(DbInfo):
 
     def load_extras(self):
 
-        self._targets = defaultdict(list)
+        targets = defaultdict(list)
         self._rna_genes = set()
 
         # Load the RNA gene file if it exists
@@ -209,8 +501,8 @@ class DbInfo(DbInfo):
                 coding_gene = gene_id not in self._rna_genes and \
                     'promoter' not in gene_id.lower()
 
-                self._targets[gene_id].append(
-                    MutationTarget(
+                targets[gene_id].append(
+                    compile_target(
                         gene_id = gene_id,
                         gene_name = gene_name,
                         codon_position = codon_position,
@@ -223,6 +515,11 @@ class DbInfo(DbInfo):
                     )
                 )
 
+        # The database is shared between the workers, so this
+        # is never written to after loading
+        self._targets = {gene_id: tuple(found) \
+            for gene_id, found in targets.items()}
+
     @property
     def targets(self):
         return self._targets
@@ -261,32 +558,31 @@ def results_parser(dbinfo, interpretations):
 
         for mutation_info in mutation:
 
-            gene_name = gene + '@' + str(mutation_info['position'])
+            gene_name = gene + '@' + str(mutation_info.position)
             final_results['results'][gene_name] = True
-            hit = mutation_info['hit']
 
             hit_info = {
-                        'locus': hit.reference_id,
-                        'identity': hit.identity,
-                        'coverage': hit.relative_len,
-                        'contig_id': hit.query_id,
-                        'query_start': hit.query_start,
-                        'query_stop': hit.query_stop,
-                        'reference_start': hit.reference_start,
-                        'reference_stop': hit.reference_stop,
-                        'aa_mutation': mutation_info['aa_mutation'],
-                        'query_codon': mutation_info['query_codon'],
-                        'iscoding' : mutation_info['iscoding'],
-                        'resistance' : mutation_info['resistance'],
-                        'position' : mutation_info['position'],
-                        'alignment' : pretty_aln(mutation_info['reference'],
-                                        mutation_info['query'])
+                        'locus': mutation_info.reference_id,
+                        'identity': mutation_info.identity,
+                        'coverage': mutation_info.coverage,
+                        'contig_id': mutation_info.contig_id,
+                        'query_start': mutation_info.query_start,
+                        'query_stop': mutation_info.query_stop,
+                        'reference_start': mutation_info.reference_start,
+                        'reference_stop': mutation_info.reference_stop,
+                        'aa_mutation': mutation_info.aa_mutation,
+                        'query_codon': mutation_info.query_codon,
+                        'iscoding' : mutation_info.iscoding,
+                        'resistance' : mutation_info.resistance,
+                        'position' : mutation_info.position,
+                        'alignment' : pretty_aln(mutation_info.reference,
+                                        mutation_info.query)
                 }
 
             final_results['extra'].append(hit_info)
             notes_out['extra'].append(hit_info)
 
-            for r in mutation_info['resistance']:
+            for r in mutation_info.resistance:
                 notes_out['results'][r] = True
 
     
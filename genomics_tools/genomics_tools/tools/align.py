@@ -11,22 +11,39 @@
 #
 ###################################################################
 
-from collections import namedtuple
+from collections import defaultdict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import glob
 import os
 import shutil
 import subprocess as sp
+import tempfile
+import time
 
 from .environment import (
     log_message, log_error,
     check_dir, valid_dir
 )
 
+from .discovery import find_tool
+from .resources import run_process
+from .tools import (
+    fasta_index_path, fasta_iterator_path
+)
+
+from .timing import (
+    record_child, span
+)
+
 BLASTSettings = namedtuple('BLASTSettings', [
     'task', 'identity', 
     'relative_minlen', 'absolute_minlen',
     'include_sequences'
     ])
 
+QueryWindow = namedtuple('QueryWindow', ['name', 'contig_id', 'order',
+    'offset', 'length', 'contig_length'])
+
 _platform = os.name
 
 def create_blastdb(fastaflname, dbpath):
@@ -41,7 +58,7 @@ def create_blastdb(fastaflname, dbpath):
 
     valid_dir(os.path.dirname(dbpath))
     makeblastdb_name = 'makeblastdb'
-    makeblastdb = shutil.which(makeblastdb_name)
+    makeblastdb = find_tool(makeblastdb_name)
 
     if makeblastdb is None:
         raise RuntimeError('Missing ncbi->makeblastdb')
@@ -77,26 +94,39 @@ def create_blastdb(fastaflname, dbpath):
 
     log_message('Done creating BLASTDatabase!')
 
-def align_blast_nodb(query, subject, settings, env):
-    # There are differences in results between using
-    # a formated blastdb, verses just using a
-    # subject sequence
+# What we ask BLASTn to report for each hit
+_BLAST_FORMAT = [
+    '7',
+    'qseqid',
+    'sseqid',
+    'pident',
+    'length',
+    'mismatch',
+    'gapopen',
+    'qstart',
+    'qend',
+    'sstart',
+    'send',
+    'evalue',
+    'bitscore'
+]
+
+def blastn_command(query, subject, settings, threads, outputfile,
+    search_space=None):
+    """
+    Builds the BLASTn command for aligning a query against
+    reference sequences without a blast db
+
+    :param query: The path to the query
+    :param subject: The path to the reference sequences
+    :param settings: The `BLASTSettings` to run with
+    :param threads: The number of threads to give BLASTn
+    :param outputfile: Where BLASTn writes its hits
+    :param search_space: Fixes the effective search space that
+        the e-values are computed with
+    """
 
-    blast_format = [
-        '7',
-        'qseqid',
-        'sseqid',
-        'pident',
-        'length',
-        'mismatch',
-        'gapopen',
-        'qstart',
-        'qend',
-        'sstart',
-        'send',
-        'evalue',
-        'bitscore'
-    ]
+    blast_format = list(_BLAST_FORMAT)
 
     if settings.include_sequences:
         blast_format.extend(['qseq', 'sseq'])
@@ -104,12 +134,10 @@ def align_blast_nodb(query, subject, settings, env):
     # Create the format string
     blast_formatstr = ' '.join(blast_format)
 
-    # Path for the output file
-    outputfile = os.path.join(env.tempdir, 'blastout.txt')
     blastn_name = "blastn"
 
     # blastn path
-    blastn = shutil.which(blastn_name)
+    blastn = find_tool(blastn_name)
 
     # Check to make sure the tool exists
     if blastn is None:
@@ -125,7 +153,7 @@ def align_blast_nodb(query, subject, settings, env):
        '-task', settings.task,
        '-subject', subject,
        '-query', query,
-       '-num_threads', str(max(1, min(4, env.threads-1))),
+       '-num_threads', str(threads),
        '-out', outputfile,
        '-perc_identity', str(int(100.0*settings.identity)),
        '-outfmt',  '{}'.format(blast_formatstr),
@@ -133,31 +161,406 @@ def align_blast_nodb(query, subject, settings, env):
        '-dust', 'no'
     ]
 
-    log_message('BLASTn running command: {}'.format(
-    ' '.join(blastn_args)))
-
-    # Run the blast command
-    child = sp.Popen(blastn_args, stdout=sp.PIPE, stderr=sp.PIPE)
-
-    # Check the output of the blastn
-    # this will wait until the process has finished
-    stdout, stderr = child.communicate()
+    if search_space is not None:
+        blastn_args.extend(['-searchsp', str(search_space)])
 
-    # Check the exit code
-    exit_code = child.returncode
+    return blastn_args
 
+def _check_blastn(exit_code, stdout, stderr):
     # Log what we got out of the blastn
     for line in stdout.decode().strip().split('\n'):
         log_message(line, extra=1)
 
     if exit_code:
-        log_error(stderr.strip())
+        log_error(stderr.decode().strip())
         raise RuntimeError('Error running BLASTn')
 
+def blast_search_space(query, subject):
+    """
+    Returns back the search space of a whole query against all
+    of the references. Passing it to every BLASTn keeps the
+    e-values the same no matter how the work is split up.
+
+    :param query: The path to the query
+    :param subject: The path to the reference sequences
+    """
+    return sum(length for _, _, length in fasta_index_path(query)) * \
+        sum(length for _, _, length in fasta_index_path(subject))
+
+def align_blast_nodb(query, subject, settings, env, outputfile=None,
+    search_space=None):
+    # There are differences in results between using
+    # a formated blastdb, verses just using a
+    # subject sequence
+
+    # Path for the output file
+    if outputfile is None:
+        outputfile = os.path.join(env.tempdir, 'blastout.txt')
+
+    valid_dir(os.path.dirname(outputfile))
+
+    blastn_args = blastn_command(query, subject, settings,
+        env.blast_threads, outputfile, search_space=search_space)
+
+    log_message('BLASTn running command: {}'.format(
+    ' '.join(blastn_args)))
+
+    with span('blastn'):
+        # Run the blast command, this will wait
+        # until the process has finished
+        exit_code, stdout, stderr, usage = run_process(blastn_args)
+
+    record_child('blastn', usage)
+    _check_blastn(exit_code, stdout, stderr)
+
     log_message('Done running BLASTn!')
 
     # Return the results as a GenotypeResults object
-    return GenotypeResults().load_hits(outputfile, 'blast')
+    with span('hit parsing'):
+        return GenotypeResults().load_hits(outputfile, 'blast')
+
+def shard_query(query, shard_dir, shards, overlap):
+    """
+    Cuts the contigs of a query into windows that overlap by
+    enough for any reference to fit in one of them whole, and
+    deals the windows out into shard files of about the same size.
+
+    :param query: The path to the query
+    :param shard_dir: Where to write the shards
+    :param shards: How many shards to make
+    :param overlap: How much neighbouring windows overlap, at
+        least as long as the longest reference
+    :returns: The paths to the shards and a dict of window
+        name -> `QueryWindow`
+    """
+
+    contigs = list(fasta_iterator_path(query))
+    total = sum(len(sequence) for _, sequence in contigs)
+
+    # Windows are never so small that most of each one is overlap
+    window = max(2 * overlap, -(-total // max(1, shards)) + overlap)
+    step = window - overlap
+
+    windows = []
+    for order, (contig_id, sequence) in enumerate(contigs):
+        offset = 0
+
+        while True:
+            length = min(window, len(sequence) - offset)
+            windows.append((QueryWindow(
+                name = 'window_{}'.format(len(windows)),
+                contig_id = contig_id,
+                order = order,
+                offset = offset,
+                length = length,
+                contig_length = len(sequence)
+            ), sequence[offset:offset+length]))
+
+            if offset + length >= len(sequence):
+                break
+
+            offset += step
+
+    paths = _write_shards(shard_dir, [(query_window.name, sequence) \
+        for query_window, sequence in windows], shards)
+
+    return paths, {query_window.name: query_window \
+        for query_window, _ in windows}
+
+def _write_shards(shard_dir, records, shards):
+    """
+    Deals fasta records out into shard files so that every shard
+    ends up with about as much sequence as the others
+
+    :param shard_dir: Where to write the shards
+    :param records: The (name, sequence) records to deal out
+    :param shards: How many shards to make
+    :returns: The paths to the shards that got anything
+    """
+
+    # Largest first, each to the shard with the least so far
+    loads = [0] * max(1, shards)
+    assigned = [[] for _ in loads]
+
+    for name, sequence in sorted(records, key=lambda record: \
+        -len(record[1])):
+
+        lightest = loads.index(min(loads))
+        loads[lightest] += len(sequence)
+        assigned[lightest].append((name, sequence))
+
+    valid_dir(shard_dir)
+    paths = []
+
+    for index, shard in enumerate(assigned):
+        if not shard:
+            continue
+
+        path = os.path.join(shard_dir, 'shard_{}.fasta'.format(index))
+
+        with open(path, 'w') as f:
+            for name, sequence in shard:
+                f.write('>{}\n'.format(name))
+
+                for i in range(0, len(sequence), 80):
+                    f.write(sequence[i:i+80])
+                    f.write('\n')
+
+        paths.append(path)
+
+    return paths
+
+def shard_references(subject, shards):
+    """
+    Splits the reference sequences into shards of about the same
+    total length. The shards are kept next to the references, so
+    when those are in the cache every sample shares one split.
+
+    :param subject: The path to the reference sequences
+    :param shards: How many shards to make
+    :returns: The paths to the shards
+    """
+
+    shard_dir = '{}.shards_{}'.format(subject, shards)
+    pattern = os.path.join(shard_dir, 'shard_*.fasta')
+
+    if os.path.isdir(shard_dir):
+        return sorted(glob.glob(pattern))
+
+    # Write them somewhere private and move them into place
+    # so nobody picks up a half written split
+    temp_dir = tempfile.mkdtemp(dir=os.path.dirname(subject))
+    _write_shards(temp_dir, list(fasta_iterator_path(subject)), shards)
+
+    try:
+        os.rename(temp_dir, shard_dir)
+
+    except OSError:
+        # Another worker got there first
+        shutil.rmtree(temp_dir)
+
+    return sorted(glob.glob(pattern))
+
+def _cut_by_window(query_window, qstart, qend):
+    # Whether the hit ran into an edge of its window that isn't
+    # also the edge of the contig, and so might be cut short
+    window_end = query_window.offset + query_window.length
+
+    return (qstart == query_window.offset + 1 and query_window.offset > 0) \
+        or (qend == window_end and window_end < query_window.contig_length)
+
+def _contains(outer, inner):
+    # Both are (contig, reference, qstart, qend, sstart, send)
+    return outer[2] <= inner[2] and inner[3] <= outer[3] and \
+        min(outer[4], outer[5]) <= min(inner[4], inner[5]) and \
+        max(inner[4], inner[5]) <= max(outer[4], outer[5]) and \
+        (outer[4] <= outer[5]) == (inner[4] <= inner[5])
+
+def merge_window_hits(paths, windows, outputfile, contigs=()):
+    """
+    Reads the hits from each shard, moves them from window
+    coordinates back onto the contigs and writes them out as one
+    hits file. Hits found twice in the overlap between two
+    windows are only kept once, and so is a hit that was cut
+    off at the edge of one window but found whole in the next.
+
+    :param paths: The BLASTn output of each shard
+    :param windows: The window name -> `QueryWindow` from
+        `shard_query`, any query not in it is a whole contig
+    :param outputfile: Where to write the merged hits
+    :param contigs: The ids of the contigs in the order they are
+        in the query, so the hits come out in the same order as
+        from one BLASTn
+    """
+
+    hits = {}
+    contig_order = {contig_id: order for order, contig_id in \
+        enumerate(contigs)}
+
+    for path in paths:
+        with open(path, 'r') as f:
+            for line in GenotypeResults().read_file(f):
+                parts = line.split('\t')
+                coordinates = [int(value) for value in parts[6:10]]
+
+                # Queries that weren't cut up are whole contigs
+                query_window = windows.get(parts[0])
+
+                if query_window is not None:
+                    parts[0] = query_window.contig_id
+                    coordinates[0] += query_window.offset
+                    coordinates[1] += query_window.offset
+                    contig_order.setdefault(parts[0], query_window.order)
+
+                else:
+                    # Anything we weren't told about goes last
+                    contig_order.setdefault(parts[0], len(windows) + \
+                        len(contig_order))
+
+                key = tuple(parts[:2]) + tuple(coordinates)
+
+                if key not in hits:
+                    hits[key] = (query_window, parts, coordinates)
+
+    # Hits can only swallow each other if they line up on the
+    # same contig and reference
+    groups = defaultdict(list)
+    for key, hit in hits.items():
+        groups[key[:2]].append(key)
+
+    for keys in groups.values():
+        for key in keys:
+            query_window, _, coordinates = hits[key]
+
+            if query_window is None or \
+                not _cut_by_window(query_window, coordinates[0],
+                coordinates[1]):
+                continue
+
+            if any(other != key and other in hits and \
+                _contains(other, key) for other in keys):
+                del hits[key]
+
+    merged = sorted(hits.values(), key=lambda hit: (contig_order[hit[1][0]],
+        hit[2][0], hit[1][1]))
+
+    valid_dir(os.path.dirname(outputfile))
+
+    with open(outputfile, 'w') as f:
+        f.write('# BLASTN merged from {} shards\n'.format(len(paths)))
+
+        for _, parts, coordinates in merged:
+            parts[6:10] = [str(value) for value in coordinates]
+            f.write('\t'.join(parts))
+            f.write('\n')
+
+    return len(merged)
+
+def align_blast_sharded(query, subject, settings, env, query_shards=1,
+    reference_shards=1, outputfile=None, search_space=None):
+    """
+    Aligns a query the same way as `align_blast_nodb`, but cuts
+    the query and/or the references into shards first and runs a
+    BLASTn on every pair of them at the same time. The hits come
+    back in contig coordinates as if everything had been aligned
+    in one go.
+
+    The e-values are all computed with the search space of the
+    whole query against all of the references, so they don't
+    change with how things were split up.
+
+    :param query: The path to the query
+    :param subject: The path to the reference sequences
+    :param settings: The `BLASTSettings` to run with
+    :param env: The environment object
+    :param query_shards: How many pieces to cut the query into
+    :param reference_shards: How many pieces to split the
+        references into
+    :param outputfile: Where to write the merged hits
+    :param search_space: The search space to compute the e-values
+        with, from `blast_search_space` if not given
+    """
+
+    if outputfile is None:
+        outputfile = os.path.join(env.tempdir, 'blastout.txt')
+
+    if search_space is None:
+        search_space = blast_search_space(query, subject)
+
+    shard_dir = os.path.join(env.tempdir, 'query_shards')
+    longest_reference = max(length for _, _, length in \
+        fasta_index_path(subject))
+
+    try:
+        if query_shards > 1:
+            # Any reference has to fit inside one window for
+            # the hits against it to be found whole
+            query_paths, windows = shard_query(query, shard_dir,
+                query_shards, longest_reference)
+
+        else:
+            query_paths, windows = [query], {}
+
+        subject_paths = shard_references(subject, reference_shards) \
+            if reference_shards > 1 else [subject]
+
+        # The shards share the BLASTn threads this sample was given,
+        # so running a sample sharded doesn't take any more of the
+        # machine than running it whole
+        pairs = len(query_paths) * len(subject_paths)
+        parallel = min(pairs, env.blast_threads)
+        threads = max(1, env.blast_threads // pairs)
+
+        valid_dir(shard_dir)
+        commands = []
+        outputs = []
+
+        for i, query_path in enumerate(query_paths):
+            for j, subject_path in enumerate(subject_paths):
+                output = os.path.join(shard_dir, 'hits_{}_{}.txt'.format(
+                    i, j))
+                outputs.append(output)
+                commands.append(blastn_command(query_path, subject_path,
+                    settings, threads, output, search_space=search_space))
+
+        log_message('BLASTn running on {} query shards against {} reference'
+            ' shards, {} at a time'.format(len(query_paths),
+                len(subject_paths), parallel))
+
+        with span('blastn'):
+            with ThreadPoolExecutor(max_workers=parallel) as pool:
+                runs = list(pool.map(run_process, commands))
+
+        for exit_code, stdout, stderr, usage in runs:
+            record_child('blastn', usage)
+            _check_blastn(exit_code, stdout, stderr)
+
+        hit_count = merge_window_hits(outputs, windows, outputfile,
+            contigs=[contig_id for contig_id, _, _ in \
+                fasta_index_path(query)])
+
+    finally:
+        shutil.rmtree(shard_dir, ignore_errors=True)
+
+    log_message('Done running BLASTn, {} hits after merging shards'.format(
+        hit_count))
+
+    with span('hit parsing'):
+        return GenotypeResults().load_hits(outputfile, 'blast')
+
+def calibrate_blast(query, subject, settings, env, thread_counts):
+    """
+    Times BLASTn on this machine with each of the thread counts
+    so that we know how well it scales before deciding how to
+    split up the cores.
+
+    :param query: The path to a representative query
+    :param subject: The path to the reference sequences
+    :param settings: The `BLASTSettings` to run with
+    :param env: The environment object
+    :param thread_counts: The thread counts to try
+    :returns: A dict of thread count -> seconds
+    """
+
+    timings = {}
+    calibration_env = env.copy()
+
+    for threads in sorted(set(thread_counts)):
+        calibration_env.blast_threads = threads
+        outputfile = os.path.join(env.tempdir, 'calibration',
+            'blastout.{}.txt'.format(threads))
+
+        start = time.time()
+        align_blast_nodb(query, subject, settings, calibration_env,
+            outputfile=outputfile)
+        timings[threads] = time.time() - start
+
+        log_message('BLASTn with {} thread(s) took {:.2f} seconds'.format(
+            threads, timings[threads]), extra=1)
+
+        os.remove(outputfile)
+
+    return timings
 
 class GenotypeHit(object):
 
@@ -372,6 +775,20 @@ class GenotypeResults(object):
 
         return self
 
+    def filter(self, identity):
+        """
+        Returns back a new results object with only the hits
+        that would have passed BLAST's -perc_identity at the
+        requested identity
+
+        :param identity: The minimum identity as a fraction
+        """
+        results = GenotypeResults()
+        results._hits = [hit for hit in self._hits \
+            if hit.identity >= identity]
+
+        return results
+
     @property
     def hits(self):
         return self._hits
@@ -0,0 +1,141 @@
+###################################################################
+#
+# On disk caches shared between samples, workers and runs.
+# 
+# This tool is a sample and distillation of the real application
+# hosted at: https://github.com/theMPatel/functional_genomics_tools
+#
+# Author: Milan Patel
+# Contact: https://github.com/theMPatel
+# Version 1.0
+#
+###################################################################
+
+import hashlib
+import json
+import os
+import uuid
+
+from .environment import (
+    valid_dir, log_warning
+)
+
+def make_key(*parts):
+    """
+    Creates a cache key out of any json serializable parts
+
+    :param parts: The things that make an entry unique
+    """
+    data = json.dumps(parts, sort_keys=True)
+    return hashlib.sha1(data.encode()).hexdigest()
+
+class ResultCache(object):
+    """
+    A content addressed cache of json results. Every entry is
+    a single file named after its key, and the modification
+    time of the file doubles as the last time it was used so that
+    the cache can be shared by as many processes as you like.
+    When the total size of the entries grows past the limit, the
+    least recently used ones get removed.
+    """
+
+    _suffix = '.json'
+
+    def __init__(self, directory, max_size):
+        self._directory = directory
+        self._max_size = max_size
+        valid_dir(self._directory)
+
+    def _path(self, key):
+        return os.path.join(self._directory, key + self._suffix)
+
+    def get(self, key):
+        """
+        Returns back the cached result for the key or None
+        if we have not seen it before.
+
+        :param key: The key for the entry
+        """
+
+        path = self._path(key)
+
+        try:
+            with open(path, 'r') as f:
+                content = json.load(f)
+
+        except FileNotFoundError:
+            return None
+
+        except ValueError:
+            log_warning('Ignoring corrupt cache entry: {}'.format(path))
+            return None
+
+        # Mark the entry as recently used
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+        return content
+
+    def put(self, key, content):
+        """
+        Stores the content under the key and evicts anything
+        that no longer fits.
+
+        :param key: The key for the entry
+        :param content: Json serializable content
+        """
+
+        path = self._path(key)
+        temp_path = '{}.{}'.format(path, uuid.uuid4().hex)
+
+        with open(temp_path, 'w') as f:
+            json.dump(content, f)
+
+        os.replace(temp_path, path)
+        self.evict()
+
+    def evict(self):
+        """
+        Removes the least recently used entries until the cache
+        fits within its size limit
+        """
+
+        entries = []
+        total = 0
+
+        for name in os.listdir(self._directory):
+            if not name.endswith(self._suffix):
+                continue
+
+            path = os.path.join(self._directory, name)
+
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+
+        entries.sort()
+
+        for _, size, path in entries:
+            if total <= self._max_size:
+                break
+
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+            total -= size
+
+    @property
+    def directory(self):
+        return self._directory
+
+    @property
+    def max_size(self):
+        return self._max_size
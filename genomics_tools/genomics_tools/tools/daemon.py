@@ -0,0 +1,229 @@
+###################################################################
+#
+# A long lived server that keeps everything the pipeline needs
+# warm and runs the samples it is sent over a unix socket.
+#
+# This tool is a sample and distillation of the real application
+# hosted at: https://github.com/theMPatel/functional_genomics_tools
+#
+# Author: Milan Patel
+# Contact: https://github.com/theMPatel
+# Version 1.0
+#
+###################################################################
+
+from concurrent.futures import ThreadPoolExecutor
+import json
+import os
+import socket
+import socketserver
+import stat
+import threading
+
+from .environment import (
+    log_message, log_exception
+)
+
+# The protocol is one json object per line in both directions.
+# A client sends:
+#
+#   {"query": "/path/to/genome.fasta"}
+#   {"command": "shutdown"}
+#
+# and gets back one line for each query as soon as it finishes,
+# which might not be in the order they were sent:
+#
+#   {"query": "...", "status": "done", "result": {...}}
+#   {"query": "...", "status": "failed", "error": "..."}
+
+def _remove_stale_socket(socket_path):
+    # A socket left over from a server that died would keep us
+    # from binding, but anything else at that path isn't ours
+    # to remove
+    if not os.path.lexists(socket_path):
+        return
+
+    if not stat.S_ISSOCK(os.lstat(socket_path).st_mode):
+        raise RuntimeError('Not a socket, refusing to replace: {}'.format(
+            socket_path))
+
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+    try:
+        client.connect(socket_path)
+
+    except OSError:
+        os.unlink(socket_path)
+        return
+
+    finally:
+        client.close()
+
+    raise RuntimeError('A daemon is already running on: {}'.format(
+        socket_path))
+
+class _SampleHandler(socketserver.StreamRequestHandler):
+
+    def setup(self):
+        super(_SampleHandler, self).setup()
+        self._write_lock = threading.Lock()
+
+    def respond(self, response):
+        data = (json.dumps(response) + '\n').encode()
+
+        # Jobs finish on the worker threads, make sure
+        # their responses don't interleave
+        with self._write_lock:
+            try:
+                self.wfile.write(data)
+                self.wfile.flush()
+
+            except OSError:
+                # The client went away, the results
+                # are still in the results directory
+                pass
+
+    def handle(self):
+        pending = []
+
+        for line in self.rfile:
+            line = line.strip()
+
+            if not line:
+                continue
+
+            try:
+                request = json.loads(line.decode())
+
+            except ValueError:
+                self.respond({'status': 'failed',
+                    'error': 'Invalid request: {}'.format(line)})
+                continue
+
+            if request.get('command') == 'shutdown':
+                self.respond({'status': 'shutdown'})
+                self.server.request_shutdown()
+                break
+
+            query = request.get('query')
+
+            if not query:
+                self.respond({'status': 'failed',
+                    'error': 'Missing query in request'})
+                continue
+
+            pending.append(self.server.submit(query, self.respond))
+
+        # Keep the connection open until everything the
+        # client asked for has been answered
+        for future in pending:
+            future.result()
+
+class SampleServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Runs samples sent over a unix socket on a pool of workers.
+    Whatever the job function keeps loaded between calls
+    (databases, exports, tool paths) stays warm for the life
+    of the server.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, socket_path, job, workers=1):
+        """
+        :param socket_path: Where to create the unix socket
+        :param job: The function to call with the path to each query
+        :param workers: The number of samples to run at once
+        """
+
+        _remove_stale_socket(socket_path)
+
+        super(SampleServer, self).__init__(socket_path, _SampleHandler)
+
+        self._socket_path = socket_path
+        self._job = job
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers),
+            thread_name_prefix='worker')
+
+    def _run(self, query, respond):
+        try:
+            result = self._job(query)
+
+        except Exception as e:
+            # One bad sample shouldn't take down the server
+            log_exception('Failed running sample: {}'.format(query))
+            response = {'query': query, 'status': 'failed', 'error': str(e)}
+
+        else:
+            response = {'query': query, 'status': 'done', 'result': result}
+
+        respond(response)
+        return response
+
+    def submit(self, query, respond):
+        """
+        Queues a query on the worker pool
+
+        :param query: The path to the query
+        :param respond: Called with the response once the query is done
+        """
+        return self._pool.submit(self._run, query, respond)
+
+    def request_shutdown(self):
+        # shutdown() waits for serve_forever() to return, so it
+        # can't be called from one of the handler threads directly
+        threading.Thread(target=self.shutdown).start()
+
+    def serve(self):
+        log_message('Listening for samples on: {}'.format(self._socket_path))
+
+        try:
+            self.serve_forever()
+
+        finally:
+            self._pool.shutdown(wait=True)
+            self.server_close()
+
+            if os.path.exists(self._socket_path):
+                os.unlink(self._socket_path)
+
+        log_message('Sample server shut down')
+
+def submit_samples(socket_path, queries):
+    """
+    Sends queries to a running server and yields back the
+    responses as they come in.
+
+    :param socket_path: The path to the server's unix socket
+    :param queries: The paths to the queries to run
+    """
+
+    queries = [os.path.realpath(query) for query in queries]
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+        stream = sock.makefile('rwb')
+
+        for query in queries:
+            stream.write((json.dumps({'query': query}) + '\n').encode())
+
+        stream.flush()
+
+        # Let the server know we aren't sending anything else
+        sock.shutdown(socket.SHUT_WR)
+
+        for line in stream:
+            yield json.loads(line.decode())
+
+def shutdown_server(socket_path):
+    """
+    Asks a running server to finish what it is doing and exit.
+
+    :param socket_path: The path to the server's unix socket
+    """
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+        sock.sendall((json.dumps({'command': 'shutdown'}) + '\n').encode())
+        sock.shutdown(socket.SHUT_WR)
+        sock.makefile('rb').readline()
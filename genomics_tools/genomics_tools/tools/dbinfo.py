@@ -11,11 +11,16 @@
 #
 ###################################################################
 
-from collections import namedtuple, defaultdict
+from collections import namedtuple, defaultdict, OrderedDict
+import hashlib
 import os
+import uuid
 
 from .tools import (
     parse_fasta, is_fasta,
+    fasta_index_path, fasta_sequence_at,
+    fasta_sequences_at,
+    chunked_file_reader
 )
 
 from .environment import (
@@ -53,7 +58,7 @@ def notes_parser(line, sep=':'):
         parts.append('')
 
     antibiotic = parts[1].replace('resistance', '')
-    antibiotic = map(str.strip, antibiotic.split(','))
+    antibiotic = list(filter(None, map(str.strip, antibiotic.split(','))))
 
     return LocusInfo(
         locus = parts[0],
@@ -62,16 +67,79 @@ def notes_parser(line, sep=':'):
         other = parts[2]
     )
 
+def database_version(dirpath):
+    """
+    Creates a snapshot version for a database directory from
+    the contents of every file in it. Two directories holding
+    the same files will always share a version.
+
+    :param dirpath: The path to the database directory
+    """
+
+    digest = hashlib.sha1()
+
+    for name in sorted(os.listdir(dirpath)):
+        file_path = os.path.join(dirpath, name)
+
+        if not os.path.isfile(file_path):
+            continue
+
+        digest.update(name.encode())
+
+        with open(file_path, 'rb') as f:
+            for block in chunked_file_reader(f):
+                digest.update(block)
+
+    return digest.hexdigest()
+
+def export_once(cache_dir, key, format_sequences):
+    """
+    Exports sequences into a shared cache directory under a name
+    derived from the key. The file is only written the first
+    time anyone asks for this key, everyone else reuses it.
+
+    :param cache_dir: The shared cache directory
+    :param key: What makes this export different from the others
+    :param format_sequences: Returns back the fasta to write
+    :returns: The path to the exported sequences
+    """
+
+    filepath = os.path.join(cache_dir, 'references',
+        hashlib.sha1(key.encode()).hexdigest(), 'references.fasta')
+
+    if not os.path.exists(filepath):
+        # Samples running at once can all get here first
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+
+        # Write to a private file first and rename it
+        # so that nobody reads a half written export
+        temp_path = '{}.{}'.format(filepath, uuid.uuid4().hex)
+        with open(temp_path, 'w') as f:
+            f.write(format_sequences())
+
+        os.replace(temp_path, filepath)
+
+    return filepath
+
 class DbInfo(object):
     # Class that will hold the db information
     def __init__(self, dirpath, seq_parser = sequence_parser,
-        note_parser = notes_parser):
+        note_parser = notes_parser, lazy = False):
 
         self._notes = {}
         self._sequences = {}
         self._dirpath = dirpath
         self._separator = None
 
+        # When lazy, only the headers and where to find the
+        # sequence on disk are kept around. The sequences
+        # themselves are read whenever they are asked for.
+        self._lazy = lazy
+        self._locations = {}
+
+        self._version = None
+        self._export_path = None
+
         if dirpath is None or not check_dir(dirpath):
             raise RuntimeError('Invalid path provided for '
                 ' database fastas: {}'.format(str(dirpath)))
@@ -92,9 +160,7 @@ class DbInfo(object):
             if not is_fasta(file_path):
                 continue
 
-            sequences = parse_fasta(file_path)
-
-            for seq_id, sequence in sequences.items():
+            for seq_id, sequence, location in self.load_fasta(file_path):
                 # Create a named tuple that contains the 
                 # header split out into its different
                 # attributes plus the sequence
@@ -111,11 +177,11 @@ class DbInfo(object):
                         len(sequence_counts[allele_id])
                     )
                     sequence_counts[allele_id][new_id] = True
-                    self._sequences[new_id] = seq_info
+                    self.add_sequence(new_id, seq_info, location)
 
                 else:
                     sequence_counts[allele_id][allele_id] = True
-                    self._sequences[allele_id] = seq_info
+                    self.add_sequence(allele_id, seq_info, location)
 
         file_path = os.path.join(dirpath, 'notes.txt')
         if os.path.exists(file_path):
@@ -129,6 +195,48 @@ class DbInfo(object):
                     notes_info = note_parser(line)
                     self._notes[notes_info.locus] = notes_info
 
+    def load_fasta(self, file_path):
+        """
+        Loads the records of a single fasta file. When the
+        database is lazy, the sequence that comes back is None
+        and the location can be used to read it later on.
+
+        :param file_path: The path to the fasta file
+        :returns: An iterator of (seq_id, sequence, location)
+        """
+
+        if not self._lazy:
+            for seq_id, sequence in parse_fasta(file_path).items():
+                yield seq_id, sequence, None
+
+            return
+
+        # Keep the last record for duplicate ids the same
+        # way that parse_fasta does
+        records = OrderedDict()
+        for seq_id, offset, length in fasta_index_path(file_path):
+            records[seq_id] = (file_path, offset, length)
+
+        for seq_id, location in records.items():
+            yield seq_id, None, location
+
+    def add_sequence(self, seq_id, seq_info, location=None):
+        self._sequences[seq_id] = seq_info
+
+        if location is not None:
+            self._locations[seq_id] = location
+
+    @property
+    def version(self):
+        if self._version is None:
+            self._version = database_version(self._dirpath)
+
+        return self._version
+
+    @property
+    def lazy(self):
+        return self._lazy
+
     @property
     def sequences(self):
         return self._sequences
@@ -148,29 +256,120 @@ class DbInfo(object):
         """
         valid_dir(os.path.dirname(filepath))
         with open(filepath, 'w') as f:
+            f.write(self._format_sequences())
+
+    def export_cached(self, cache_dir):
+        """
+        Exports the sequences into a shared cache directory
+        under a name derived from the database version. The
+        file is only written the first time any worker asks for
+        this version, everyone else reuses it.
 
-            for seq_id, seq_info in self._sequences.items():
-                
-                # The fasta file should look like:
-                # 
-                # >allele_id|1234
-                # ACGTACGTACGTACGTACGTACGTACGTACGT
-                # ACGTACGTACGTACGTACGTACGTACGTACGT
+        :param cache_dir: The shared cache directory
+        :returns: The path to the exported sequences
+        """
 
-                ostr = '>{}|{}\n{}\n'
+        if self._export_path is not None and \
+            os.path.exists(self._export_path):
+            return self._export_path
 
-                f.write(ostr.format(
-                    seq_id,
-                    len(seq_info.sequence),
-                    seq_info.sequence
-                    )
+        self._export_path = export_once(cache_dir, self.export_key,
+            self._format_sequences)
+
+        return self._export_path
+
+    @property
+    def export_key(self):
+        # Subclasses name their sequences differently so
+        # they can't share an export of the same files
+        return '{}.{}:{}'.format(
+            type(self).__module__,
+            type(self).__name__,
+            self.version
+            )
+
+    def _format_sequences(self, prefix=''):
+        """
+        Formats every sequence as a fasta record
+
+        :param prefix: Goes in front of every sequence id
+        """
+        out = []
+
+        if self._lazy:
+            sequences = self._read_sequences()
+
+        for seq_id, seq_info in self._sequences.items():
+            
+            # The fasta file should look like:
+            # 
+            # >allele_id|1234
+            # ACGTACGTACGTACGTACGTACGTACGTACGT
+            # ACGTACGTACGTACGTACGTACGTACGTACGT
+
+            ostr = '>{}{}|{}\n{}\n'
+
+            if self._lazy:
+                sequence = sequences[self._locations[seq_id][:2]]
+            else:
+                sequence = seq_info.sequence
+
+            out.append(ostr.format(
+                prefix,
+                seq_id,
+                len(sequence),
+                sequence
                 )
+            )
+
+        return ''.join(out)
 
     def get_refseq(self, ref):
-        if ref in self._sequences:
+        if ref not in self._sequences:
+            raise KeyError('Missing reference: {}'.format(ref))
+
+        if not self._lazy:
             return self._sequences[ref].sequence
 
-        raise KeyError('Missing reference: {}'.format(ref))
+        return self._read_sequence(ref)
+
+    def get_reflen(self, ref):
+        """
+        Returns the length of a reference without having
+        to read the sequence of a lazy database.
+
+        :param ref: The reference id
+        """
+        if ref not in self._sequences:
+            raise KeyError('Missing reference: {}'.format(ref))
+
+        if not self._lazy:
+            return len(self._sequences[ref].sequence)
+
+        return self._locations[ref][2]
+
+    def _read_sequence(self, ref):
+        file_path, offset, _ = self._locations[ref]
+        return fasta_sequence_at(file_path, offset)
+
+    def _read_sequences(self):
+        """
+        Reads every sequence of a lazy database going through
+        each of the fasta files only once
+
+        :returns: A dictionary of (file_path, offset) to sequence
+        """
+        offsets = defaultdict(list)
+        for file_path, offset, _ in self._locations.values():
+            offsets[file_path].append(offset)
+
+        sequences = {}
+        for file_path, file_offsets in offsets.items():
+            for offset, sequence in fasta_sequences_at(
+                file_path, file_offsets).items():
+                sequences[(file_path, offset)] = sequence
+
+        return sequences
 
     def results_parser(self, results, f=None):
 
@@ -229,7 +428,7 @@ class DbInfo(object):
             # Add it to the results out
             results_out['extra'].extend(hit_information)
 
-        for sequence_info in sequences.itervalues():
+        for sequence_info in sequences.values():
 
             locus = sequence_info.locus
             allele = sequence_info.allele
@@ -238,4 +437,101 @@ class DbInfo(object):
             if gene_name not in results_out['results']:
                 results_out['results'][gene_name] = False
 
-        return results_out
\ No newline at end of file
+        return results_out
+
+class CombinedReferences(object):
+    """
+    Several databases put together into one set of references so
+    that a sample only has to be aligned once for all of them.
+    Each reference is named after the database it came from, so
+    the hits can be handed back to the right database under the
+    reference ids that database knows them by.
+    """
+
+    separator = '__'
+
+    def __init__(self, databases):
+        """
+        :param databases: An OrderedDict of name -> database, the
+            names can't contain the separator
+        """
+
+        self._databases = OrderedDict(databases)
+        self._version = None
+        self._export_path = None
+
+        for name in self._databases:
+            if self.separator in name:
+                raise ValueError('Invalid database name: {}'.format(name))
+
+    @property
+    def databases(self):
+        return self._databases
+
+    @property
+    def version(self):
+        if self._version is None:
+            digest = hashlib.sha1()
+
+            for name, database in self._databases.items():
+                digest.update('{}={};'.format(name,
+                    database.export_key).encode())
+
+            self._version = digest.hexdigest()
+
+        return self._version
+
+    def split_reference(self, reference_id):
+        """
+        Returns back the name of the database a reference came
+        from and its id in that database
+
+        :param reference_id: The reference id from the export
+        :raises: KeyError if it didn't come from any of them
+        """
+
+        name, separator, seq_id = reference_id.partition(self.separator)
+
+        if not separator or name not in self._databases:
+            raise KeyError('Reference from an unknown database: {}'.format(
+                reference_id))
+
+        return name, seq_id
+
+    def get_reflen(self, ref):
+        name, seq_id = self.split_reference(ref)
+        return self._databases[name].get_reflen(seq_id)
+
+    def export_sequences(self, filepath):
+        """
+        Exports the sequences of all of the databases into one
+        file
+
+        :param filepath: The path to dump the sequences to
+        """
+        valid_dir(os.path.dirname(filepath))
+        with open(filepath, 'w') as f:
+            f.write(self._format_sequences())
+
+    def export_cached(self, cache_dir):
+        """
+        Same as `DbInfo.export_cached`, for all of the databases
+        at once
+
+        :param cache_dir: The shared cache directory
+        :returns: The path to the exported sequences
+        """
+
+        if self._export_path is not None and \
+            os.path.exists(self._export_path):
+            return self._export_path
+
+        self._export_path = export_once(cache_dir,
+            'combined:' + self.version, self._format_sequences)
+
+        return self._export_path
+
+    def _format_sequences(self):
+        return ''.join(database._format_sequences(
+            prefix=name + self.separator) for name, database in \
+                self._databases.items())
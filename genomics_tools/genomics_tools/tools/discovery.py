@@ -0,0 +1,225 @@
+###################################################################
+#
+# Finds the tools and data directories the genotyping needs and
+# remembers where they were between runs, so we don't have to
+# walk the whole path every time we start.
+#
+# This tool is a sample and distillation of the real application
+# hosted at: https://github.com/theMPatel/functional_genomics_tools
+#
+# Author: Milan Patel
+# Contact: https://github.com/theMPatel
+# Version 1.0
+#
+###################################################################
+
+import json
+import os
+import shutil
+import threading
+
+from .environment import (
+    log_message, log_warning,
+    populate_syspath, find_directory_on_path,
+    full_path, valid_dir
+)
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime
+
+    except OSError:
+        return None
+
+class ResolutionCache(object):
+    """
+    A manifest of tools and directories we have found before.
+    Each entry remembers the modification time of what it points
+    to and is only trusted while that hasn't changed, so a tool
+    that was upgraded or a directory that was moved gets looked
+    up again.
+    """
+
+    def __init__(self, path):
+        """
+        :param path: Where the manifest lives, None to only
+            remember things for this run
+        """
+
+        self._path = path
+        self._entries = {}
+        self._lock = threading.Lock()
+
+        if path is not None and os.path.exists(path):
+            try:
+                with open(path, 'r') as f:
+                    self._entries = json.load(f)
+
+            except (OSError, ValueError):
+                log_warning('Ignoring unreadable discovery cache: {}'.format(
+                    path))
+
+    def get(self, key):
+        """
+        Returns back the path saved under key if it is still
+        valid, otherwise None
+        """
+
+        with self._lock:
+            entry = self._entries.get(key)
+
+        if entry is None:
+            return None
+
+        mtime = _mtime(entry['path'])
+
+        if mtime is None or mtime != entry['mtime']:
+            return None
+
+        return entry['path']
+
+    def put(self, key, path):
+        """
+        Saves a path under key and writes out the manifest
+
+        :param key: What the path was found for
+        :param path: The path that was found
+        """
+
+        with self._lock:
+            self._entries[key] = {'path': path, 'mtime': _mtime(path)}
+
+            if self._path is None:
+                return
+
+            valid_dir(os.path.dirname(self._path))
+            temp_path = self._path + '.tmp'
+
+            with open(temp_path, 'w') as f:
+                json.dump(self._entries, f, indent=4, sort_keys=True)
+
+            os.replace(temp_path, self._path)
+
+    @property
+    def path(self):
+        return self._path
+
+class ToolLocator(object):
+    """
+    Finds tools and data directories, first from any directories
+    we were told about, then from the cache, and only then by
+    walking the tool directories and the path. Whatever is found
+    is kept for the rest of the run so every sample after the
+    first gets it for free.
+    """
+
+    current = None
+
+    def __init__(self, search_dirs, cache=None, bin_dir=None):
+        """
+        :param search_dirs: The directories our tools get
+            installed into, walked when something can't be found
+        :param cache: A `ResolutionCache`
+        :param bin_dir: A directory to take the tools from
+            without looking anywhere else
+        """
+
+        self._search_dirs = search_dirs
+        self._cache = cache if cache is not None else ResolutionCache(None)
+        self._bin_dir = bin_dir
+        self._found = {}
+        self._walked = False
+        self._lock = threading.Lock()
+
+        ToolLocator.current = self
+
+    def _walk_search_dirs(self):
+        # Adding all of the tool directories to the path is
+        # the slow part, only ever do it once
+        if not self._walked:
+            populate_syspath(self._search_dirs)
+            self._walked = True
+
+    def tool(self, name):
+        """
+        Returns back the full path to a tool, or None if it
+        can't be found
+
+        :param name: The name of the executable
+        """
+
+        key = 'tool:' + name
+
+        with self._lock:
+            if key in self._found:
+                return self._found[key]
+
+            if self._bin_dir is not None:
+                path = full_path(shutil.which(name, path=self._bin_dir))
+
+                if path is None:
+                    log_warning('{} is not in: {}'.format(name,
+                        self._bin_dir))
+
+                self._found[key] = path
+                return path
+
+            path = self._cache.get(key)
+
+            if path is None:
+                path = shutil.which(name)
+
+                if path is None:
+                    self._walk_search_dirs()
+                    path = shutil.which(name)
+
+                path = full_path(path)
+
+                if path is not None:
+                    self._cache.put(key, path)
+
+            self._found[key] = path
+            return path
+
+    def directory(self, name):
+        """
+        Returns back the full path to a directory somewhere under
+        the tool directories or the path
+
+        :param name: The name of the directory
+        :raises: RuntimeError if it can't be found
+        """
+
+        key = 'directory:' + name
+
+        with self._lock:
+            if key in self._found:
+                return self._found[key]
+
+            path = self._cache.get(key)
+
+            if path is None:
+                self._walk_search_dirs()
+                path = full_path(find_directory_on_path(name,
+                    os.environ['PATH']))
+                self._cache.put(key, path)
+
+            else:
+                log_message('Found {} in discovery cache: {}'.format(name,
+                    path))
+
+            self._found[key] = path
+            return path
+
+def find_tool(name):
+    """
+    Returns back the full path to a tool, or None if it can't be
+    found. Uses the current `ToolLocator` if there is one.
+
+    :param name: The name of the executable
+    """
+
+    if ToolLocator.current is not None:
+        return ToolLocator.current.tool(name)
+
+    return full_path(shutil.which(name))
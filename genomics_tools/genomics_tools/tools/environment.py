@@ -13,16 +13,17 @@
 ###################################################################
 
 import base64
-import collections
+import collections.abc
 from copy import deepcopy
 from datetime import datetime
 import inspect
 import json
 import logging
-import logging.handlers
 import os
 import shutil
 import tempfile
+import threading
+import time
 
 from . import deprecated
 
@@ -200,7 +201,7 @@ def get_message_depth(base_depth, extra=0):
 # adjustments with the 'extra' kwarg. You're welcome :)
 
 def log_algo_params(params, extra=1):
-    if isinstance(params, collections.Mapping):
+    if isinstance(params, collections.abc.Mapping):
         for key, value in params.items():
 
             if isinstance(value, list):
@@ -277,7 +278,7 @@ def write_results(name, content, b64encode=True):
         print('{} -> {}'.format(name, content))
 
     else:
-        ResultWriter.current.add_result(name, content, b64encode)
+        return ResultWriter.current.add_result(name, content, b64encode)
 
 # These are tokens for the paths to various assets attached to the
 # compute nodes. We used them to dynamically replace the head of
@@ -292,7 +293,15 @@ class Environment(object):
         self._resultsdir = None
         self._tempdir = None
         self._databasedir = None
+        self._cachedir = None
+        self._result_cache_size = 0
+        self._hitsdir = None
+        self._rethreshold = False
         self._threads = 2
+        self._blast_threads = None
+        self._query_shards = 1
+        self._reference_shards = 1
+        self._metricsdir = None
 
     @deprecated
     def get_sharedpath(self, path):
@@ -375,6 +384,10 @@ class Environment(object):
             if not settings[setting]:
                 continue
 
+            # Flags and numbers get handled below
+            if not isinstance(settings[setting], str):
+                continue
+
             if hasattr(self, setting):
 
                 # Get the path
@@ -389,6 +402,9 @@ class Environment(object):
         # Make sure we set ourselves up for logging
         self._logdir = os.path.join(self._resultsdir, 'logs')
 
+        # Timings and such for each sample go next to the results
+        self._metricsdir = os.path.join(self._resultsdir, 'results', 'metrics')
+
         # Create the correct resultsdir
         self._resultsdir = os.path.join(self._resultsdir, 'results', 'raw')
 
@@ -411,6 +427,28 @@ class Environment(object):
         else:
             self._threads = 2
 
+        # The size limit for the per sample results cache
+        # comes in as megabytes, zero turns it off
+        if settings.get('result_cache_mb'):
+            self._result_cache_size = \
+                int(settings['result_cache_mb']) * 1024 * 1024
+
+        else:
+            self._result_cache_size = 0
+
+        # Whether to interpret saved hits from the hitsdir
+        # rather than aligning again
+        self._rethreshold = bool(settings.get('rethreshold', False))
+
+        # How many pieces to cut each query into so that one big
+        # sample can be aligned by many BLASTn at once
+        self._query_shards = max(1, int(settings.get('query_shards') or 1))
+
+        # And how many pieces to split the references into, for
+        # when there are a lot of them
+        self._reference_shards = max(1,
+            int(settings.get('reference_shards') or 1))
+
     @property
     def databasedir(self):
         return self._databasedir
@@ -442,10 +480,69 @@ class Environment(object):
         valid_dir(value)
         self._resultsdir = value
 
+    @property
+    def metricsdir(self):
+        return self._metricsdir
+
+    @property
+    def cachedir(self):
+        return self._cachedir
+
+    @cachedir.setter
+    def cachedir(self, value):
+        valid_dir(value)
+        self._cachedir = value
+
+    @property
+    def result_cache_size(self):
+        return self._result_cache_size
+
+    @property
+    def hitsdir(self):
+        return self._hitsdir
+
+    @hitsdir.setter
+    def hitsdir(self, value):
+        valid_dir(value)
+        self._hitsdir = value
+
+    @property
+    def rethreshold(self):
+        return self._rethreshold
+
     @property
     def threads(self):
         return self._threads
 
+    @property
+    def blast_threads(self):
+        # Unless a thread plan says otherwise, leave one of
+        # our threads for the genotyping algorithm itself
+        if self._blast_threads is None:
+            return max(1, min(4, self._threads-1))
+
+        return self._blast_threads
+
+    @blast_threads.setter
+    def blast_threads(self, value):
+        self._blast_threads = max(1, int(value))
+
+    @property
+    def query_shards(self):
+        return self._query_shards
+
+    @query_shards.setter
+    def query_shards(self, value):
+        self._query_shards = max(1, int(value))
+
+    @property
+    def reference_shards(self):
+        return self._reference_shards
+
+    @reference_shards.setter
+    def reference_shards(self, value):
+        self._reference_shards = max(1, int(value))
+
     @property
     def tempdir(self):
         return self._tempdir
@@ -455,26 +552,99 @@ class Environment(object):
         valid_dir(value)
         self._tempdir = value
 
-class SingleWriteFileHandler(logging.FileHandler):
+class SingleWriteFileHandler(logging.Handler):
     """
     This class is to be used in order to write to
     the progress file which is a single
     write file (only a single message can be in this file)
+
+    Other programs poll these files, so every write goes to a
+    temp file that is renamed over the real one and nobody ever
+    sees a half written file. Writes are also throttled: if
+    messages come in faster than min_interval, only the latest
+    one is written once the interval is up.
     """
-    def __init__(self, filename, mode='w', encoding=None, delay=0):
-        super(SingleWriteFileHandler, self).__init__(filename, mode, encoding, delay)
+    def __init__(self, filename, encoding=None, min_interval=0.25):
+        super(SingleWriteFileHandler, self).__init__()
+        self.baseFilename = os.path.abspath(filename)
+        self._encoding = encoding
+        self._min_interval = min_interval
+        self._last_write = None
+        self._pending = None
+        self._timer = None
 
     def emit(self, record):
         """
         Emit a record
 
-        Because we want to overwrite the file everytime we 
-        emit, we will always reopen the stream before calling
-        StreamHandler.emit
+        The lock is already held by logging when we get here
         """
+        try:
+            self._pending = self.format(record) + '\n'
+
+        except Exception:
+            self.handleError(record)
+            return
+
+        now = time.monotonic()
+
+        if self._last_write is None or \
+            now - self._last_write >= self._min_interval:
+
+            self._write_pending()
+
+        elif self._timer is None:
+            # Make sure the latest message still lands even
+            # if nothing else gets logged for a while
+            self._timer = threading.Timer(
+                self._last_write + self._min_interval - now,
+                self._deferred_write)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _deferred_write(self):
+        self.acquire()
+
+        try:
+            self._timer = None
+            self._write_pending()
+
+        finally:
+            self.release()
+
+    def _write_pending(self):
+        if self._pending is None:
+            return
 
-        self.stream = self._open()
-        logging.StreamHandler.emit(self, record)
+        temp_path = self.baseFilename + '.tmp'
+
+        try:
+            with open(temp_path, 'w', encoding=self._encoding) as f:
+                f.write(self._pending)
+
+            os.replace(temp_path, self.baseFilename)
+
+        except OSError:
+            # Keep it around for the next try
+            return
+
+        self._pending = None
+        self._last_write = time.monotonic()
+
+    def close(self):
+        self.acquire()
+
+        try:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+            self._write_pending()
+
+        finally:
+            self.release()
+
+        super(SingleWriteFileHandler, self).close()
 
 class ProgressFilter(object):
     """
@@ -510,7 +680,7 @@ class TabbedModifier(object):
         argument list
         """
 
-        if isinstance(record.args, collections.Mapping) and 'depth' in \
+        if isinstance(record.args, collections.abc.Mapping) and 'depth' in \
             record.args:
 
             new_msg = ''.join(['\t']*record.args['depth']) + \
@@ -652,4 +822,9 @@ class ResultWriter(object):
                 log_error('Failed to b64encode results!')
 
         with open(path, 'w') as f:
-            f.write(out)
\ No newline at end of file
+            f.write(out)
+
+        return path
+
+    def result_path(self, name):
+        return os.path.join(self._resultsdir, name)
\ No newline at end of file
@@ -0,0 +1,154 @@
+###################################################################
+#
+# Run manifests so that a cohort run can pick up where it left
+# off after a crash or a preempted node.
+#
+# This tool is a sample and distillation of the real application
+# hosted at: https://github.com/theMPatel/functional_genomics_tools
+#
+# Author: Milan Patel
+# Contact: https://github.com/theMPatel
+# Version 1.0
+#
+###################################################################
+
+from collections import OrderedDict, namedtuple
+import json
+import os
+import threading
+import time
+
+from .environment import (
+    valid_dir, log_warning
+)
+
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+SampleState = namedtuple('SampleState', [
+    'sample', 'state', 'output', 'error', 'time'])
+
+class RunManifest(object):
+    """
+    Keeps track of the state of every sample in a run. Every
+    change is appended to the manifest file as a json line the
+    moment it happens, so the file is always up to date without
+    rewriting it for every sample. Loading replays the lines and
+    the last state for a sample wins.
+    """
+
+    def __init__(self, path, resume=False):
+        """
+        :param path: The path to the manifest file
+        :param resume: Whether to keep the states from an earlier
+            run, otherwise the manifest starts out empty
+        """
+
+        self._path = path
+        self._states = OrderedDict()
+        self._lock = threading.Lock()
+
+        valid_dir(os.path.dirname(path))
+
+        if resume and os.path.exists(path):
+            self._load()
+
+        # Start a fresh file holding only the current states,
+        # which also drops all of the history from earlier runs
+        self._compact()
+
+    def _load(self):
+        with open(self._path, 'r') as f:
+            for line in f:
+                line = line.strip()
+
+                if not line:
+                    continue
+
+                try:
+                    record = json.loads(line)
+
+                except ValueError:
+                    # Most likely the last line of a run that
+                    # got killed while writing it
+                    log_warning('Ignoring bad manifest line: {}'.format(line))
+                    continue
+
+                state = SampleState(**record)
+                self._states[state.sample] = state
+
+    def _compact(self):
+        temp_path = self._path + '.tmp'
+
+        with open(temp_path, 'w') as f:
+            for state in self._states.values():
+                f.write(json.dumps(state._asdict()) + '\n')
+
+        os.replace(temp_path, self._path)
+
+    def _record(self, state):
+        with self._lock:
+            self._states[state.sample] = state
+
+            with open(self._path, 'a') as f:
+                f.write(json.dumps(state._asdict()) + '\n')
+                f.flush()
+
+    def add(self, sample, output):
+        """
+        Adds a sample to the run as pending unless we already
+        know about it
+
+        :param sample: The path to the sample
+        :param output: The path to where its results will be written
+        """
+        if sample in self._states:
+            return
+
+        self._record(SampleState(sample=sample, state=PENDING,
+            output=output, error=None, time=time.time()))
+
+    def mark(self, sample, state, error=None):
+        """
+        Moves a sample into a new state
+
+        :param sample: The path to the sample
+        :param state: One of PENDING, RUNNING, DONE or FAILED
+        :param error: Why the sample failed, if it did
+        """
+        self._record(self._states[sample]._replace(
+            state=state, error=error, time=time.time()))
+
+    def is_done(self, sample):
+        """
+        Whether a sample finished and its results are still
+        where we left them
+        """
+        state = self._states.get(sample)
+
+        return state is not None and state.state == DONE and \
+            os.path.exists(state.output)
+
+    def counts(self):
+        counts = OrderedDict((state, 0) for state in \
+            [PENDING, RUNNING, DONE, FAILED])
+
+        for state in self._states.values():
+            counts[state.state] += 1
+
+        return counts
+
+    def __getitem__(self, sample):
+        return self._states[sample]
+
+    def __iter__(self):
+        return iter(list(self._states.values()))
+
+    def __len__(self):
+        return len(self._states)
+
+    @property
+    def path(self):
+        return self._path
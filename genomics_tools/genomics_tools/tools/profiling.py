@@ -0,0 +1,190 @@
+###################################################################
+#
+# Profiling for individual samples so that a slow cohort can be
+# looked at without having to change any code.
+#
+# This tool is a sample and distillation of the real application
+# hosted at: https://github.com/theMPatel/functional_genomics_tools
+#
+# Author: Milan Patel
+# Contact: https://github.com/theMPatel
+# Version 1.0
+#
+###################################################################
+
+import cProfile
+from contextlib import contextmanager
+import glob
+import itertools
+import os
+import pstats
+import threading
+import tracemalloc
+
+from .environment import (
+    log_message, log_warning,
+    valid_dir
+)
+
+# How many allocation sites to write out for each sample
+_TOP_ALLOCATIONS = 25
+
+# Allocations made by the profiling itself aren't interesting
+_IGNORED_ALLOCATIONS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+)
+
+class SampleProfiler(object):
+    """
+    Profiles every Nth sample that runs through it. Each profiled
+    sample gets a cProfile stats file and a list of the lines
+    that allocated the most memory while it ran. Memory is only
+    traced while a sample is being profiled, and only one sample
+    is profiled at a time. cProfile only follows the thread it was
+    started on, so the stats belong to the one sample, but the
+    memory is traced for the whole process and picks up other
+    samples running at the same time.
+    """
+
+    def __init__(self, directory, every=1):
+        """
+        :param directory: Where to write the profiles
+        :param every: Only profile every Nth sample
+        """
+
+        self._directory = directory
+        self._every = max(1, every)
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+        self._active = threading.Lock()
+        self._started_tracing = False
+
+        valid_dir(directory)
+
+    @contextmanager
+    def profile(self, name):
+        """
+        Profiles the code inside the with block if it's this
+        sample's turn
+
+        :param name: The name to write the profile under
+        """
+
+        with self._lock:
+            index = next(self._counter)
+
+        if index % self._every:
+            yield
+            return
+
+        if not self._active.acquire(False):
+            log_warning('Another sample is being profiled, skipping'
+                ' profile for: {}'.format(name))
+            yield
+            return
+
+        profiler = cProfile.Profile()
+
+        try:
+            profiler.enable()
+
+        except ValueError:
+            # Newer pythons only allow one profiler at a time,
+            # somebody outside of us is using it
+            self._active.release()
+            log_warning('Another profiler is running, skipping'
+                ' profile for: {}'.format(name))
+            yield
+            return
+
+        # Tracing allocations slows everything down, only
+        # pay for it while a sample is being profiled
+        self._started_tracing = not tracemalloc.is_tracing()
+
+        if self._started_tracing:
+            tracemalloc.start()
+
+        try:
+            before = tracemalloc.take_snapshot()
+
+            try:
+                yield
+
+            finally:
+                profiler.disable()
+                after = tracemalloc.take_snapshot()
+
+                path = os.path.join(self._directory, '{:05d}.{}'.format(
+                    index, os.path.basename(name)))
+
+                profiler.dump_stats(path + '.prof')
+                write_allocations(path + '.allocations.txt', before, after)
+
+                log_message('Wrote profile to: {}.prof'.format(path))
+
+        finally:
+            self.close()
+            self._active.release()
+
+    def close(self):
+        if self._started_tracing and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+        self._started_tracing = False
+
+    @property
+    def directory(self):
+        return self._directory
+
+def write_allocations(path, before, after):
+    """
+    Writes out the lines that allocated the most memory
+    between two tracemalloc snapshots
+
+    :param path: Where to write the allocations
+    :param before: The snapshot from the start of the sample
+    :param after: The snapshot from the end of the sample
+    """
+
+    before = before.filter_traces(_IGNORED_ALLOCATIONS)
+    after = after.filter_traces(_IGNORED_ALLOCATIONS)
+
+    stats = after.compare_to(before, 'lineno')
+    stats.sort(key=lambda stat: -stat.size_diff)
+
+    current, peak = tracemalloc.get_traced_memory()
+
+    with open(path, 'w') as f:
+        f.write('# Traced memory now: {} bytes, peak: {} bytes\n'.format(
+            current, peak))
+        f.write('# Top {} allocation sites while the sample ran\n'.format(
+            _TOP_ALLOCATIONS))
+        f.write('# Allocations are traced for the whole process, other'
+            ' samples running at the same time show up here too\n')
+
+        for stat in stats[:_TOP_ALLOCATIONS]:
+            f.write('{}\n'.format(stat))
+
+def summarize_profiles(directory, stream=None, sort='cumulative', limit=30):
+    """
+    Merges all of the sample profiles in a directory and
+    prints out the functions that took the most time overall
+
+    :param directory: The directory the profiles were written to
+    :param stream: Where to print the summary, stdout by default
+    :param sort: What to sort the functions by
+    :param limit: How many functions to print
+    :returns: The number of profiles that were merged
+    """
+
+    paths = sorted(glob.glob(os.path.join(directory, '*.prof')))
+
+    if not paths:
+        return 0
+
+    stats = pstats.Stats(*paths, stream=stream)
+    stats.strip_dirs().sort_stats(sort).print_stats(limit)
+
+    return len(paths)
@@ -0,0 +1,177 @@
+###################################################################
+#
+# Progress through a batch of samples, weighted by how expensive
+# each sample is expected to be, along with an estimate of how
+# much longer the run has to go.
+#
+# This tool is a sample and distillation of the real application
+# hosted at: https://github.com/theMPatel/functional_genomics_tools
+#
+# Author: Milan Patel
+# Contact: https://github.com/theMPatel
+# Version 1.0
+#
+###################################################################
+
+from datetime import timedelta
+import threading
+import time
+
+from .environment import (
+    log_message, log_progress
+)
+
+# Roughly how much of a sample each stage accounts for, BLASTn
+# dwarfs everything else. A sample that finishes without going
+# through all of them (cached results, failures) still counts
+# in full once it is done.
+STAGE_WEIGHTS = {
+    'database load': 0.02,
+    'reference export': 0.03,
+    'blastn': 0.80,
+    'hit parsing': 0.05,
+    'find_mutations': 0.05,
+    'results_parser': 0.03,
+    'result writing': 0.02,
+}
+
+def format_eta(seconds):
+    """
+    Returns back the seconds left as something readable
+    """
+
+    if seconds is None:
+        return 'unknown'
+
+    return str(timedelta(seconds=int(round(seconds))))
+
+class ProgressTracker(object):
+    """
+    Keeps track of how far through a batch of samples we are.
+    Each sample counts for its share of the total estimated
+    cost, and the stages it finishes count for their share of
+    that, so the progress keeps moving while a big sample runs.
+
+    The progress file is rewritten on every update, the file
+    handler takes care of not writing it too often. The ETA
+    goes to the messages, once per whole percent.
+    """
+
+    current = None
+
+    def __init__(self, samples, costs, stage_weights=None):
+        """
+        :param samples: The samples in the batch
+        :param costs: The estimated cost of each sample
+        :param stage_weights: How much of a sample each stage
+            accounts for, `STAGE_WEIGHTS` by default
+        """
+
+        self._costs = dict(zip(samples, costs))
+        self._total = float(sum(self._costs.values()))
+        self._weights = STAGE_WEIGHTS if stage_weights is None \
+            else stage_weights
+
+        self._done = 0.
+        self._partial = {}
+        self._finished = set()
+        self._lock = threading.Lock()
+        self._start = time.monotonic()
+        self._last_percent = 0
+
+        ProgressTracker.current = self
+
+    def stage_done(self, sample, stage):
+        """
+        Counts a finished stage of a sample towards the progress
+
+        :param sample: The sample the stage ran for
+        :param stage: The name of the stage
+        """
+
+        weight = self._weights.get(stage)
+
+        if not weight or sample not in self._costs:
+            return
+
+        with self._lock:
+            if sample in self._finished:
+                return
+
+            done = self._partial.get(sample, 0.)
+            # A stage that runs more than once shouldn't push
+            # the sample past what it is worth
+            self._partial[sample] = min(0.99, done + weight)
+
+        self._report()
+
+    def sample_done(self, sample):
+        """
+        Counts the whole sample as done, whether or not it
+        succeeded
+
+        :param sample: The sample that finished
+        """
+
+        with self._lock:
+            if sample in self._finished or sample not in self._costs:
+                return
+
+            self._finished.add(sample)
+            self._partial.pop(sample, None)
+            self._done += self._costs[sample]
+
+        self._report()
+
+    def fraction(self):
+        """
+        Returns back how much of the batch is done, between 0 and 1
+        """
+
+        with self._lock:
+            return self._fraction()
+
+    def _fraction(self):
+        if not self._total:
+            return 1. if len(self._finished) == len(self._costs) else 0.
+
+        partial = sum(self._costs[sample] * done \
+            for sample, done in self._partial.items())
+
+        return min(1., (self._done + partial) / self._total)
+
+    def eta(self):
+        """
+        Returns back the estimated seconds left, or None if
+        nothing has finished yet to go on
+        """
+
+        with self._lock:
+            fraction = self._fraction()
+
+        if fraction <= 0.:
+            return None
+
+        elapsed = time.monotonic() - self._start
+        return elapsed * (1. - fraction) / fraction
+
+    def _report(self):
+        fraction = self.fraction()
+        percent = fraction * 100.
+
+        log_progress('{:.1f}'.format(percent))
+
+        with self._lock:
+            whole = int(percent)
+
+            if whole <= self._last_percent:
+                return
+
+            self._last_percent = whole
+
+        log_message('Progress: {} percent, about {} left'.format(whole,
+            format_eta(self.eta())))
+
+    def close(self):
+        if ProgressTracker.current is self:
+            ProgressTracker.current = None
@@ -0,0 +1,231 @@
+###################################################################
+#
+# Keeps track of the species we have databases for and which
+# species each sample belongs to, so that a batch of mixed
+# samples can be run one species at a time.
+#
+# This tool is a sample and distillation of the real application
+# hosted at: https://github.com/theMPatel/functional_genomics_tools
+#
+# Author: Milan Patel
+# Contact: https://github.com/theMPatel
+# Version 1.0
+#
+###################################################################
+
+from collections import OrderedDict
+import os
+import re
+import threading
+
+from .environment import (
+    log_warning, check_dir
+)
+
+def species_key(name):
+    """
+    Turns a species name the way people write it into the way
+    the database directories are named, e.g. 'Escherichia coli'
+    becomes 'escherichia_coli'
+
+    :param name: The name of the species
+    """
+    return re.sub(r'[\s.\-]+', '_', name.strip().lower()).strip('_')
+
+def read_species_manifest(path):
+    """
+    Reads a manifest of which species each sample is. Every line
+    is the file name of a sample and its species, separated by a
+    tab or a comma. Empty lines and lines starting with # are
+    skipped.
+
+    :param path: The path to the manifest
+    :returns: A mapping of sample file name to species name
+    """
+
+    samples = OrderedDict()
+
+    with open(path, 'r') as f:
+        for line in f:
+            line = line.strip()
+
+            if not line or line[0] == '#':
+                continue
+
+            parts = re.split(r'\t|,', line, maxsplit=1)
+
+            if len(parts) != 2 or not parts[1].strip():
+                raise RuntimeError('Invalid species manifest line: {}'.format(
+                    line))
+
+            samples[os.path.basename(parts[0].strip())] = parts[1].strip()
+
+    return samples
+
+class SpeciesRegistry(object):
+    """
+    Finds every species directory under a database directory and
+    routes samples to them. Only where each database lives is kept
+    here, the databases themselves are loaded the first time a
+    sample of that species asks for them.
+    """
+
+    current = None
+
+    def __init__(self, database_dir, samples=None, default=None,
+        detector=None):
+        """
+        :param database_dir: The directory holding one directory
+            for each species
+        :param samples: A mapping of sample file name to species
+        :param default: The species of samples not in the mapping
+        :param detector: Called with the path of a sample that is
+            not in the mapping to work out its species, returns None
+            if it can't
+        """
+
+        if not check_dir(database_dir):
+            raise RuntimeError('Invalid species database directory: {}'.format(
+                database_dir))
+
+        self._database_dir = database_dir
+        self._species = OrderedDict()
+
+        for name in sorted(os.listdir(database_dir)):
+            path = os.path.join(database_dir, name)
+
+            if name[0] not in '._' and os.path.isdir(path):
+                self._species[species_key(name)] = path
+
+        self._samples = {}
+
+        for sample, species in (samples or {}).items():
+            self._samples[sample] = self.resolve(species)
+
+            if self._samples[sample] not in self._species:
+                log_warning('No database for species {} of sample: {}'.format(
+                    species, sample))
+
+        self._default = self.resolve(default) if default else None
+        self._detector = detector
+        self._detected = {}
+        self._lock = threading.Lock()
+
+        SpeciesRegistry.current = self
+
+    def resolve(self, name):
+        """
+        Returns back the species a name refers to. Names are
+        matched the way the directories are named, and a name we
+        have no database for falls back to its genus, so that
+        'Salmonella enterica' uses a 'salmonella' database.
+
+        :param name: The name of the species
+        """
+
+        key = species_key(name)
+
+        if key not in self._species:
+            genus = key.split('_')[0]
+
+            if genus in self._species:
+                return genus
+
+        return key
+
+    def species_for(self, query_path):
+        """
+        Returns back the species of a sample. The mapping we were
+        given wins, then the detector, then the default species.
+
+        :param query_path: The path to the sample
+        :raises: RuntimeError if we don't know its species
+        """
+
+        species = self._samples.get(os.path.basename(query_path))
+
+        if species is None and self._detector is not None:
+            species = self._detect(query_path)
+
+        if species is None:
+            species = self._default
+
+        if species is None:
+            raise RuntimeError('No species given for sample: {}'.format(
+                query_path))
+
+        return species
+
+    def _detect(self, query_path):
+        # Only ever detect a sample once, the batch asks for
+        # it when grouping and again when it runs
+        with self._lock:
+            if query_path in self._detected:
+                return self._detected[query_path]
+
+        species = self._detector(query_path)
+
+        if species is not None:
+            species = self.resolve(species)
+
+        with self._lock:
+            self._detected[query_path] = species
+
+        return species
+
+    def database(self, species):
+        """
+        Returns back the path to the database of a species
+
+        :param species: The species, as returned by `resolve`
+        :raises: RuntimeError if we don't have a database for it
+        """
+
+        if species not in self._species:
+            raise RuntimeError('No database for species: {}'.format(species))
+
+        return self._species[species]
+
+    def database_for(self, query_path):
+        """
+        Returns back the path to the database for a sample
+
+        :param query_path: The path to the sample
+        """
+        return self.database(self.species_for(query_path))
+
+    def group(self, samples):
+        """
+        Groups samples by their species so that each database
+        only has to be loaded once. Samples that weren't given a
+        species go in a group under None.
+
+        :param samples: The paths to the samples
+        :returns: A mapping of species to the samples of that
+            species, in the order they were given
+        """
+
+        groups = OrderedDict()
+
+        for sample in samples:
+            try:
+                species = self.species_for(sample)
+
+            except RuntimeError:
+                species = None
+
+            groups.setdefault(species, []).append(sample)
+
+        return groups
+
+    @property
+    def default(self):
+        return self._default
+
+    @property
+    def species(self):
+        return list(self._species)
+
+    @property
+    def database_dir(self):
+        return self._database_dir
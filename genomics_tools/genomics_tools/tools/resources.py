@@ -0,0 +1,143 @@
+###################################################################
+#
+# Memory and cpu accounting for the python process and the
+# tools it runs, so that we know how much to ask the cluster for.
+#
+# This tool is a sample and distillation of the real application
+# hosted at: https://github.com/theMPatel/functional_genomics_tools
+#
+# Author: Milan Patel
+# Contact: https://github.com/theMPatel
+# Version 1.0
+#
+###################################################################
+
+from collections import OrderedDict, namedtuple
+import os
+import subprocess as sp
+import sys
+import tempfile
+
+# Not available on windows
+try:
+    import resource
+except ImportError:
+    resource = None
+
+ChildUsage = namedtuple('ChildUsage', ['cpu_seconds', 'max_rss'])
+
+# What goes into the run summary
+_PERCENTILES = [('p50', 0.5), ('p90', 0.9), ('p95', 0.95), ('max', 1.)]
+
+def _rss_bytes(max_rss):
+    # Linux reports kilobytes, macOS reports bytes
+    if sys.platform == 'darwin':
+        return max_rss
+
+    return max_rss * 1024
+
+def _exit_code(status):
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+
+    return os.WEXITSTATUS(status)
+
+def peak_rss():
+    """
+    Returns back the most memory this process has held at
+    once since it started, in bytes, or None if we can't tell
+    """
+
+    if resource is None:
+        return None
+
+    return _rss_bytes(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+
+def run_process(args):
+    """
+    Runs a process to completion and reports back how much cpu
+    and memory it used. The usage comes from waiting on the
+    child itself, the same numbers RUSAGE_CHILDREN would add
+    up, but only for this child even when other samples are
+    running their own tools at the same time.
+
+    :param args: The command to run
+    :returns: The exit code, stdout, stderr and a `ChildUsage`,
+        which is None where the platform can't tell us
+    """
+
+    with tempfile.TemporaryFile() as stdout, \
+        tempfile.TemporaryFile() as stderr:
+
+        child = sp.Popen(args, stdout=stdout, stderr=stderr)
+        usage = None
+
+        if hasattr(os, 'wait4'):
+            _, status, rusage = os.wait4(child.pid, 0)
+
+            # We reaped the child, let Popen know
+            child.returncode = _exit_code(status)
+            usage = ChildUsage(
+                cpu_seconds = rusage.ru_utime + rusage.ru_stime,
+                max_rss = _rss_bytes(rusage.ru_maxrss)
+            )
+
+        else:
+            child.wait()
+
+        stdout.seek(0)
+        stderr.seek(0)
+
+        return child.returncode, stdout.read(), stderr.read(), usage
+
+def percentile(values, fraction):
+    """
+    Returns back the value at a fraction of the way through
+    the values, interpolating between neighbours
+
+    :param values: The values, they don't need to be sorted
+    :param fraction: Between 0 and 1
+    """
+
+    values = sorted(values)
+
+    if not values:
+        return None
+
+    position = (len(values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+
+    return values[lower] + (values[upper] - values[lower]) * \
+        (position - lower)
+
+def summarize_metrics(metrics):
+    """
+    Rolls up the metrics of many samples into percentiles of
+    how long they took and how much memory and cpu they used
+
+    :param metrics: The metrics dicts written for each sample
+    """
+
+    measures = OrderedDict()
+
+    def add(name, value):
+        if value is not None:
+            measures.setdefault(name, []).append(value)
+
+    for sample in metrics:
+        add('total_seconds', sample.get('total_seconds'))
+
+        resources = sample.get('resources', {})
+        for child, usage in resources.get('children', {}).items():
+            add(child + '_cpu_seconds', usage['cpu_seconds'])
+            add(child + '_max_rss', usage['max_rss'])
+
+    summary = OrderedDict([('samples', len(metrics))])
+
+    for name, values in measures.items():
+        summary[name] = OrderedDict(
+            (label, percentile(values, fraction)) \
+                for label, fraction in _PERCENTILES)
+
+    return summary
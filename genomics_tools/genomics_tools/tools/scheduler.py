@@ -0,0 +1,318 @@
+###################################################################
+#
+# Scheduling for running many samples at once. Samples are
+# ordered by how expensive they look and handed to a pool of
+# workers that steal from each other when they run dry.
+#
+# This tool is a sample and distillation of the real application
+# hosted at: https://github.com/theMPatel/functional_genomics_tools
+#
+# Author: Milan Patel
+# Contact: https://github.com/theMPatel
+# Version 1.0
+#
+###################################################################
+
+from collections import deque, namedtuple
+import json
+import os
+import threading
+
+from .environment import (
+    log_message, valid_dir
+)
+
+# Every contig is its own BLAST query, which has a cost of its
+# own on top of the bases that it holds
+_CONTIG_COST = 1000
+
+# Without a calibration, assume only this fraction of a BLASTn
+# run gets faster with more threads. On our small references
+# the gain was already flattening out well before four threads.
+_DEFAULT_PARALLEL_FRACTION = 0.6
+
+# Stand in for the queue when samples trickle in one by one
+_STREAM_DEPTH = 4
+
+SampleCost = namedtuple('SampleCost', ['length', 'contigs', 'cost'])
+
+ThreadPlan = namedtuple('ThreadPlan', ['workers', 'threads', 'estimate'])
+
+def estimate_cost(path):
+    """
+    Estimates how expensive a sample will be to run. If the
+    sample has a fasta index (samtools faidx) next to it, the
+    total length and contig count are taken from there,
+    otherwise the size of the file stands in for the length.
+
+    :param path: The path to the sample
+    """
+
+    index_path = path + '.fai'
+
+    if os.path.exists(index_path):
+        length = 0
+        contigs = 0
+
+        with open(index_path, 'r') as f:
+            for line in f:
+                parts = line.split('\t')
+
+                if len(parts) < 2:
+                    continue
+
+                length += int(parts[1])
+                contigs += 1
+
+    else:
+        length = os.path.getsize(path)
+        contigs = 1
+
+    return SampleCost(
+        length=length,
+        contigs=contigs,
+        cost=length + contigs * _CONTIG_COST
+    )
+
+class WorkStealingPool(object):
+    """
+    Runs jobs on a fixed number of worker threads. The jobs are
+    dealt out largest first, each one going to the worker with
+    the least work queued up so far. A worker runs its own queue
+    from the front and, once it is empty, takes the largest job
+    left on whichever worker has the most work remaining. A
+    single huge sample therefore always starts first instead of
+    holding up the whole run at the end.
+    """
+
+    def __init__(self, workers):
+        self._workers = max(1, workers)
+
+    @property
+    def workers(self):
+        return self._workers
+
+    def map(self, func, items, costs):
+        """
+        Calls func on every item and returns back the results in
+        the same order as the items. If any of the calls raised,
+        the first exception is raised once everything is done.
+
+        :param func: The function to call with each item
+        :param items: The items to run
+        :param costs: The estimated cost of each item
+        """
+
+        items = list(items)
+        costs = list(costs)
+
+        results = [None] * len(items)
+        errors = []
+
+        queues = [deque() for _ in range(self._workers)]
+        remaining = [0] * self._workers
+        lock = threading.Lock()
+
+        # Largest first, to the least loaded worker
+        order = sorted(range(len(items)), key=lambda i: -costs[i])
+
+        for i in order:
+            worker = remaining.index(min(remaining))
+            queues[worker].append(i)
+            remaining[worker] += costs[i]
+
+        def next_job(worker):
+            with lock:
+                if queues[worker]:
+                    victim = worker
+
+                else:
+                    victim = max(range(self._workers),
+                        key=lambda w: remaining[w])
+
+                    if not queues[victim]:
+                        return None
+
+                i = queues[victim].popleft()
+                remaining[victim] -= costs[i]
+                return i
+
+        def run(worker):
+            while True:
+                i = next_job(worker)
+
+                if i is None:
+                    return
+
+                try:
+                    results[i] = func(items[i])
+
+                except Exception as e:
+                    with lock:
+                        errors.append(e)
+
+        if self._workers == 1:
+            run(0)
+
+        else:
+            threads = [threading.Thread(target=run, args=(worker,),
+                name='worker-{}'.format(worker), daemon=True) \
+                    for worker in range(self._workers)]
+
+            for thread in threads:
+                thread.start()
+
+            for thread in threads:
+                thread.join()
+
+        if errors:
+            raise errors[0]
+
+        return results
+
+def schedule_samples(paths):
+    """
+    Estimates the cost of each sample and logs what the queue
+    looks like
+
+    :param paths: The paths to the samples
+    :returns: The costs in the same order as the paths
+    """
+
+    costs = [estimate_cost(path) for path in paths]
+
+    log_message('Scheduling {} samples largest first'.format(len(paths)))
+
+    if costs:
+        largest = max(costs, key=lambda cost: cost.cost)
+        log_message('Largest sample is {} bp in {} contigs, out of {} bp'
+            ' in total'.format(largest.length, largest.contigs,
+                sum(cost.length for cost in costs)), extra=1)
+
+    return [cost.cost for cost in costs]
+
+def _time_ratio(threads, timings):
+    """
+    How long a run with this many threads takes compared to
+    a run with a single thread
+    """
+
+    if not timings or 1 not in timings:
+        return (1. - _DEFAULT_PARALLEL_FRACTION) + \
+            _DEFAULT_PARALLEL_FRACTION / threads
+
+    # Never assume we get any faster past what we measured
+    measured = max(count for count in timings if count <= threads)
+    return timings[measured] / max(timings[1], 1e-9)
+
+def _makespan(costs, workers):
+    # Largest first to the least loaded worker, the same
+    # way the work stealing pool deals them out
+    loads = [0] * workers
+
+    for cost in sorted(costs, reverse=True):
+        loads[loads.index(min(loads))] += cost
+
+    return max(loads)
+
+def plan_threads(cores, costs=None, timings=None, workers=None):
+    """
+    Picks how many samples to run at once and how many threads
+    to give BLASTn in each of them. Every split of the cores is
+    scored by how long the queue would take, using how well
+    BLASTn scales from the calibration timings. A few big
+    samples get more threads each, a long queue of small ones
+    gets more samples at once.
+
+    :param cores: The number of cores we may use
+    :param costs: The estimated cost of each sample in the queue,
+        None if the samples arrive one at a time
+    :param timings: A dict of thread count -> seconds from
+        `calibrate_blast`, if we have one
+    :param workers: Only consider this many samples at once
+    :returns: The best `ThreadPlan` followed by the rest, best first
+    """
+
+    cores = max(1, cores)
+
+    if costs is None:
+        costs = [1] * (cores * _STREAM_DEPTH)
+
+    costs = list(costs) or [1]
+
+    if workers is not None:
+        candidates = [max(1, workers)]
+    else:
+        candidates = range(1, min(cores, len(costs)) + 1)
+
+    plans = []
+    for count in candidates:
+        threads = max(1, cores // count)
+        estimate = _makespan(costs, count) * _time_ratio(threads, timings)
+        plans.append(ThreadPlan(workers=count, threads=threads,
+            estimate=estimate))
+
+    # Ties go to more samples at once, which holds up better
+    # when the estimates are off
+    plans.sort(key=lambda plan: (round(plan.estimate, 6), -plan.workers))
+    return plans
+
+def log_thread_plans(plans, calibrated):
+    """
+    Logs the chosen plan and what it was picked over
+
+    :param plans: The plans from `plan_threads`, best first
+    :param calibrated: Whether the estimates came from a calibration
+    """
+
+    best = plans[0]
+
+    log_message('Running {} sample(s) at once with {} BLASTn thread(s)'
+        ' each, using {} BLASTn scaling'.format(best.workers, best.threads,
+            'calibrated' if calibrated else 'assumed'))
+
+    for plan in plans:
+        log_message('{} worker(s) x {} thread(s): estimated {:.3g}'
+            .format(plan.workers, plan.threads, plan.estimate), extra=1)
+
+def load_calibration(path):
+    """
+    Loads the BLASTn timings saved by `save_calibration`
+
+    :param path: The path to the calibration file
+    :returns: A dict of thread count -> seconds, or None if there
+        isn't a calibration for this machine
+    """
+
+    if not os.path.exists(path):
+        return None
+
+    with open(path, 'r') as f:
+        calibration = json.load(f)
+
+    # Timings from a different machine don't mean much here
+    if calibration.get('cpu_count') != os.cpu_count():
+        return None
+
+    return {int(threads): seconds for threads, seconds in \
+        calibration['timings'].items()}
+
+def save_calibration(path, timings):
+    """
+    Saves BLASTn timings so later runs can skip calibrating
+
+    :param path: The path to the calibration file
+    :param timings: A dict of thread count -> seconds
+    """
+
+    valid_dir(os.path.dirname(path))
+    temp_path = path + '.tmp'
+
+    with open(temp_path, 'w') as f:
+        json.dump({
+            'cpu_count': os.cpu_count(),
+            'timings': {str(threads): seconds for threads, seconds in \
+                timings.items()}
+            }, f, indent=4, sort_keys=True)
+
+    os.replace(temp_path, path)
@@ -0,0 +1,156 @@
+###################################################################
+#
+# Scratch space for the temp files of each sample. Memory backed
+# filesystems are used when there's room, so the many small files
+# a sample writes never have to touch a shared disk.
+#
+# This tool is a sample and distillation of the real application
+# hosted at: https://github.com/theMPatel/functional_genomics_tools
+#
+# Author: Milan Patel
+# Contact: https://github.com/theMPatel
+# Version 1.0
+#
+###################################################################
+
+from contextlib import contextmanager
+import os
+import shutil
+import tempfile
+import threading
+
+from .environment import (
+    log_warning, valid_dir
+)
+
+# Where to look for a memory backed filesystem if we
+# aren't told about one
+_DEFAULT_MEMORY_DIRS = ['/dev/shm']
+
+# A sample writes its references, hits and such, which
+# comes to a few times the size of the sample itself
+_SCRATCH_PER_BYTE = 3
+
+def _usable(directory):
+    return os.path.isdir(directory) and os.access(directory, os.W_OK)
+
+class ScratchSpace(object):
+    """
+    Hands out a scratch directory to each sample and removes it
+    as soon as the sample is done with it. Samples go on the
+    memory backed filesystem while the space they are expected
+    to need fits under the limit, the rest go on disk.
+    """
+
+    current = None
+
+    def __init__(self, disk_dir, memory_dir=None, limit=0):
+        """
+        :param disk_dir: Where to put samples that don't fit in memory
+        :param memory_dir: A tmpfs to use, /dev/shm if there is one
+            and nothing is given
+        :param limit: The most bytes to use on the memory backed
+            filesystem at once, 0 to always use disk
+        """
+
+        self._disk_dir = disk_dir
+        self._limit = limit
+        self._reserved = 0
+        self._lock = threading.Lock()
+        self._roots = {}
+
+        candidates = [memory_dir] if memory_dir else _DEFAULT_MEMORY_DIRS
+        self._memory_dir = None
+
+        if limit > 0:
+            for candidate in candidates:
+                if _usable(candidate):
+                    self._memory_dir = candidate
+                    break
+
+            else:
+                log_warning('No memory backed scratch space found, using'
+                    ' disk: {}'.format(disk_dir))
+
+        ScratchSpace.current = self
+
+    def _root(self, directory):
+        # Everything of ours on a filesystem goes under one
+        # directory so it can all be removed at the end
+        if directory not in self._roots:
+            valid_dir(directory)
+            self._roots[directory] = tempfile.mkdtemp(
+                prefix='genomics_tools.', dir=directory)
+
+        return self._roots[directory]
+
+    def _reserve(self, expected):
+        with self._lock:
+            if self._memory_dir is None or \
+                self._reserved + expected > self._limit:
+                return self._root(self._disk_dir), 0
+
+            try:
+                free = shutil.disk_usage(self._memory_dir).free
+
+            except OSError:
+                free = 0
+
+            if expected >= free:
+                return self._root(self._disk_dir), 0
+
+            self._reserved += expected
+            return self._root(self._memory_dir), expected
+
+    def _release(self, reserved):
+        with self._lock:
+            self._reserved -= reserved
+
+    @contextmanager
+    def sample(self, query_path):
+        """
+        Gives a sample a scratch directory for as long as the
+        with block runs and removes it afterwards
+
+        :param query_path: The path to the sample, its size
+            decides how much room it will need
+        """
+
+        try:
+            expected = os.path.getsize(query_path) * _SCRATCH_PER_BYTE
+
+        except OSError:
+            expected = 0
+
+        root, reserved = self._reserve(expected)
+        path = tempfile.mkdtemp(prefix=os.path.basename(query_path) + '.',
+            dir=root)
+
+        try:
+            yield path
+
+        finally:
+            shutil.rmtree(path, ignore_errors=True)
+            self._release(reserved)
+
+    def close(self):
+        """
+        Removes all of the scratch space we made
+        """
+
+        with self._lock:
+            for root in self._roots.values():
+                shutil.rmtree(root, ignore_errors=True)
+
+            self._roots = {}
+
+        if ScratchSpace.current is self:
+            ScratchSpace.current = None
+
+    @property
+    def memory_dir(self):
+        return self._memory_dir
+
+    @property
+    def reserved(self):
+        return self._reserved
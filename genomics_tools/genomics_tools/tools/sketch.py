@@ -0,0 +1,272 @@
+###################################################################
+#
+# Small k-mer sketches of genomes so that the species of a sample
+# can be worked out before picking which database to run it
+# against, instead of aligning it against all of them.
+#
+# This tool is a sample and distillation of the real application
+# hosted at: https://github.com/theMPatel/functional_genomics_tools
+#
+# Author: Milan Patel
+# Contact: https://github.com/theMPatel
+# Version 1.0
+#
+###################################################################
+
+import json
+import os
+import zlib
+
+from .environment import (
+    log_message, log_warning,
+    valid_dir
+)
+
+from .tools import (
+    fasta_iterator_path, reverse_complement,
+    is_fasta
+)
+
+# Long enough that a shared k-mer between two genomes means
+# something, short enough to survive the differences between
+# strains of the same species
+DEFAULT_K = 21
+
+# Only the k-mers that start with one of these, on either strand,
+# make it into a sketch. That keeps about 1 in 1000 of them, and
+# finding them is a plain substring search instead of hashing every
+# k-mer of the genome. None of them are their own reverse complement
+# and none hold a CpG, which is rare in a lot of genomes.
+DEFAULT_SEEDS = ('ACAGTC', 'AGGTCA')
+
+# Below this, a sample isn't close enough to any of our
+# references to say what it is
+DEFAULT_MIN_SIMILARITY = 0.05
+
+_VALID = frozenset('ACGT')
+
+def sketch_sequence(sequence, k=DEFAULT_K, seeds=DEFAULT_SEEDS):
+    """
+    Sketches a single sequence. Like a scaled MinHash, a k-mer is
+    kept or not based only on its own content, so the sketches of
+    two genomes can be compared directly. The k-mers are kept in
+    their canonical orientation so the strand doesn't matter.
+
+    :param sequence: An upper case DNA sequence
+    :param k: The k-mer size
+    :param seeds: Keep the k-mers starting with these
+    :returns: A set of k-mer hashes
+    """
+
+    hashes = set()
+
+    def add(kmer):
+        if len(kmer) == k and _VALID.issuperset(kmer):
+            kmer = min(kmer, reverse_complement(kmer))
+            hashes.add(zlib.crc32(kmer.encode()))
+
+    for seed in seeds:
+        # k-mers starting with the seed on this strand
+        i = sequence.find(seed)
+        while i != -1:
+            add(sequence[i:i+k])
+            i = sequence.find(seed, i + 1)
+
+        # k-mers starting with the seed on the other strand,
+        # which end with its reverse complement on this one
+        reverse = reverse_complement(seed)
+        i = sequence.find(reverse)
+        while i != -1:
+            end = i + len(reverse)
+
+            if end >= k:
+                add(sequence[end-k:end])
+
+            i = sequence.find(reverse, i + 1)
+
+    return hashes
+
+def sketch_file(path, k=DEFAULT_K, seeds=DEFAULT_SEEDS):
+    """
+    Sketches every record of a fasta file into one sketch
+
+    :param path: The path to the fasta file
+    :param k: The k-mer size
+    :param seeds: Keep the k-mers starting with these
+    """
+
+    hashes = set()
+
+    for _, sequence in fasta_iterator_path(path):
+        hashes |= sketch_sequence(sequence, k=k, seeds=seeds)
+
+    return hashes
+
+def jaccard(sketch1, sketch2):
+    """
+    Estimates the fraction of k-mers two genomes share
+
+    :param sketch1: The first sketch
+    :param sketch2: The second sketch
+    """
+
+    if not sketch1 or not sketch2:
+        return 0.
+
+    shared = len(sketch1 & sketch2)
+    return float(shared) / float(len(sketch1) + len(sketch2) - shared)
+
+class SketchIndex(object):
+    """
+    The sketches of a set of reference genomes for each species
+    we support. The genomes directory holds a directory for each
+    species with its reference genomes in it. Sketching is done
+    once and kept in the cache file, only genomes that were added
+    or changed since then are sketched again.
+    """
+
+    def __init__(self, genomes_dir, cache_path=None, k=DEFAULT_K,
+        seeds=DEFAULT_SEEDS):
+        """
+        :param genomes_dir: The directory of species directories
+        :param cache_path: Where to keep the sketches between runs
+        :param k: The k-mer size
+        :param seeds: Keep the k-mers starting with these
+        """
+
+        self._genomes_dir = genomes_dir
+        self._cache_path = cache_path
+        self._k = k
+        self._seeds = list(seeds)
+        self._sketches = []
+
+        self._build()
+
+    def _load_cache(self):
+        if self._cache_path is None or not os.path.exists(self._cache_path):
+            return {}
+
+        try:
+            with open(self._cache_path, 'r') as f:
+                cached = json.load(f)
+
+        except (OSError, ValueError):
+            log_warning('Ignoring unreadable sketch cache: {}'.format(
+                self._cache_path))
+            return {}
+
+        # Sketches made some other way can't be compared
+        if cached.get('k') != self._k or cached.get('seeds') != self._seeds:
+            return {}
+
+        return cached.get('genomes', {})
+
+    def _save_cache(self, genomes):
+        if self._cache_path is None:
+            return
+
+        valid_dir(os.path.dirname(self._cache_path))
+        temp_path = self._cache_path + '.tmp'
+
+        with open(temp_path, 'w') as f:
+            json.dump({
+                'k': self._k,
+                'seeds': self._seeds,
+                'genomes': genomes
+            }, f)
+
+        os.replace(temp_path, self._cache_path)
+
+    def _build(self):
+        cached = self._load_cache()
+        genomes = {}
+        sketched = 0
+
+        for species in sorted(os.listdir(self._genomes_dir)):
+            species_dir = os.path.join(self._genomes_dir, species)
+
+            if species[0] in '._' or not os.path.isdir(species_dir):
+                continue
+
+            for name in sorted(os.listdir(species_dir)):
+                path = os.path.join(species_dir, name)
+
+                if not is_fasta(path):
+                    continue
+
+                stat = os.stat(path)
+                entry = cached.get(path)
+
+                if entry is None or entry['mtime'] != stat.st_mtime or \
+                    entry['size'] != stat.st_size:
+
+                    entry = {
+                        'species': species,
+                        'mtime': stat.st_mtime,
+                        'size': stat.st_size,
+                        'hashes': sorted(sketch_file(path, k=self._k,
+                            seeds=self._seeds))
+                    }
+                    sketched += 1
+
+                entry['species'] = species
+                genomes[path] = entry
+                self._sketches.append((species, path,
+                    frozenset(entry['hashes'])))
+
+        if sketched or len(genomes) != len(cached):
+            self._save_cache(genomes)
+
+        log_message('Sketched {} of {} reference genomes for species'
+            ' detection'.format(sketched, len(genomes)))
+
+    def closest(self, sketch):
+        """
+        Returns back the species of the reference genome closest
+        to a sketch and how similar they are
+
+        :param sketch: The sketch of a sample
+        :returns: (species, similarity), species is None if there
+            are no references
+        """
+
+        best = (None, 0.)
+
+        for species, _, reference in self._sketches:
+            similarity = jaccard(sketch, reference)
+
+            if similarity > best[1]:
+                best = (species, similarity)
+
+        return best
+
+    def detect(self, query_path, min_similarity=DEFAULT_MIN_SIMILARITY):
+        """
+        Works out the species of a sample
+
+        :param query_path: The path to the sample
+        :param min_similarity: How similar the sample has to be to
+            a reference to be called that species
+        :returns: The species, or None if nothing is close enough
+        """
+
+        species, similarity = self.closest(sketch_file(query_path,
+            k=self._k, seeds=self._seeds))
+
+        if species is None or similarity < min_similarity:
+            log_warning('Could not detect the species of: {}'.format(
+                query_path))
+            return None
+
+        log_message('Detected {} for {} with similarity {:.3f}'.format(
+            species, os.path.basename(query_path), similarity))
+
+        return species
+
+    @property
+    def species(self):
+        return sorted(set(species for species, _, _ in self._sketches))
+
+    @property
+    def genomes_dir(self):
+        return self._genomes_dir
@@ -0,0 +1,292 @@
+###################################################################
+#
+# Lightweight timing spans for the stages of the pipeline, the
+# per sample metrics built from them and a timeline of the whole
+# run that can be opened in chrome://tracing or Perfetto.
+#
+# This tool is a sample and distillation of the real application
+# hosted at: https://github.com/theMPatel/functional_genomics_tools
+#
+# Author: Milan Patel
+# Contact: https://github.com/theMPatel
+# Version 1.0
+#
+###################################################################
+
+from collections import OrderedDict
+from contextlib import contextmanager
+import json
+import os
+import threading
+import time
+
+from .environment import (
+    valid_dir
+)
+
+from .progress import ProgressTracker
+
+# Which sample the current thread is working on
+_local = threading.local()
+
+# Runs that don't end write their spans out in pieces of about
+# this many, or this often, so they don't pile up in memory
+DEFAULT_ROTATE_EVENTS = 10000
+DEFAULT_ROTATE_SECONDS = 300.
+
+class Tracer(object):
+    """
+    Collects every span of a run so they can be written out as
+    one Chrome trace. Each thread gets its own row, so samples
+    running on parallel workers show up side by side.
+    """
+
+    current = None
+
+    def __init__(self, rotate_path=None,
+        rotate_events=DEFAULT_ROTATE_EVENTS,
+        rotate_seconds=DEFAULT_ROTATE_SECONDS):
+        """
+        :param rotate_path: For runs that don't end, the spans are
+            written out to numbered files next to this path as they
+            come in and then forgotten
+        :param rotate_events: Write them out once there are this many
+        :param rotate_seconds: Or once this long has gone by
+        """
+        self._events = []
+        self._threads = {}
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+
+        self._rotate_path = rotate_path
+        self._rotate_events = rotate_events
+        self._rotate_seconds = rotate_seconds
+        self._rotations = 0
+        self._rotated = self._origin
+
+        Tracer.current = self
+
+    def record(self, name, start, end, category='stage', args=None):
+        """
+        Records a span that has finished
+
+        :param name: What the span was timing
+        :param start: When it started, from `time.perf_counter`
+        :param end: When it ended, from `time.perf_counter`
+        :param category: Groups the spans in the trace viewer
+        :param args: Anything else to show with the span
+        """
+        thread = threading.current_thread()
+
+        event = {
+            'name': name,
+            'cat': category,
+            'ph': 'X',
+            'ts': (start - self._origin) * 1e6,
+            'dur': (end - start) * 1e6,
+            'pid': os.getpid(),
+            'tid': thread.ident,
+            'args': args or {}
+        }
+
+        with self._lock:
+            self._events.append(event)
+            self._threads[thread.ident] = thread.name
+
+            rotate = self._rotate_path is not None and \
+                (len(self._events) >= self._rotate_events or \
+                    end - self._rotated >= self._rotate_seconds)
+
+        if rotate:
+            self.rotate()
+
+    def write(self, path):
+        """
+        Writes out everything recorded so far in the Chrome
+        trace event format
+
+        :param path: Where to write the trace
+        """
+
+        with self._lock:
+            events = list(self._events)
+            threads = dict(self._threads)
+
+        return self._write_events(path, events, threads)
+
+    def rotate(self):
+        """
+        Writes out the spans recorded since the last rotation to
+        the next numbered file and forgets them
+
+        :returns: The path written to, None if there was nothing
+            new to write
+        """
+
+        with self._lock:
+            events = self._events
+            self._events = []
+            self._rotated = time.perf_counter()
+
+            if not events:
+                return None
+
+            self._rotations += 1
+            index = self._rotations
+            threads = dict(self._threads)
+
+        root, ext = os.path.splitext(self._rotate_path)
+        return self._write_events('{}.{:04d}{}'.format(root, index, ext),
+            events, threads)
+
+    def _write_events(self, path, events, threads):
+        # Name the rows after the threads
+        for ident, name in threads.items():
+            events.append({
+                'name': 'thread_name',
+                'ph': 'M',
+                'pid': os.getpid(),
+                'tid': ident,
+                'args': {'name': name}
+            })
+
+        valid_dir(os.path.dirname(path))
+        temp_path = path + '.tmp'
+
+        with open(temp_path, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+
+        os.replace(temp_path, path)
+        return path
+
+    @property
+    def rotate_path(self):
+        return self._rotate_path
+
+class SampleTimer(object):
+    """
+    Adds up the time spent in each stage for one sample. While
+    it is active, every span on this thread counts towards it,
+    and so does every tool that gets run through `record_child`.
+    """
+
+    def __init__(self, sample):
+        self.sample = sample
+        self._stages = OrderedDict()
+        self._children = OrderedDict()
+        self._started = None
+        self._start = None
+        self._end = None
+        self._previous = None
+
+    def __enter__(self):
+        self._previous = getattr(_local, 'timer', None)
+        _local.timer = self
+
+        self._started = time.time()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._end = time.perf_counter()
+        _local.timer = self._previous
+
+        if Tracer.current is not None:
+            Tracer.current.record(os.path.basename(self.sample),
+                self._start, self._end, category='sample',
+                args={'sample': self.sample})
+
+        return False
+
+    def add(self, name, seconds):
+        seconds_total, calls = self._stages.get(name, (0., 0))
+        self._stages[name] = (seconds_total + seconds, calls + 1)
+
+    def add_child(self, name, usage):
+        cpu_seconds, max_rss, calls = self._children.get(name, (0., 0, 0))
+        self._children[name] = (cpu_seconds + usage.cpu_seconds,
+            max(max_rss, usage.max_rss), calls + 1)
+
+    def metrics(self):
+        """
+        Returns back the timings and resource usage for this
+        sample as a dict
+        """
+        end = self._end if self._end is not None else time.perf_counter()
+
+        return {
+            'sample': self.sample,
+            'started': self._started,
+            'total_seconds': end - self._start,
+            'stages': OrderedDict(
+                (name, {'seconds': seconds, 'calls': calls}) \
+                    for name, (seconds, calls) in self._stages.items()),
+            'resources': {
+                'children': OrderedDict(
+                    (name, {'cpu_seconds': cpu_seconds, 'max_rss': max_rss,
+                        'calls': calls}) for name, (cpu_seconds, max_rss,
+                            calls) in self._children.items())
+            }
+        }
+
+    def write(self, path):
+        """
+        Writes out the timings for this sample
+
+        :param path: Where to write the metrics
+        """
+        valid_dir(os.path.dirname(path))
+
+        with open(path, 'w') as f:
+            json.dump(self.metrics(), f, indent=4)
+
+        return path
+
+@contextmanager
+def span(name):
+    """
+    Times the code inside the with block as one stage of the
+    current sample and, if a run is being traced, adds it to
+    the trace. The stage also counts towards the progress of the
+    run. Costs next to nothing when nobody is listening.
+
+    :param name: The name of the stage
+    """
+
+    timer = getattr(_local, 'timer', None)
+    tracer = Tracer.current
+
+    if timer is None and tracer is None:
+        yield
+        return
+
+    start = time.perf_counter()
+
+    try:
+        yield
+
+    finally:
+        end = time.perf_counter()
+
+        if timer is not None:
+            timer.add(name, end - start)
+
+        if tracer is not None:
+            tracer.record(name, start, end,
+                args={'sample': timer.sample} if timer else None)
+
+        if timer is not None and ProgressTracker.current is not None:
+            ProgressTracker.current.stage_done(timer.sample, name)
+
+def record_child(name, usage):
+    """
+    Counts what a tool run by the current sample used towards it
+
+    :param name: The name of the tool
+    :param usage: The `ChildUsage` from `run_process`
+    """
+
+    timer = getattr(_local, 'timer', None)
+
+    if timer is not None and usage is not None:
+        timer.add_child(name, usage)
@@ -14,6 +14,7 @@
 import base64
 import binascii
 import gzip
+import hashlib
 import io
 import json
 import os
@@ -231,6 +232,124 @@ def fasta_iterator(fl_obj):
         full_seqence = ''.join(sequence_parts).upper()
         yield (key, full_seqence)
 
+def fasta_index_path(path_to_file):
+    """
+    Interface to index a fasta file from an external
+    path without loading any of its sequences.
+
+    :param path_to_file: The path to index
+    :raises: OSError when the file does not exist
+    """
+
+    with open(path_to_file, 'rb') as f:
+        yield from fasta_index(f)
+
+def fasta_index(fl_obj):
+    """
+    Walks a fasta file the same way `fasta_iterator` does,
+    but instead of the sequence it yields back the byte
+    offset of the first sequence line and the length of
+    the sequence. The offset can later be handed to
+    `fasta_sequence_at` to read only that record.
+
+    :param fl_obj: A binary file object to index
+    """
+
+    key = ''
+    offset = 0
+    length = 0
+    position = 0
+
+    for line in fl_obj:
+
+        # Keep track of the offset ourselves, tell()
+        # is not reliable while iterating
+        position += len(line)
+        line = line.strip()
+
+        if not line:
+            continue
+
+        if line[:1] == b'>':
+            if key:
+                yield (key, offset, length)
+
+            key = line[1:].split()[0].decode()
+            offset = position
+            length = 0
+
+        else:
+            length += len(line)
+
+    if key:
+        yield (key, offset, length)
+
+def fasta_sequence_at(path_to_file, offset):
+    """
+    Reads a single fasta record's sequence starting at the
+    byte offset returned by `fasta_index`
+
+    :param path_to_file: The path to the fasta file
+    :param offset: The offset of the first sequence line
+    """
+
+    sequence_parts = []
+
+    with open(path_to_file, 'rb') as f:
+        f.seek(offset)
+
+        for line in f:
+            line = line.strip()
+
+            if not line:
+                continue
+
+            # Start of the next record
+            if line[:1] == b'>':
+                break
+
+            sequence_parts.append(line)
+
+    return b''.join(sequence_parts).decode().upper()
+
+def fasta_sequences_at(path_to_file, offsets):
+    """
+    Reads the sequences of many fasta records in a single
+    pass over the file, instead of reopening it for each one
+    like `fasta_sequence_at` would
+
+    :param path_to_file: The path to the fasta file
+    :param offsets: The offsets returned by `fasta_index` of
+        the records to read
+    :returns: A dictionary of offset to sequence
+    """
+
+    offsets = set(offsets)
+    sequences = {}
+    sequence_parts = None
+    position = 0
+
+    with open(path_to_file, 'rb') as f:
+        for line in f:
+
+            position += len(line)
+            line = line.strip()
+
+            if not line:
+                continue
+
+            if line[:1] == b'>':
+                sequence_parts = None
+
+                if position in offsets:
+                    sequence_parts = sequences[position] = []
+
+            elif sequence_parts is not None:
+                sequence_parts.append(line)
+
+    return {offset: b''.join(parts).decode().upper() \
+        for offset, parts in sequences.items()}
+
 def parse_fasta(flname, rename=False):
     """
     Function provides an interface to parse
@@ -334,3 +453,21 @@ def chunked_file_reader(file_obj, chunk_size=io.DEFAULT_BUFFER_SIZE):
             break
 
         yield data
+
+def hash_file(path, digest=None):
+    """
+    Returns the sha1 hex digest of the bytes of a file.
+
+    :param path: The path to the file to hash
+    :param digest: An optional hashlib object to update
+        instead of starting a new one
+    """
+
+    if digest is None:
+        digest = hashlib.sha1()
+
+    with open(path, 'rb') as f:
+        for block in chunked_file_reader(f):
+            digest.update(block)
+
+    return digest.hexdigest()
@@ -0,0 +1,303 @@
+###################################################################
+#
+# Watches an intake directory and hands off new samples as soon
+# as they have finished being written.
+#
+# This tool is a sample and distillation of the real application
+# hosted at: https://github.com/theMPatel/functional_genomics_tools
+#
+# Author: Milan Patel
+# Contact: https://github.com/theMPatel
+# Version 1.0
+#
+###################################################################
+
+import ctypes
+import ctypes.util
+import os
+import select
+import threading
+import time
+
+from .environment import (
+    log_message, log_warning,
+    valid_dir
+)
+
+from .tools import (
+    is_fasta, hash_file
+)
+
+# From <sys/inotify.h>
+_IN_MODIFY = 0x00000002
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+
+class _Inotify(object):
+    """
+    Just enough of inotify to know when to look at a directory
+    again. We never parse the events, any event means go and
+    check the directory.
+    """
+
+    _mask = _IN_MODIFY | _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE
+
+    def __init__(self, directory):
+        libc_name = ctypes.util.find_library('c')
+
+        if libc_name is None:
+            raise OSError('Unable to find libc')
+
+        libc = ctypes.CDLL(libc_name, use_errno=True)
+
+        if not hasattr(libc, 'inotify_init1'):
+            raise OSError('inotify is not available')
+
+        self._fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+
+        watch = libc.inotify_add_watch(self._fd,
+            os.fsencode(directory), self._mask)
+
+        if watch < 0:
+            os.close(self._fd)
+            raise OSError(ctypes.get_errno(), 'inotify_add_watch failed')
+
+    def wait(self, timeout):
+        """
+        Waits until something happens in the directory or
+        the timeout runs out
+
+        :param timeout: The maximum number of seconds to wait
+        """
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+
+        if not ready:
+            return False
+
+        # Throw away everything that is queued up
+        while True:
+            try:
+                if not os.read(self._fd, 4096):
+                    break
+            except BlockingIOError:
+                break
+
+        return True
+
+    def close(self):
+        os.close(self._fd)
+
+class DirectoryWatcher(object):
+    """
+    Finds the files in a directory that are complete. A file is
+    considered complete once its size and modification time have
+    not changed for settle_time seconds, so partially copied
+    assemblies are never picked up. Uses inotify when it is
+    available to notice new files right away and falls back to
+    polling otherwise.
+    """
+
+    def __init__(self, directory, settle_time=5., poll_interval=2.,
+        accept=is_fasta):
+        """
+        :param directory: The directory to watch
+        :param settle_time: How long a file must stay the same
+        :param poll_interval: How often to look when polling
+        :param accept: Which file paths to consider at all
+        """
+
+        self._directory = directory
+        self._settle_time = settle_time
+        self._poll_interval = poll_interval
+        self._accept = accept
+
+        # path -> (size, mtime, when we first saw it that way)
+        self._pending = {}
+
+        # path -> (size, mtime) of what we already handed off
+        self._handed_off = {}
+
+        try:
+            self._inotify = _Inotify(directory)
+            log_message('Watching {} with inotify'.format(directory))
+
+        except (OSError, AttributeError):
+            self._inotify = None
+            log_message('Polling {} every {} seconds'.format(
+                directory, poll_interval))
+
+    def scan(self, now=None):
+        """
+        Looks at the directory once and returns back the
+        files that just became stable
+
+        :param now: The current time, mostly for testing
+        """
+
+        if now is None:
+            now = time.time()
+
+        ready = []
+        present = set()
+
+        for name in sorted(os.listdir(self._directory)):
+            path = os.path.join(self._directory, name)
+
+            if not self._accept(path):
+                continue
+
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+
+            present.add(path)
+            state = (stat.st_size, stat.st_mtime)
+
+            if self._handed_off.get(path) == state or not stat.st_size:
+                continue
+
+            previous = self._pending.get(path)
+
+            if previous is None or previous[:2] != state:
+                # New or still changing
+                self._pending[path] = state + (now,)
+                continue
+
+            if now - previous[2] >= self._settle_time:
+                del self._pending[path]
+                self._handed_off[path] = state
+                ready.append(path)
+
+        # Forget about anything that went away
+        for path in list(self._pending):
+            if path not in present:
+                del self._pending[path]
+
+        for path in list(self._handed_off):
+            if path not in present:
+                del self._handed_off[path]
+
+        return ready
+
+    def wait(self):
+        """
+        Sleeps until it's worth looking at the directory again
+        """
+
+        if self._inotify is None:
+            time.sleep(self._poll_interval)
+            return
+
+        # Files that are settling need to be checked again
+        # even if nothing else happens in the directory
+        timeout = self._settle_time if self._pending else 60.
+        self._inotify.wait(timeout)
+
+    def close(self):
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+
+class ContentLedger(object):
+    """
+    A record of the content hash of every sample that has been
+    processed. It's appended to as samples finish so it survives
+    restarts, and renamed or copied samples are still
+    recognized.
+    """
+
+    def __init__(self, path):
+        self._path = path
+        self._digests = set()
+        self._lock = threading.Lock()
+
+        valid_dir(os.path.dirname(path))
+
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                for line in f:
+                    line = line.strip()
+
+                    if not line:
+                        continue
+
+                    self._digests.add(line.split('\t')[0])
+
+    def __contains__(self, digest):
+        return digest in self._digests
+
+    def __len__(self):
+        return len(self._digests)
+
+    def add(self, digest, path):
+        with self._lock:
+            if digest in self._digests:
+                return
+
+            self._digests.add(digest)
+
+            with open(self._path, 'a') as f:
+                f.write('{}\t{}\n'.format(digest, path))
+
+    @property
+    def path(self):
+        return self._path
+
+def watch_directory(watcher, ledger, submit, stop=None):
+    """
+    Feeds every new, complete sample in a watched directory to
+    submit until stop is set. Samples whose content is already
+    in the ledger are skipped, and a sample only goes into the
+    ledger once it has been processed successfully.
+
+    :param watcher: A `DirectoryWatcher`
+    :param ledger: A `ContentLedger`
+    :param submit: Called with the path to a sample and a callback
+        that must be called with whether the sample succeeded
+    :param stop: An optional `threading.Event` to stop watching
+    """
+
+    in_flight = set()
+    lock = threading.Lock()
+
+    def finished(digest, path, succeeded):
+        with lock:
+            in_flight.discard(digest)
+
+        if succeeded:
+            ledger.add(digest, path)
+        else:
+            log_warning('Sample failed and will be retried if it'
+                ' changes: {}'.format(path))
+
+    try:
+        while stop is None or not stop.is_set():
+
+            for path in watcher.scan():
+
+                try:
+                    digest = hash_file(path)
+                except FileNotFoundError:
+                    continue
+
+                with lock:
+                    if digest in ledger or digest in in_flight:
+                        log_message('Skipping already processed'
+                            ' sample: {}'.format(path))
+                        continue
+
+                    in_flight.add(digest)
+
+                log_message('Found new sample: {}'.format(path))
+                submit(path, lambda succeeded, digest=digest, path=path:
+                    finished(digest, path, succeeded))
+
+            watcher.wait()
+
+    finally:
+        watcher.close()
@@ -669,7 +669,7 @@ setup(
         version=__version__,
         packages=packages,
         author=__author__,
-        python_requires=">=3.5",
+        python_requires=">=3.6",
         install_requires=requires,
         cmdclass={
             "develop" : PostDevelopCommand,
@@ -0,0 +1,170 @@
+###################################################################
+#
+# Tests for the ab_detection module
+#
+# Author: Milan Patel
+# Contact: https://github.com/theMPatel
+# Version 1.0
+#
+###################################################################
+
+import io
+import pytest
+
+from benchmarks.synthetic import make_genome
+from benchmarks.synthetic import CALLABLE_KINDS, FRAGMENT, MUTATION, REVERSE
+
+from tools.align import GenotypeHit
+from tools.align import GenotypeResults
+from genotyping.ab_detection import find_mutations
+from genotyping.ab_detection import rank_hits
+from genotyping.mutation_finder import compile_target
+
+def _hit(query_start, reference_start, length, bitscore,
+    relative_len=1.):
+    hit = GenotypeHit()
+    hit.reference_id = '16S'
+    hit.query_id = 'contig1'
+    hit.query_start = query_start
+    hit.query_stop = query_start + length - 1
+    hit.reference_start = reference_start
+    hit.reference_stop = reference_start + length - 1
+    hit.relative_len = relative_len
+    hit.bitscore = bitscore
+    return hit
+
+class _Database(object):
+    # One target in the 16S at 1051
+    targets = {'16S': [compile_target('16S', '16S', 1051, ['A'], ['A'],
+        ['G'], ['Streptomycin'], ['PM1'], False)]}
+
+class _Results(object):
+
+    def __init__(self, hits):
+        self.hits = hits
+
+def _mutated(hit):
+    # The query has the target mutated
+    length = hit.reference_stop - hit.reference_start + 1
+    at = 1050 - hit.reference_start
+
+    hit.reference_seq = 'A' * length
+    hit.query_seq = 'A' * at + 'G' + 'A' * (length - at - 1)
+    return hit
+
+def _found(genome, hits):
+    found = set()
+
+    for reference, calls in find_mutations(genome.database,
+        _Results(hits), 0.6).items():
+
+        for call in calls:
+            found.add((reference, call.position))
+
+    return found
+
+class TestAbDetection:
+
+    def test_duplicate_hits(self):
+        genome = make_genome(genome_size=200000, contigs=10, genes=10, seed=3)
+        hits = GenotypeResults().load_hits(
+            io.StringIO(genome.blast_report()), 'blast').hits
+
+        ranked = rank_hits(hits)
+
+        # The same hits win whatever order they come in
+        last = len(hits) - 1
+        assert [(last - i, sorted(last - j for j in better)) \
+            for i, better in rank_hits(hits[::-1])] == \
+            [(i, sorted(better)) for i, better in ranked]
+
+        # The trimmed second hits are duplicates of the full
+        # ones, both halves of the fragments are not
+        for i, better in ranked:
+            assert all(hits[j].bitscore >= hits[i].bitscore for j in better)
+
+        duplicates = [hits[i] for i, better in ranked if better]
+        assert len(duplicates) == sum(
+            1 for gene in genome.planted if gene.kind != FRAGMENT)
+
+        # Each mutation is only reported once
+        calls = find_mutations(genome.database, GenotypeResults().load_hits(
+            io.StringIO(genome.blast_report()), 'blast'), 0.6)
+
+        for gene in genome.planted:
+            if gene.kind in (MUTATION, REVERSE):
+                assert len(calls[gene.gene_id]) == 1
+
+    def test_repeated_copies_kept(self):
+        # Two copies of an operon plus a worse hit of the first copy
+        first = _hit(0, 0, 1000, 1800.)
+        second = _hit(50000, 0, 1000, 1700.)
+        worse = _hit(10, 10, 500, 800.)
+
+        assert rank_hits([worse, second, first]) == [(2, []), (1, []),
+            (0, [2])]
+
+    def test_partial_duplicates_checked(self):
+        # The worse hit reaches past the better one, the
+        # mutation at 1051 is only in the worse one
+        first = _mutated(_hit(0, 0, 1000, 1800.))
+        worse = _mutated(_hit(899, 899, 201, 300.))
+
+        call, = find_mutations(_Database(), _Results([first, worse]),
+            0.)['16S']
+        assert (call.position, call.query_codon) == (1051, 'G')
+        assert call.query_start == 899
+
+    def test_duplicates_checked_when_not_called(self):
+        # The better hit holds the target but doesn't call it
+        # the way the worse one does
+        first = _hit(0, 0, 2000, 1800.)
+        first.reference_seq = first.query_seq = 'A' * 2000
+        worse = _mutated(_hit(899, 899, 201, 300.))
+
+        calls = find_mutations(_Database(), _Results([first, worse]), 0.)
+        assert [call.query_start for call in calls['16S']] == [899]
+
+        # Once the better hit calls it, it is only reported once
+        first = _mutated(_hit(0, 0, 2000, 1800.))
+
+        calls = find_mutations(_Database(), _Results([first, worse]), 0.)
+        assert [call.query_start for call in calls['16S']] == [0]
+
+    def test_short_hits_hide_nothing(self):
+        # The better hit is too short to count, so the target
+        # is still called with the worse one
+        first = _mutated(_hit(0, 0, 2000, 1800., relative_len=0.3))
+        worse = _mutated(_hit(899, 899, 201, 300., relative_len=0.9))
+
+        calls = find_mutations(_Database(), _Results([first, worse]), 0.6)
+        assert [call.query_start for call in calls['16S']] == [899]
+
+    def test_references_without_targets(self):
+        hit = _mutated(_hit(0, 0, 2000, 1800.))
+        hit.reference_id = 'gyrA'
+        database = _Database()
+
+        # The targets are shared between workers, looking one
+        # up must not add to them
+        assert not find_mutations(database, _Results([hit]), 0.)
+        assert list(database.targets) == ['16S']
+
+    @pytest.mark.parametrize('seed', [0, 1, 2])
+    def test_duplicates_keep_recall(self, seed):
+        genome = make_genome(genome_size=50 * 50000, contigs=100, genes=50,
+            seed=seed)
+        hits = GenotypeResults().load_hits(
+            io.StringIO(genome.blast_report()), 'blast').hits
+
+        # Every planted mutation that any one hit calls on its
+        # own is still called with all of them together
+        alone = set()
+        for hit in hits:
+            alone |= _found(genome, [hit])
+
+        expected = set((gene.gene_id, gene.codon_position) for gene \
+            in genome.planted if gene.kind in CALLABLE_KINDS)
+
+        assert alone & expected
+        assert _found(genome, hits) & expected == alone & expected
@@ -9,10 +9,86 @@
 ###################################################################
 
 import io
+import os
+import random
+import threading
+import time
 import pytest
 
+import genomics_tools.tools.align as align
+from genomics_tools.tools.align import BLASTSettings
 from genomics_tools.tools.align import GenotypeHit
 from genomics_tools.tools.align import GenotypeResults
+from genomics_tools.tools.align import align_blast_nodb
+from genomics_tools.tools.align import align_blast_sharded
+from genomics_tools.tools.align import blast_search_space
+from genomics_tools.tools.align import merge_window_hits
+from genomics_tools.tools.align import shard_query
+from genomics_tools.tools.align import shard_references
+from genomics_tools.tools.environment import Environment
+from genomics_tools.tools.tools import fasta_iterator_path
+
+def _hit_line(query, reference, qstart, qend, sstart, send):
+    return '\t'.join([query, reference, '100.000', str(qend - qstart + 1),
+        '0', '0', str(qstart), str(qend), str(sstart), str(send), '1e-50',
+        '100.0'])
+
+def _write_hits(path, lines):
+    with open(path, 'w') as f:
+        f.write('# BLASTN 2.9.0+\n')
+        for line in lines:
+            f.write(line + '\n')
+
+class FakeBlastn(object):
+    """
+    Stands in for running BLASTn, writes out no hits and keeps
+    track of the commands and how many ran at once
+    """
+
+    def __init__(self, exit_code=0):
+        self.commands = []
+        self.most_at_once = 0
+        self._exit_code = exit_code
+        self._running = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, args):
+        with self._lock:
+            self.commands.append(args)
+            self._running += 1
+            self.most_at_once = max(self.most_at_once, self._running)
+
+        time.sleep(0.01)
+        _write_hits(args[args.index('-out') + 1], [])
+
+        with self._lock:
+            self._running -= 1
+
+        return self._exit_code, b'', b'', None
+
+@pytest.fixture
+def blast_env(tmp_path, monkeypatch):
+    monkeypatch.setattr(align, 'find_tool', lambda name: name)
+
+    env = Environment()
+    env.tempdir = str(tmp_path / 'tmp')
+
+    rng = random.Random(1)
+    with open(str(tmp_path / 'query.fasta'), 'w') as f:
+        for i in range(2):
+            f.write('>contig_{}\n{}\n'.format(i + 1, ''.join(
+                rng.choice('ACGT') for _ in range(5000))))
+
+    with open(str(tmp_path / 'references.fasta'), 'w') as f:
+        for i in range(4):
+            f.write('>gene{}|300\n{}\n'.format(i, ''.join(
+                rng.choice('ACGT') for _ in range(300))))
+
+    return env, str(tmp_path / 'query.fasta'), \
+        str(tmp_path / 'references.fasta')
+
+_SETTINGS = BLASTSettings(task='blastn', identity=0.9, relative_minlen=0,
+    absolute_minlen=0, include_sequences=True)
 
 class TestAlign:
 
@@ -56,4 +132,195 @@ class TestAlign:
         f = io.StringIO(line)
 
         genotype_object = GenotypeResults().load_hits(f, 'blast')
-        assert len(genotype_object.hits) == 1
\ No newline at end of file
+        assert len(genotype_object.hits) == 1
+
+    def test_genotype_results_filter(self):
+        lines = "# BLASTN 2.9.0+\n" \
+            "CU928145.2\trpoB|4029\t92.000\t25\t2\t0\t4808419\t4808443\t735\t711\t0.68\t37.4\n" \
+            "CU928145.2\tgyrA|2628\t99.000\t25\t0\t0\t1000\t1024\t1\t25\t0.01\t45.0\n"
+        f = io.StringIO(lines)
+
+        genotype_object = GenotypeResults().load_hits(f, 'blast')
+        filtered = genotype_object.filter(0.95)
+
+        assert len(genotype_object.hits) == 2
+        assert [hit.reference_id for hit in filtered.hits] == ['gyrA']
+
+    def test_shard_query(self, tmp_path):
+        rng = random.Random(0)
+        contigs = [('contig_1', 10000), ('contig_2', 3000), ('contig_3', 200)]
+        sequences = {}
+
+        query = str(tmp_path / 'query.fasta')
+        with open(query, 'w') as f:
+            for contig_id, length in contigs:
+                sequences[contig_id] = ''.join(rng.choice('ACGT') \
+                    for _ in range(length))
+                f.write('>{} some description\n{}\n'.format(contig_id,
+                    sequences[contig_id]))
+
+        paths, windows = shard_query(query, str(tmp_path / 'shards'), 4, 500)
+        assert 1 < len(paths) <= 4
+
+        covered = {contig_id: [] for contig_id in sequences}
+        for path in paths:
+            for name, sequence in fasta_iterator_path(path):
+                window = windows[name]
+                assert sequences[window.contig_id][window.offset:\
+                    window.offset+window.length] == sequence
+                covered[window.contig_id].append((window.offset,
+                    window.offset + window.length))
+
+        # Every contig is covered end to end, and neighbouring
+        # windows overlap by enough for a reference to fit
+        for contig_id, spans in covered.items():
+            spans.sort()
+            assert spans[0][0] == 0
+            assert spans[-1][1] == len(sequences[contig_id])
+
+            for (_, end), (start, _) in zip(spans, spans[1:]):
+                assert end - start >= 500
+
+    def test_merge_window_hits(self, tmp_path):
+        query = str(tmp_path / 'query.fasta')
+        with open(query, 'w') as f:
+            f.write('>contig_1\n{}\n'.format('A' * 3000))
+
+        paths, windows = shard_query(query, str(tmp_path / 'shards'), 2, 1000)
+        assert len(windows) == 2
+
+        first, second = sorted(windows.values(), key=lambda w: w.offset)
+        shift = second.offset
+
+        _write_hits(paths[0] + '.out', [
+            # Well inside the first window
+            _hit_line(first.name, 'gyrA|300', 101, 400, 1, 300),
+            # In the overlap, found by both windows
+            _hit_line(first.name, 'parC|300', shift + 101, shift + 400,
+                300, 1),
+            # Cut off by the end of the first window
+            _hit_line(first.name, 'rpoB|900', first.length - 199,
+                first.length, 1, 200)
+        ])
+
+        _write_hits(paths[1] + '.out', [
+            _hit_line(second.name, 'parC|300', 101, 400, 300, 1),
+            _hit_line(second.name, 'rpoB|900', first.length - shift - 199,
+                first.length - shift + 700, 1, 900)
+        ])
+
+        outputfile = str(tmp_path / 'merged.txt')
+        assert merge_window_hits([path + '.out' for path in paths], windows,
+            outputfile) == 3
+
+        hits = GenotypeResults().load_hits(outputfile, 'blast').hits
+        found = {hit.reference_id: hit for hit in hits}
+
+        assert sorted(found) == ['gyrA', 'parC', 'rpoB']
+        assert all(hit.query_id == 'contig_1' for hit in hits)
+        assert found['parC'].query_start == shift + 100
+        assert not found['parC'].forward
+        assert found['rpoB'].absolute_len == 900
+        assert found['rpoB'].query_stop == first.length + 699
+
+    def test_shard_references(self, tmp_path):
+        rng = random.Random(0)
+        lengths = [rng.randint(100, 3000) for _ in range(40)]
+        subject = str(tmp_path / 'references.fasta')
+
+        with open(subject, 'w') as f:
+            for i, length in enumerate(lengths):
+                f.write('>gene{}|{}\n{}\n'.format(i, length, 'A' * length))
+
+        paths = shard_references(subject, 4)
+        assert len(paths) == 4
+
+        loads = []
+        names = []
+        for path in paths:
+            records = list(fasta_iterator_path(path))
+            names.extend(name for name, _ in records)
+            loads.append(sum(len(sequence) for _, sequence in records))
+
+        # Everything ends up in exactly one shard, and no shard
+        # has much more than its share
+        assert sorted(names) == sorted('gene{}|{}'.format(i, length) \
+            for i, length in enumerate(lengths))
+        assert max(loads) - min(loads) <= max(lengths)
+
+        # The split is reused
+        mtime = os.stat(paths[0]).st_mtime
+        assert shard_references(subject, 4) == paths
+        assert os.stat(paths[0]).st_mtime == mtime
+
+    def test_merge_reference_shards(self, tmp_path):
+        first = str(tmp_path / 'hits_0_0.txt')
+        second = str(tmp_path / 'hits_0_1.txt')
+
+        _write_hits(first, [
+            _hit_line('contig_2', 'gyrA|300', 101, 400, 1, 300),
+            _hit_line('contig_1', 'gyrA|300', 501, 800, 1, 300)
+        ])
+        _write_hits(second, [
+            _hit_line('contig_1', 'parC|300', 101, 400, 300, 1)
+        ])
+
+        outputfile = str(tmp_path / 'merged.txt')
+        assert merge_window_hits([first, second], {}, outputfile,
+            contigs=['contig_1', 'contig_2']) == 3
+
+        # In the order of the query, not of the shards
+        hits = GenotypeResults().load_hits(outputfile, 'blast').hits
+        assert [(hit.query_id, hit.reference_id, hit.query_start) \
+            for hit in hits] == [('contig_1', 'parC', 100),
+                ('contig_1', 'gyrA', 500), ('contig_2', 'gyrA', 100)]
+
+    def test_shards_share_blast_threads(self, blast_env, monkeypatch):
+        env, query, subject = blast_env
+        blastn = FakeBlastn()
+        monkeypatch.setattr(align, 'run_process', blastn)
+
+        env.blast_threads = 2
+        align_blast_sharded(query, subject, _SETTINGS, env, query_shards=2,
+            reference_shards=2)
+
+        assert len(blastn.commands) == 4
+        assert blastn.most_at_once <= 2
+        assert all(args[args.index('-num_threads') + 1] == '1' \
+            for args in blastn.commands)
+
+        blastn.commands = []
+        env.blast_threads = 8
+        align_blast_sharded(query, subject, _SETTINGS, env, query_shards=2,
+            reference_shards=2)
+
+        assert all(args[args.index('-num_threads') + 1] == '2' \
+            for args in blastn.commands)
+
+    def test_shards_cleaned_up_on_failure(self, blast_env, monkeypatch):
+        env, query, subject = blast_env
+        monkeypatch.setattr(align, 'run_process', FakeBlastn(exit_code=1))
+
+        with pytest.raises(RuntimeError):
+            align_blast_sharded(query, subject, _SETTINGS, env,
+                query_shards=2)
+
+        assert not os.path.exists(os.path.join(env.tempdir, 'query_shards'))
+
+    def test_sharded_search_space(self, blast_env, monkeypatch):
+        env, query, subject = blast_env
+        blastn = FakeBlastn()
+        monkeypatch.setattr(align, 'run_process', blastn)
+
+        search_space = blast_search_space(query, subject)
+        assert search_space == 10000 * 1200
+
+        align_blast_nodb(query, subject, _SETTINGS, env,
+            search_space=search_space)
+        align_blast_sharded(query, subject, _SETTINGS, env, query_shards=2,
+            reference_shards=2, search_space=search_space)
+        align_blast_sharded(query, subject, _SETTINGS, env, query_shards=2)
+
+        assert len(blastn.commands) == 7
+        assert set(args[args.index('-searchsp') + 1] \
+            for args in blastn.commands) == set([str(search_space)])
@@ -0,0 +1,148 @@
+###################################################################
+#
+# Tests for the benchmark suite and its synthetic genomes
+#
+# Author: Milan Patel
+# Contact: https://github.com/theMPatel
+# Version 1.0
+#
+###################################################################
+
+import gc
+import io
+import os
+import weakref
+import pytest
+
+from benchmarks.synthetic import make_genome
+from benchmarks.synthetic import FRAGMENT, MUTATION, REVERSE, WILDTYPE
+from benchmarks.suite import compare_results
+from benchmarks.suite import load_results
+from benchmarks.suite import run_suite
+from benchmarks.suite import save_results
+
+from tools.align import GenotypeResults
+from genotyping.ab_detection import MutationCall
+from genotyping.ab_detection import find_acquired_genes
+from genotyping.ab_detection import find_mutations
+from genotyping.mutation_finder import compile_target
+
+class TestBenchmarks:
+
+    def test_synthetic_genome(self):
+        genome = make_genome(genome_size=200000, contigs=10, genes=10, seed=3)
+
+        assert make_genome(genome_size=200000, contigs=10, genes=10,
+            seed=3).fasta() == genome.fasta()
+
+        assert len(genome.contigs) == 10
+        assert abs(genome.length - 200000) < 100000
+
+        results = GenotypeResults().load_hits(
+            io.StringIO(genome.blast_report()), 'blast')
+
+        # Every hit has to be where the gene was planted
+        for hit in results.hits:
+            contig = genome.contigs[hit.query_id]
+            aligned = hit.query_seq.replace('-', '')
+            assert contig[hit.query_start:hit.query_stop+1] == aligned
+
+        planted = {gene.gene_id: gene for gene in genome.planted}
+
+        for hit in results.hits:
+            if planted[hit.reference_id].kind == FRAGMENT:
+                assert hit.relative_len < 0.6
+
+        found = set()
+        for reference, calls in find_mutations(genome.database, results,
+            0.6).items():
+
+            for call in calls:
+                found.add((reference, call.position, call.query_aa))
+
+        for gene in genome.planted:
+            key = (gene.gene_id, gene.codon_position, gene.resistance_aa)
+
+            if gene.kind in (MUTATION, REVERSE):
+                assert key in found
+
+            elif gene.kind == WILDTYPE:
+                assert not any(call[0] == gene.gene_id for call in found)
+
+    def test_calls_let_go_of_hits(self):
+        genome = make_genome(genome_size=200000, contigs=10, genes=10, seed=3)
+        results = GenotypeResults().load_hits(
+            io.StringIO(genome.blast_report()), 'blast')
+        hits = [weakref.ref(hit) for hit in results.hits]
+
+        calls = find_mutations(genome.database, results, 0.6)
+        del results
+        gc.collect()
+
+        assert calls
+        assert all(hit() is None for hit in hits)
+
+        for call in (call for found in calls.values() for call in found):
+            assert isinstance(call, MutationCall)
+            assert len(call.reference) <= 11 and len(call.query) <= 11
+
+    def test_compiled_targets(self):
+        coding = compile_target('gyrA', 'gyrA', 83, ['TCG'], ['S'],
+            ['L', 'W'], ['Nalidixic acid'], ['PM1'], True)
+
+        assert (coding.start, coding.end) == (246, 248)
+        assert coding.reference_codon == frozenset(['TCG'])
+        assert coding.resistance_aa == frozenset(['L', 'W'])
+        assert not coding.insertion and not coding.deletion
+
+        promoter = compile_target('ampC-promoter', 'ampC', -42, ['C'],
+            ['C'], ['T', '-'], ['Ampicillin'], ['PM2'], False)
+
+        assert (promoter.start, promoter.end) == (11, 11)
+        assert promoter.deletion and not promoter.insertion
+
+        rna = compile_target('23S', '23S', 2059, ['-'], ['-'], ['G'],
+            ['Azithromycin'], ['PM3'], False)
+
+        assert (rna.start, rna.end) == (2058, 2058)
+        assert rna.insertion and not rna.deletion
+
+    def test_acquired_genes(self):
+        genome = make_genome(genome_size=200000, contigs=10, genes=10, seed=3)
+        results = GenotypeResults().load_hits(
+            io.StringIO(genome.blast_report()), 'blast')
+
+        genes = find_acquired_genes(genome.database, results,
+            genome.contig_sizes, 0.9, 0.6)
+
+        # Every gene is found once, even the ones broken over
+        # two contigs and the ones with a second trimmed hit
+        assert sorted(genes) == sorted(gene.gene_id for \
+            gene in genome.planted)
+
+        for gene in genome.planted:
+            region, = genes[gene.gene_id]
+            assert region.coverage >= 0.9
+            assert 0.9 <= region.identity <= 1.0
+            assert len(region.locations) == \
+                (2 if gene.kind == FRAGMENT else 1)
+
+    def test_suite_round_trip(self, tmp_path):
+        results = run_suite(quick=True, repeat=1)
+        assert results
+
+        for result in results:
+            assert result.throughput > 0
+            assert result.peak_bytes > 0
+
+        path = os.path.join(str(tmp_path), 'benchmarks.json')
+        save_results(path, results)
+
+        comparisons = compare_results(load_results(path), results)
+        assert len(comparisons) == len(results)
+        assert not any(regressed for _, _, _, regressed in comparisons)
+
+        slower = [result._replace(throughput=result.throughput / 2.) \
+            for result in results]
+        assert all(regressed for _, _, _, regressed in \
+            compare_results(results, slower))
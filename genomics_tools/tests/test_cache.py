@@ -0,0 +1,49 @@
+###################################################################
+#
+# Tests for the cache module
+#
+# Author: Milan Patel
+# Contact: https://github.com/theMPatel
+# Version 1.0
+#
+###################################################################
+
+import os
+import pytest
+
+from genomics_tools.tools.cache import ResultCache
+from genomics_tools.tools.cache import make_key
+
+class TestResultCache:
+
+    def test_make_key(self):
+        assert make_key('a', {'x': 1, 'y': 2}) == \
+            make_key('a', {'y': 2, 'x': 1})
+        assert make_key('a', 1) != make_key('a', 2)
+
+    def test_round_trip(self, tmp_path):
+        cache = ResultCache(str(tmp_path), 1024*1024)
+        content = {'results': {'gyrA@83': True}, 'notes': {}}
+
+        assert cache.get('missing') is None
+
+        cache.put('key', content)
+        assert cache.get('key') == content
+
+    def test_evicts_least_recently_used(self, tmp_path):
+        cache = ResultCache(str(tmp_path), 250)
+        payload = 'x' * 100
+
+        cache.put('first', payload)
+        cache.put('second', payload)
+
+        # Make the first entry older than the second, then use it
+        os.utime(os.path.join(str(tmp_path), 'first.json'), (1, 1))
+        os.utime(os.path.join(str(tmp_path), 'second.json'), (2, 2))
+        assert cache.get('first') == payload
+
+        cache.put('third', payload)
+
+        assert cache.get('second') is None
+        assert cache.get('first') == payload
+        assert cache.get('third') == payload
@@ -0,0 +1,93 @@
+###################################################################
+#
+# Tests for the daemon module
+#
+# Author: Milan Patel
+# Contact: https://github.com/theMPatel
+# Version 1.0
+#
+###################################################################
+
+import os
+import socket
+import threading
+import pytest
+
+from genomics_tools.tools.daemon import SampleServer
+from genomics_tools.tools.daemon import shutdown_server
+from genomics_tools.tools.daemon import submit_samples
+
+def _job(query):
+    if query.endswith('bad.fasta'):
+        raise ValueError('Bad sample')
+
+    return {'name': os.path.basename(query)}
+
+class TestSampleServer:
+
+    def test_submit_and_shutdown(self, tmp_path):
+        socket_path = os.path.join(str(tmp_path), 'daemon.sock')
+        server = SampleServer(socket_path, _job, workers=2)
+
+        thread = threading.Thread(target=server.serve)
+        thread.start()
+
+        try:
+            responses = list(submit_samples(socket_path,
+                ['a.fasta', 'bad.fasta', 'b.fasta']))
+
+        finally:
+            shutdown_server(socket_path)
+            thread.join(5)
+
+        by_status = {}
+        for response in responses:
+            by_status.setdefault(response['status'], []).append(response)
+
+        assert sorted(r['result']['name'] for r in by_status['done']) == \
+            ['a.fasta', 'b.fasta']
+        assert len(by_status['failed']) == 1
+        assert not thread.is_alive()
+        assert not os.path.exists(socket_path)
+
+    def test_replaces_stale_socket(self, tmp_path):
+        socket_path = os.path.join(str(tmp_path), 'daemon.sock')
+
+        # Bound but never listening, like a server that died
+        stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stale.bind(socket_path)
+        stale.close()
+
+        server = SampleServer(socket_path, _job)
+        server.server_close()
+
+        assert os.path.exists(socket_path)
+
+    def test_refuses_running_daemon(self, tmp_path):
+        socket_path = os.path.join(str(tmp_path), 'daemon.sock')
+        server = SampleServer(socket_path, _job)
+
+        thread = threading.Thread(target=server.serve)
+        thread.start()
+
+        try:
+            with pytest.raises(RuntimeError):
+                SampleServer(socket_path, _job)
+
+        finally:
+            shutdown_server(socket_path)
+            thread.join(5)
+
+        assert not thread.is_alive()
+
+    def test_refuses_other_files(self, tmp_path):
+        socket_path = os.path.join(str(tmp_path), 'daemon.sock')
+
+        with open(socket_path, 'w') as f:
+            f.write('Not a socket\n')
+
+        with pytest.raises(RuntimeError):
+            SampleServer(socket_path, _job)
+
+        with open(socket_path, 'r') as f:
+            assert f.read() == 'Not a socket\n'
@@ -0,0 +1,109 @@
+###################################################################
+#
+# Tests for the dbinfo module
+#
+# Author: Milan Patel
+# Contact: https://github.com/theMPatel
+# Version 1.0
+#
+###################################################################
+
+import os
+import pytest
+
+from genomics_tools.tools.dbinfo import CombinedReferences
+from genomics_tools.tools.dbinfo import DbInfo
+from genomics_tools.tools.tools import parse_fasta
+
+_FASTA = (
+    ">gyrA:1:ACC001\n"
+    "ACGTACGTAC\n"
+    "GTACGT\n"
+    "\n"
+    ">parC:1:ACC002\n"
+    "ttttggggcccc\n"
+    ">parC:1:ACC003\n"
+    "AAAA\n"
+)
+
+@pytest.fixture
+def database_dir(tmp_path):
+    with open(os.path.join(str(tmp_path), 'genes.fasta'), 'w') as f:
+        f.write(_FASTA)
+
+    return str(tmp_path)
+
+class TestDbInfo:
+
+    def test_lazy_matches_eager(self, database_dir):
+        eager = DbInfo(database_dir)
+        lazy = DbInfo(database_dir, lazy=True)
+
+        assert sorted(eager.sequences) == sorted(lazy.sequences)
+
+        for ref in eager.sequences:
+            assert lazy.sequences[ref].sequence is None
+            assert lazy.get_reflen(ref) == eager.get_reflen(ref)
+            assert lazy.get_refseq(ref) == eager.get_refseq(ref)
+
+    def test_lazy_export(self, database_dir, tmp_path):
+        eager_path = os.path.join(str(tmp_path), 'out', 'eager.fasta')
+        lazy_path = os.path.join(str(tmp_path), 'out', 'lazy.fasta')
+
+        DbInfo(database_dir).export_sequences(eager_path)
+        DbInfo(database_dir, lazy=True).export_sequences(lazy_path)
+
+        assert parse_fasta(eager_path) == parse_fasta(lazy_path)
+
+    def test_missing_reference(self, database_dir):
+        with pytest.raises(KeyError):
+            DbInfo(database_dir, lazy=True).get_refseq('missing')
+
+    def test_export_cached(self, database_dir, tmp_path):
+        cache_dir = os.path.join(str(tmp_path), 'cache')
+
+        first = DbInfo(database_dir).export_cached(cache_dir)
+        mtime = os.stat(first).st_mtime_ns
+        second = DbInfo(database_dir, lazy=True).export_cached(cache_dir)
+
+        assert first == second
+        assert os.stat(second).st_mtime_ns == mtime
+        assert len(parse_fasta(first)) == 3
+
+    def test_version_follows_content(self, database_dir):
+        version = DbInfo(database_dir).version
+
+        with open(os.path.join(database_dir, 'genes.fasta'), 'a') as f:
+            f.write('>extra:1:ACC004\nACGT\n')
+
+        assert DbInfo(database_dir).version != version
+
+    def test_combined_references(self, database_dir, tmp_path):
+        database = DbInfo(database_dir, lazy=True)
+        references = CombinedReferences([
+            ('point', database),
+            ('acquired', DbInfo(database_dir))
+        ])
+
+        path = references.export_cached(os.path.join(str(tmp_path), 'cache'))
+        exported = parse_fasta(path)
+        assert len(exported) == 6
+
+        for ref in database.sequences:
+            for name in ('point', 'acquired'):
+                combined = '{}__{}|{}'.format(name, ref,
+                    database.get_reflen(ref))
+                assert exported[combined] == database.get_refseq(ref)
+
+                assert references.split_reference(
+                    combined.split('|')[0]) == (name, ref)
+
+        with pytest.raises(KeyError):
+            references.split_reference('missing__gyrA_1')
+
+    def test_combined_version(self, database_dir):
+        database = DbInfo(database_dir)
+        version = CombinedReferences([('point', database)]).version
+
+        assert CombinedReferences([('point', database)]).version == version
+        assert CombinedReferences([('acquired', database)]).version != version
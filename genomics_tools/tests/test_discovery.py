@@ -0,0 +1,107 @@
+###################################################################
+#
+# Tests for the discovery module
+#
+# Author: Milan Patel
+# Contact: https://github.com/theMPatel
+# Version 1.0
+#
+###################################################################
+
+import os
+import stat
+import pytest
+
+from genomics_tools.tools.discovery import ResolutionCache
+from genomics_tools.tools.discovery import ToolLocator
+from genomics_tools.tools.discovery import find_tool
+
+def _make_tool(directory, name):
+    os.makedirs(str(directory), exist_ok=True)
+    path = os.path.join(str(directory), name)
+
+    with open(path, 'w') as f:
+        f.write('#!/bin/sh\n')
+
+    os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+    return os.path.realpath(path)
+
+class TestDiscovery:
+
+    @pytest.fixture(autouse=True)
+    def no_locator(self, monkeypatch):
+        monkeypatch.setenv('PATH', os.defpath)
+        ToolLocator.current = None
+        yield
+        ToolLocator.current = None
+
+    def test_cache_round_trip(self, tmp_path):
+        cache_path = str(tmp_path / 'cache' / 'discovery.json')
+        target = str(tmp_path / 'database')
+        os.makedirs(target)
+
+        ResolutionCache(cache_path).put('directory:x', target)
+        assert ResolutionCache(cache_path).get('directory:x') == target
+        assert ResolutionCache(cache_path).get('directory:y') is None
+
+    def test_cache_invalidated_by_mtime(self, tmp_path):
+        tool = _make_tool(tmp_path / 'bin', 'blastn')
+        cache = ResolutionCache(str(tmp_path / 'discovery.json'))
+        cache.put('tool:blastn', tool)
+
+        mtime = os.stat(tool).st_mtime
+        os.utime(tool, (mtime + 10, mtime + 10))
+        assert cache.get('tool:blastn') is None
+
+        os.remove(tool)
+        assert cache.get('tool:blastn') is None
+
+    def test_unreadable_cache(self, tmp_path):
+        cache_path = tmp_path / 'discovery.json'
+        cache_path.write_text('not json')
+        assert ResolutionCache(str(cache_path)).get('tool:blastn') is None
+
+    def test_tool_found_by_walking(self, tmp_path):
+        tool = _make_tool(tmp_path / 'tools' / 'ncbi' / 'bin', 'blastn')
+        cache_path = str(tmp_path / 'discovery.json')
+
+        locator = ToolLocator([str(tmp_path / 'tools')],
+            cache=ResolutionCache(cache_path))
+        assert locator.tool('blastn') == tool
+        assert find_tool('blastn') == tool
+
+        # The next run doesn't need to walk
+        locator = ToolLocator([], cache=ResolutionCache(cache_path))
+        assert locator.tool('blastn') == tool
+
+    def test_missing_tool(self, tmp_path):
+        locator = ToolLocator([str(tmp_path)])
+        assert locator.tool('not_a_real_tool') is None
+
+    def test_bin_dir_override(self, tmp_path):
+        _make_tool(tmp_path / 'tools', 'blastn')
+        tool = _make_tool(tmp_path / 'override', 'blastn')
+
+        locator = ToolLocator([str(tmp_path / 'tools')],
+            bin_dir=str(tmp_path / 'override'))
+        assert locator.tool('blastn') == tool
+
+    def test_directory_found_and_cached(self, tmp_path):
+        database = tmp_path / 'tools' / 'pointfinder_db'
+        os.makedirs(str(database))
+        cache_path = str(tmp_path / 'discovery.json')
+
+        locator = ToolLocator([str(tmp_path / 'tools')],
+            cache=ResolutionCache(cache_path))
+        assert locator.directory('pointfinder_db') == \
+            os.path.realpath(str(database))
+
+        locator = ToolLocator([], cache=ResolutionCache(cache_path))
+        assert locator.directory('pointfinder_db') == \
+            os.path.realpath(str(database))
+
+    def test_missing_directory(self, tmp_path):
+        locator = ToolLocator([str(tmp_path)])
+
+        with pytest.raises(RuntimeError):
+            locator.directory('pointfinder_db')
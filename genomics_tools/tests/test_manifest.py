@@ -0,0 +1,64 @@
+###################################################################
+#
+# Tests for the manifest module
+#
+# Author: Milan Patel
+# Contact: https://github.com/theMPatel
+# Version 1.0
+#
+###################################################################
+
+import os
+import pytest
+
+from genomics_tools.tools.manifest import RunManifest
+from genomics_tools.tools.manifest import DONE, FAILED, PENDING, RUNNING
+
+class TestRunManifest:
+
+    def test_resume(self, tmp_path):
+        path = os.path.join(str(tmp_path), 'manifest.jsonl')
+        output = os.path.join(str(tmp_path), 'a.json')
+
+        manifest = RunManifest(path)
+        manifest.add('a.fasta', output)
+        manifest.add('b.fasta', os.path.join(str(tmp_path), 'b.json'))
+        manifest.add('c.fasta', os.path.join(str(tmp_path), 'c.json'))
+
+        manifest.mark('a.fasta', RUNNING)
+        manifest.mark('a.fasta', DONE)
+        manifest.mark('b.fasta', FAILED, error='Bad sample')
+        manifest.mark('c.fasta', RUNNING)
+
+        with open(output, 'w') as f:
+            f.write('{}')
+
+        # Simulate a crash in the middle of writing a line
+        with open(path, 'a') as f:
+            f.write('{"sample": "c.fa')
+
+        resumed = RunManifest(path, resume=True)
+
+        assert resumed.is_done('a.fasta')
+        assert not resumed.is_done('b.fasta')
+        assert resumed['b.fasta'].error == 'Bad sample'
+        assert resumed['c.fasta'].state == RUNNING
+        assert list(resumed.counts().values()) == [0, 1, 1, 1]
+
+    def test_missing_output_is_not_done(self, tmp_path):
+        path = os.path.join(str(tmp_path), 'manifest.jsonl')
+
+        manifest = RunManifest(path)
+        manifest.add('a.fasta', os.path.join(str(tmp_path), 'gone.json'))
+        manifest.mark('a.fasta', DONE)
+
+        assert not RunManifest(path, resume=True).is_done('a.fasta')
+
+    def test_fresh_run_forgets(self, tmp_path):
+        path = os.path.join(str(tmp_path), 'manifest.jsonl')
+
+        manifest = RunManifest(path)
+        manifest.add('a.fasta', 'a.json')
+
+        assert len(RunManifest(path)) == 0
+        assert RunManifest(path, resume=False).counts()[PENDING] == 0
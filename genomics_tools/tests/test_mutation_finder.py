@@ -0,0 +1,104 @@
+###################################################################
+#
+# Tests for the mutation_finder module
+#
+# Author: Milan Patel
+# Contact: https://github.com/theMPatel
+# Version 1.0
+#
+###################################################################
+
+from collections import namedtuple
+import io
+import os
+import random
+import pytest
+
+import benchmarks
+import genotyping.ab_detection as ab_detection
+from genotyping import mutation_finder
+from tools.align import GenotypeResults
+from tools.environment import Environment
+from tools.environment import ResultWriter
+
+Settings = namedtuple('Settings', ['query', 'version', 'database',
+    'acquired_database', 'percent_identity', 'min_relative_coverage'])
+
+@pytest.fixture
+def sample(tmp_path):
+    rng = random.Random(0)
+    gene = ''.join(rng.choice('ACGT') for _ in range(300))
+    gene = gene[:246] + 'TCG' + gene[249:]
+
+    database = tmp_path / 'database'
+    database.mkdir()
+    (database / 'gyrA.fsa').write_text('>gyrA\n{}\n'.format(gene))
+    (database / 'RNA_genes.txt').write_text('')
+    (database / 'resistens-overview.txt').write_text(
+        '#Gene_ID\tGene_name\tCodon_pos\tRef_nuc\tRef_codon\tRes_codon'
+        '\tResistance\tPMID\n'
+        'gyrA\tgyrA\t83\tTCG\tS\tL,W\tNalidixic acid\t8891148\n')
+
+    query = tmp_path / 'sample.fasta'
+    query.write_text('>contig1\n{}\n'.format(gene))
+
+    return Settings(query=str(query), version='1.0.0',
+        database=str(database), acquired_database=None,
+        percent_identity=0.9, min_relative_coverage=0.6), gene
+
+class TestMutationFinder:
+
+    @pytest.fixture(autouse=True)
+    def no_writer(self):
+        yield
+        ResultWriter.current = None
+
+    def test_rethreshold_after_cached_run(self, sample, tmp_path,
+        monkeypatch):
+
+        settings, gene = sample
+        aligned = []
+
+        def align_query(sequence_database, query_path, percent_identity,
+            env, hits_path=None):
+
+            aligned.append(query_path)
+            report = '# BLASTN 2.9.0+\n' + '\t'.join(['contig1', 'gyrA|300',
+                '100.000', '300', '0', '0', '1', '300', '1', '300', '1e-100',
+                '540.0', gene, gene]) + '\n'
+
+            if hits_path:
+                os.makedirs(os.path.dirname(hits_path), exist_ok=True)
+
+                with open(hits_path, 'w') as f:
+                    f.write(report)
+
+            return GenotypeResults().load_hits(io.StringIO(report), 'blast')
+
+        monkeypatch.setattr(ab_detection, 'align_query', align_query)
+
+        def run(**options):
+            env = Environment()
+            env.setup(dict({
+                'resultsdir': str(tmp_path / 'results'),
+                'tempdir': str(tmp_path / 'tmp'),
+                'cachedir': str(tmp_path / 'cache'),
+                'result_cache_mb': 1
+            }, **options))
+            ResultWriter(env.resultsdir)
+
+            mutation_finder.run(settings, env, 'sample.json')
+
+        # Warms up the result cache without keeping the hits
+        run()
+        run()
+        assert len(aligned) == 1
+
+        # The hits weren't kept the first time, so the cached
+        # results aren't enough
+        hitsdir = str(tmp_path / 'hits')
+        run(hitsdir=hitsdir)
+        assert len(aligned) == 2
+
+        run(hitsdir=hitsdir, rethreshold=True)
+        assert len(aligned) == 2
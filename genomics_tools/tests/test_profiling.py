@@ -0,0 +1,87 @@
+###################################################################
+#
+# Tests for the profiling module
+#
+# Author: Milan Patel
+# Contact: https://github.com/theMPatel
+# Version 1.0
+#
+###################################################################
+
+import io
+import os
+import tracemalloc
+import pytest
+
+from genomics_tools.tools.profiling import SampleProfiler
+from genomics_tools.tools.profiling import summarize_profiles
+
+def busy_work():
+    return sorted(str(i) for i in range(10000))
+
+class TestProfiling:
+
+    def test_every_nth_sample(self, tmp_path):
+        directory = os.path.join(str(tmp_path), 'profiles')
+        profiler = SampleProfiler(directory, every=2)
+
+        try:
+            for name in ['a.fasta', 'b.fasta', 'c.fasta']:
+                with profiler.profile(os.path.join('/data', name)):
+                    busy_work()
+
+        finally:
+            profiler.close()
+
+        assert sorted(os.listdir(directory)) == [
+            '00000.a.fasta.allocations.txt',
+            '00000.a.fasta.prof',
+            '00002.c.fasta.allocations.txt',
+            '00002.c.fasta.prof'
+        ]
+
+        with open(os.path.join(directory,
+            '00000.a.fasta.allocations.txt'), 'r') as f:
+            assert f.readline().startswith('# Traced memory')
+
+    def test_only_traces_profiled_samples(self, tmp_path):
+        profiler = SampleProfiler(str(tmp_path))
+        assert not tracemalloc.is_tracing()
+
+        tracing = []
+
+        try:
+            for name in ['a.fasta', 'b.fasta']:
+                with profiler.profile(name):
+                    tracing.append(tracemalloc.is_tracing())
+
+                    # Only one sample is profiled at a time
+                    with profiler.profile('c.fasta'):
+                        pass
+
+                assert not tracemalloc.is_tracing()
+
+        finally:
+            profiler.close()
+
+        assert tracing == [True, True]
+        assert sorted(name for name in os.listdir(str(tmp_path)) \
+            if name.endswith('.prof')) == ['00000.a.fasta.prof',
+                '00002.b.fasta.prof']
+
+    def test_summarize_profiles(self, tmp_path):
+        directory = str(tmp_path)
+        assert summarize_profiles(directory) == 0
+
+        profiler = SampleProfiler(directory)
+
+        try:
+            for name in ['a.fasta', 'b.fasta']:
+                with profiler.profile(name):
+                    busy_work()
+        finally:
+            profiler.close()
+
+        stream = io.StringIO()
+        assert summarize_profiles(directory, stream=stream) == 2
+        assert 'busy_work' in stream.getvalue()
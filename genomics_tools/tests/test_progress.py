@@ -0,0 +1,146 @@
+###################################################################
+#
+# Tests for the progress module
+#
+# Author: Milan Patel
+# Contact: https://github.com/theMPatel
+# Version 1.0
+#
+###################################################################
+
+import logging
+import os
+import time
+import pytest
+
+from genomics_tools.tools.environment import ProgressFilter
+from genomics_tools.tools.environment import SingleWriteFileHandler
+from genomics_tools.tools.progress import ProgressTracker
+from genomics_tools.tools.progress import format_eta
+from genomics_tools.tools.timing import SampleTimer
+from genomics_tools.tools.timing import span
+
+def _record(message):
+    return logging.LogRecord('test', 1, __file__, 0, message, None, None)
+
+def _read(path):
+    with open(path, 'r') as f:
+        return f.read()
+
+class TestProgressTracker:
+
+    @pytest.fixture(autouse=True)
+    def no_tracker(self):
+        ProgressTracker.current = None
+        yield
+        ProgressTracker.current = None
+
+    def test_samples_weighted_by_cost(self):
+        tracker = ProgressTracker(['small', 'big'], [1, 3])
+        assert tracker.fraction() == 0.
+        assert tracker.eta() is None
+
+        tracker.sample_done('small')
+        assert tracker.fraction() == pytest.approx(0.25)
+        assert tracker.eta() is not None
+
+        tracker.sample_done('big')
+        assert tracker.fraction() == pytest.approx(1.)
+        assert tracker.eta() == pytest.approx(0.)
+
+    def test_stages_count_towards_sample(self):
+        tracker = ProgressTracker(['a', 'b'], [1, 1],
+            stage_weights={'blastn': 0.5})
+
+        tracker.stage_done('a', 'blastn')
+        assert tracker.fraction() == pytest.approx(0.25)
+
+        # Unknown stages and samples don't count
+        tracker.stage_done('a', 'something else')
+        tracker.stage_done('c', 'blastn')
+        assert tracker.fraction() == pytest.approx(0.25)
+
+        # The stage is folded into the sample once it's done
+        tracker.sample_done('a')
+        tracker.stage_done('a', 'blastn')
+        assert tracker.fraction() == pytest.approx(0.5)
+
+    def test_repeated_stages_stay_within_sample(self):
+        tracker = ProgressTracker(['a', 'b'], [1, 1],
+            stage_weights={'blastn': 0.8})
+
+        for _ in range(3):
+            tracker.stage_done('a', 'blastn')
+
+        assert tracker.fraction() < 0.5
+
+    def test_spans_report_stages(self):
+        tracker = ProgressTracker(['sample.fasta'], [10],
+            stage_weights={'blastn': 0.5})
+
+        with SampleTimer('sample.fasta'):
+            with span('blastn'):
+                pass
+
+        assert tracker.fraction() == pytest.approx(0.5)
+
+        tracker.close()
+        assert ProgressTracker.current is None
+
+    def test_empty_batch(self):
+        tracker = ProgressTracker([], [])
+        assert tracker.fraction() == 1.
+
+    def test_format_eta(self):
+        assert format_eta(None) == 'unknown'
+        assert format_eta(3725.4) == '1:02:05'
+
+class TestSingleWriteFileHandler:
+
+    def test_first_write_is_immediate(self, tmp_path):
+        path = str(tmp_path / '__progress__.txt')
+        handler = SingleWriteFileHandler(path, min_interval=60)
+
+        handler.handle(_record('10'))
+        assert _read(path) == '10\n'
+
+        handler.close()
+        assert not os.path.exists(path + '.tmp')
+
+    def test_writes_are_throttled(self, tmp_path):
+        path = str(tmp_path / '__progress__.txt')
+        handler = SingleWriteFileHandler(path, min_interval=60)
+
+        handler.handle(_record('10'))
+        handler.handle(_record('20'))
+        handler.handle(_record('30'))
+        assert _read(path) == '10\n'
+
+        # The latest message lands when we are done
+        handler.close()
+        assert _read(path) == '30\n'
+
+    def test_deferred_write(self, tmp_path):
+        path = str(tmp_path / '__progress__.txt')
+        handler = SingleWriteFileHandler(path, min_interval=0.05)
+
+        handler.handle(_record('10'))
+        handler.handle(_record('20'))
+
+        deadline = time.monotonic() + 5
+        while _read(path) != '20\n' and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        assert _read(path) == '20\n'
+        handler.close()
+
+    def test_filter_only_numbers(self, tmp_path):
+        path = str(tmp_path / '__progress__.txt')
+        handler = SingleWriteFileHandler(path, min_interval=0)
+        handler.addFilter(ProgressFilter())
+
+        handler.handle(_record('12.5'))
+        handler.handle(_record('not a number'))
+        handler.close()
+
+        assert _read(path) == '12.5\n'
@@ -0,0 +1,124 @@
+###################################################################
+#
+# Tests for the registry module
+#
+# Author: Milan Patel
+# Contact: https://github.com/theMPatel
+# Version 1.0
+#
+###################################################################
+
+import os
+import pytest
+
+from genomics_tools.tools.registry import SpeciesRegistry
+from genomics_tools.tools.registry import read_species_manifest
+from genomics_tools.tools.registry import species_key
+
+@pytest.fixture
+def database_dir(tmp_path):
+    for name in ('escherichia_coli', 'salmonella', 'campylobacter', '.git'):
+        os.makedirs(str(tmp_path / 'pointfinder_db' / name))
+
+    with open(str(tmp_path / 'pointfinder_db' / 'README.md'), 'w') as f:
+        f.write('Not a species\n')
+
+    return str(tmp_path / 'pointfinder_db')
+
+class TestRegistry:
+
+    @pytest.fixture(autouse=True)
+    def no_registry(self):
+        SpeciesRegistry.current = None
+        yield
+        SpeciesRegistry.current = None
+
+    def test_species_key(self):
+        assert species_key('Escherichia coli') == 'escherichia_coli'
+        assert species_key(' Salmonella  enterica ') == 'salmonella_enterica'
+        assert species_key('campylobacter') == 'campylobacter'
+
+    def test_discovers_species(self, database_dir):
+        registry = SpeciesRegistry(database_dir)
+
+        assert registry.species == ['campylobacter', 'escherichia_coli',
+            'salmonella']
+        assert registry.database('salmonella') == \
+            os.path.join(database_dir, 'salmonella')
+        assert SpeciesRegistry.current is registry
+
+        with pytest.raises(RuntimeError):
+            registry.database('listeria')
+
+    def test_routes_samples(self, database_dir):
+        registry = SpeciesRegistry(database_dir, samples={
+            'a.fasta': 'Salmonella enterica',
+            'b.fasta': 'Campylobacter',
+            'c.fasta': 'Listeria monocytogenes'
+        }, default='Escherichia coli')
+
+        assert registry.database_for('/data/a.fasta') == \
+            os.path.join(database_dir, 'salmonella')
+        assert registry.species_for('/data/b.fasta') == 'campylobacter'
+        assert registry.species_for('/data/d.fasta') == 'escherichia_coli'
+
+        # Known to the manifest, but we have no database for it
+        with pytest.raises(RuntimeError):
+            registry.database_for('/data/c.fasta')
+
+    def test_detected_species(self, database_dir):
+        detected = []
+
+        def detector(query_path):
+            detected.append(query_path)
+            return None if 'unknown' in query_path else 'Salmonella enterica'
+
+        registry = SpeciesRegistry(database_dir, samples={
+            'a.fasta': 'campylobacter'
+        }, default='escherichia_coli', detector=detector)
+
+        assert registry.species_for('/data/a.fasta') == 'campylobacter'
+        assert registry.species_for('/data/b.fasta') == 'salmonella'
+        assert registry.species_for('/data/b.fasta') == 'salmonella'
+        assert registry.species_for('/data/unknown.fasta') == \
+            'escherichia_coli'
+
+        # The manifest wins and each sample is only detected once
+        assert detected == ['/data/b.fasta', '/data/unknown.fasta']
+
+    def test_groups_by_species(self, database_dir):
+        registry = SpeciesRegistry(database_dir, samples={
+            'a.fasta': 'salmonella',
+            'b.fasta': 'escherichia_coli',
+            'c.fasta': 'salmonella'
+        })
+
+        groups = registry.group(['/data/a.fasta', '/data/b.fasta',
+            '/data/c.fasta', '/data/d.fasta'])
+
+        assert list(groups.items()) == [
+            ('salmonella', ['/data/a.fasta', '/data/c.fasta']),
+            ('escherichia_coli', ['/data/b.fasta']),
+            (None, ['/data/d.fasta'])
+        ]
+
+        with pytest.raises(RuntimeError):
+            registry.species_for('/data/d.fasta')
+
+    def test_read_manifest(self, tmp_path):
+        path = str(tmp_path / 'species.tsv')
+
+        with open(path, 'w') as f:
+            f.write('# sample\tspecies\n\n/data/a.fasta\tSalmonella enterica\n'
+                'b.fasta,Escherichia coli\n')
+
+        assert dict(read_species_manifest(path)) == {
+            'a.fasta': 'Salmonella enterica',
+            'b.fasta': 'Escherichia coli'
+        }
+
+        with open(path, 'a') as f:
+            f.write('c.fasta\n')
+
+        with pytest.raises(RuntimeError):
+            read_species_manifest(path)
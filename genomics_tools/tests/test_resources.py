@@ -0,0 +1,72 @@
+###################################################################
+#
+# Tests for the resources module
+#
+# Author: Milan Patel
+# Contact: https://github.com/theMPatel
+# Version 1.0
+#
+###################################################################
+
+import os
+import sys
+import pytest
+
+from genomics_tools.tools.resources import ChildUsage
+from genomics_tools.tools.resources import percentile
+from genomics_tools.tools.resources import run_process
+from genomics_tools.tools.resources import summarize_metrics
+from genomics_tools.tools.timing import SampleTimer
+from genomics_tools.tools.timing import record_child
+
+class TestResources:
+
+    def test_run_process(self):
+        exit_code, stdout, stderr, usage = run_process([sys.executable, '-c',
+            'import sys; data = bytearray(64 * 1024 * 1024);'
+            ' print("out"); sys.stderr.write("err"); sys.exit(3)'])
+
+        assert exit_code == 3
+        assert stdout.strip() == b'out'
+        assert stderr == b'err'
+
+        if hasattr(os, 'wait4'):
+            assert usage.cpu_seconds >= 0
+            assert usage.max_rss >= 64 * 1024 * 1024
+
+    def test_percentile(self):
+        assert percentile([], 0.5) is None
+        assert percentile([3, 1, 2], 0.5) == 2
+        assert percentile([1, 2, 3, 4], 1.) == 4
+        assert percentile([0, 10], 0.9) == 9
+
+    def test_sample_timer_records_children(self):
+        with SampleTimer('sample.fasta') as timer:
+            record_child('blastn', ChildUsage(cpu_seconds=1.5, max_rss=100))
+            record_child('blastn', ChildUsage(cpu_seconds=0.5, max_rss=300))
+
+        # Nothing to count it towards
+        record_child('blastn', ChildUsage(cpu_seconds=9., max_rss=900))
+
+        children = timer.metrics()['resources']['children']
+        assert children['blastn'] == {'cpu_seconds': 2., 'max_rss': 300,
+            'calls': 2}
+
+    def test_summarize_metrics(self):
+        metrics = [
+            {
+                'total_seconds': seconds,
+                'resources': {
+                    'children': {
+                        'blastn': {'cpu_seconds': seconds, 'max_rss': 10,
+                            'calls': 1}
+                    }
+                }
+            } for seconds in range(1, 11)
+        ]
+
+        summary = summarize_metrics(metrics)
+        assert summary['samples'] == 10
+        assert summary['total_seconds']['max'] == 10
+        assert 'python_peak_rss' not in summary
+        assert summary['blastn_max_rss']['p95'] == 10
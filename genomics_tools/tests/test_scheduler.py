@@ -0,0 +1,118 @@
+###################################################################
+#
+# Tests for the scheduler module
+#
+# Author: Milan Patel
+# Contact: https://github.com/theMPatel
+# Version 1.0
+#
+###################################################################
+
+import os
+import threading
+import pytest
+
+from genomics_tools.tools.scheduler import WorkStealingPool
+from genomics_tools.tools.scheduler import estimate_cost
+from genomics_tools.tools.scheduler import plan_threads
+from genomics_tools.tools.scheduler import load_calibration
+from genomics_tools.tools.scheduler import save_calibration
+
+class TestScheduler:
+
+    def test_estimate_cost_from_index(self, tmp_path):
+        path = os.path.join(str(tmp_path), 'sample.fasta')
+
+        with open(path, 'w') as f:
+            f.write('>c1\nACGT\n')
+
+        assert estimate_cost(path).length == os.path.getsize(path)
+
+        with open(path + '.fai', 'w') as f:
+            f.write('c1\t4000\t4\t60\t61\nc2\t1000\t4100\t60\t61\n')
+
+        cost = estimate_cost(path)
+        assert cost.length == 5000
+        assert cost.contigs == 2
+
+    def test_largest_first(self):
+        order = []
+        pool = WorkStealingPool(1)
+
+        results = pool.map(lambda item: order.append(item) or item * 2,
+            ['a', 'b', 'c'], [1, 3, 2])
+
+        assert order == ['b', 'c', 'a']
+        assert results == ['aa', 'bb', 'cc']
+
+    def test_idle_workers_steal(self):
+        # The first job holds its worker until everything else
+        # has run, so the rest of that worker's queue must have
+        # been stolen
+        release = threading.Event()
+        ran = []
+
+        def job(item):
+            if item == 0:
+                release.wait(5)
+            else:
+                ran.append(item)
+
+                if len(ran) == 5:
+                    release.set()
+
+            return item
+
+        pool = WorkStealingPool(2)
+        results = pool.map(job, range(6), [100, 10, 9, 8, 7, 6])
+
+        assert results == list(range(6))
+        assert release.is_set()
+
+    def test_errors_are_raised_after_all_jobs(self):
+        ran = []
+
+        def job(item):
+            ran.append(item)
+            if item == 1:
+                raise ValueError('Bad sample')
+
+        with pytest.raises(ValueError):
+            WorkStealingPool(2).map(job, [1, 2, 3], [3, 2, 1])
+
+        assert sorted(ran) == [1, 2, 3]
+
+    def test_plan_threads_follows_queue(self):
+        # A long queue of small samples is spread across the cores
+        best = plan_threads(8, costs=[10] * 32)[0]
+        assert best.workers == 8
+        assert best.threads == 1
+
+        # One huge sample gets all of them
+        best = plan_threads(8, costs=[1000, 1, 1])[0]
+        assert best.workers == 1
+        assert best.threads == 8
+
+    def test_plan_threads_uses_calibration(self):
+        # BLASTn that doesn't get any faster past one thread
+        flat = {1: 10., 2: 10., 4: 10.}
+        best = plan_threads(4, costs=[1000, 10, 10, 10], timings=flat)[0]
+        assert best.threads == 1
+
+        # BLASTn that scales perfectly
+        linear = {1: 8., 2: 4., 4: 2.}
+        best = plan_threads(4, costs=[1000, 10, 10, 10], timings=linear)[0]
+        assert best.threads == 4
+
+    def test_plan_threads_pinned_workers(self):
+        plans = plan_threads(8, costs=[10] * 4, workers=2)
+        assert len(plans) == 1
+        assert plans[0].workers == 2
+        assert plans[0].threads == 4
+
+    def test_calibration_round_trip(self, tmp_path):
+        path = os.path.join(str(tmp_path), 'calibration.json')
+        assert load_calibration(path) is None
+
+        save_calibration(path, {1: 4., 2: 2.5})
+        assert load_calibration(path) == {1: 4., 2: 2.5}
@@ -0,0 +1,92 @@
+###################################################################
+#
+# Tests for the scratch module
+#
+# Author: Milan Patel
+# Contact: https://github.com/theMPatel
+# Version 1.0
+#
+###################################################################
+
+import os
+import pytest
+
+from genomics_tools.tools.scratch import ScratchSpace
+
+def _sample(directory, name, size):
+    path = os.path.join(str(directory), name)
+
+    with open(path, 'w') as f:
+        f.write('A' * size)
+
+    return path
+
+class TestScratch:
+
+    @pytest.fixture(autouse=True)
+    def no_scratch(self):
+        ScratchSpace.current = None
+        yield
+        ScratchSpace.current = None
+
+    def test_memory_used_when_it_fits(self, tmp_path):
+        memory = tmp_path / 'shm'
+        os.makedirs(str(memory))
+
+        scratch = ScratchSpace(str(tmp_path / 'disk'), memory_dir=str(memory),
+            limit=10000)
+        sample = _sample(tmp_path, 'sample.fasta', 100)
+
+        with scratch.sample(sample) as path:
+            assert path.startswith(str(memory))
+            assert os.path.isdir(path)
+            assert scratch.reserved == 300
+
+        # Cleaned up as soon as the sample is done
+        assert not os.path.exists(path)
+        assert scratch.reserved == 0
+
+        scratch.close()
+        assert os.listdir(str(memory)) == []
+        assert ScratchSpace.current is None
+
+    def test_disk_used_over_the_limit(self, tmp_path):
+        memory = tmp_path / 'shm'
+        os.makedirs(str(memory))
+        disk = str(tmp_path / 'disk')
+
+        scratch = ScratchSpace(disk, memory_dir=str(memory), limit=1000)
+        small = _sample(tmp_path, 'small.fasta', 200)
+        big = _sample(tmp_path, 'big.fasta', 1000)
+
+        with scratch.sample(big) as path:
+            assert path.startswith(disk)
+
+        with scratch.sample(small) as first:
+            assert first.startswith(str(memory))
+
+            # Only one small sample fits at a time
+            with scratch.sample(small) as second:
+                assert second.startswith(disk)
+
+        scratch.close()
+
+    def test_disk_only(self, tmp_path):
+        disk = str(tmp_path / 'disk')
+        scratch = ScratchSpace(disk, limit=0)
+        assert scratch.memory_dir is None
+
+        with scratch.sample(_sample(tmp_path, 'sample.fasta', 10)) as path:
+            assert path.startswith(disk)
+
+        scratch.close()
+        assert os.listdir(disk) == []
+
+    def test_cleaned_up_on_failure(self, tmp_path):
+        scratch = ScratchSpace(str(tmp_path / 'disk'))
+
+        with pytest.raises(RuntimeError):
+            with scratch.sample(_sample(tmp_path, 'sample.fasta', 10)) as path:
+                raise RuntimeError('Sample failed')
+
+        assert not os.path.exists(path)
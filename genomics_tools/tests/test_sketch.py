@@ -0,0 +1,100 @@
+###################################################################
+#
+# Tests for the sketch module
+#
+# Author: Milan Patel
+# Contact: https://github.com/theMPatel
+# Version 1.0
+#
+###################################################################
+
+import os
+import random
+import pytest
+
+import genomics_tools.tools.sketch as sketch
+from genomics_tools.tools.sketch import SketchIndex
+from genomics_tools.tools.sketch import jaccard
+from genomics_tools.tools.sketch import sketch_sequence
+from genomics_tools.tools.tools import reverse_complement
+
+def _genome(rng, length):
+    return ''.join(rng.choice('ACGT') for _ in range(length))
+
+def _mutate(rng, sequence, rate):
+    return ''.join(rng.choice('ACGT') if rng.random() < rate else base \
+        for base in sequence)
+
+def _write(path, contigs):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    with open(path, 'w') as f:
+        for i, contig in enumerate(contigs):
+            f.write('>contig{}\n{}\n'.format(i + 1, contig))
+
+    return path
+
+@pytest.fixture(scope='module')
+def genomes():
+    rng = random.Random(7)
+    return {
+        'salmonella': _genome(rng, 300000),
+        'escherichia_coli': _genome(rng, 300000)
+    }
+
+class TestSketch:
+
+    def test_strand_does_not_matter(self, genomes):
+        genome = genomes['salmonella']
+
+        assert sketch_sequence(genome)
+        assert sketch_sequence(genome) == \
+            sketch_sequence(reverse_complement(genome))
+
+    def test_similarity(self, genomes):
+        rng = random.Random(3)
+        strain = _mutate(rng, genomes['salmonella'], 0.01)
+
+        same = jaccard(sketch_sequence(strain),
+            sketch_sequence(genomes['salmonella']))
+        different = jaccard(sketch_sequence(strain),
+            sketch_sequence(genomes['escherichia_coli']))
+
+        assert same > 0.5
+        assert different < 0.01
+        assert jaccard(set(), sketch_sequence(strain)) == 0.
+
+    def test_ambiguous_bases_skipped(self):
+        assert sketch_sequence('ACAGTC' + 'N' * 30) == set()
+
+    def test_detect(self, genomes, tmp_path, monkeypatch):
+        genomes_dir = str(tmp_path / 'genomes')
+
+        for species, genome in genomes.items():
+            _write(os.path.join(genomes_dir, species, 'reference.fasta'),
+                [genome[:150000], genome[150000:]])
+
+        cache_path = str(tmp_path / 'cache' / 'sketches.json')
+        index = SketchIndex(genomes_dir, cache_path=cache_path)
+        assert index.species == ['escherichia_coli', 'salmonella']
+
+        rng = random.Random(5)
+        sample = _write(str(tmp_path / 'sample.fasta'), [reverse_complement(
+            _mutate(rng, genomes['escherichia_coli'], 0.01))])
+        unrelated = _write(str(tmp_path / 'unrelated.fasta'),
+            [_genome(rng, 100000)])
+
+        assert index.detect(sample) == 'escherichia_coli'
+        assert index.detect(unrelated) is None
+
+        # The references come from the cache the next time
+        def fail(*args, **kwargs):
+            raise AssertionError('Sketched a cached reference')
+
+        monkeypatch.setattr(sketch, 'sketch_file', fail)
+        index = SketchIndex(genomes_dir, cache_path=cache_path)
+
+        species, similarity = index.closest(sketch_sequence(
+            genomes['salmonella']))
+        assert species == 'salmonella'
+        assert similarity == 1.0
@@ -0,0 +1,89 @@
+###################################################################
+#
+# Tests for how long the commandline tool takes to start up
+#
+# Author: Milan Patel
+# Contact: https://github.com/theMPatel
+# Version 1.0
+#
+###################################################################
+
+import os
+import subprocess as sp
+import sys
+import pytest
+
+_MAIN = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'genomics_tools', '__main__.py')
+
+# How much importing is allowed to add on top of a bare
+# interpreter, in microseconds. Generous so that a slow machine
+# doesn't fail it, but an accidental heavy import will.
+_STARTUP_BUDGET_US = 150000
+
+# These should only be imported by the commands that use them
+_DEFERRED_MODULES = [
+    'pdb',
+    'cProfile',
+    'tracemalloc',
+    'socketserver',
+    'ctypes',
+    'concurrent.futures',
+    'tools.align',
+    'tools.daemon',
+    'tools.profiling',
+    'tools.watcher',
+    'genotyping.mutation_finder'
+]
+
+def _import_times(args):
+    """
+    Runs python with -X importtime and returns back the cumulative
+    microseconds and the nesting depth of every module imported
+    """
+
+    child = sp.run([sys.executable, '-X', 'importtime'] + args,
+        stdout=sp.PIPE, stderr=sp.PIPE, universal_newlines=True)
+
+    times = {}
+
+    for line in child.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+
+        _, cumulative, name = line[len('import time:'):].split('|')
+
+        try:
+            cumulative = int(cumulative)
+
+        except ValueError:
+            # The header
+            continue
+
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        times[name.strip()] = (cumulative, depth)
+
+    return times
+
+def _startup_time(args):
+    # Modules imported by other modules are already counted in
+    # the cumulative time of whoever imported them
+    return sum(cumulative for cumulative, depth in \
+        _import_times(args).values() if depth == 0)
+
+class TestStartup:
+
+    def test_heavy_modules_deferred(self):
+        times = _import_times([_MAIN])
+
+        assert 'tools.environment' in times
+        for module in _DEFERRED_MODULES:
+            assert module not in times, module
+
+    def test_startup_budget(self):
+        # Best of a few to keep a busy machine from failing it
+        startup = min(_startup_time([_MAIN]) - _startup_time(['-c', 'pass']) \
+            for _ in range(3))
+
+        assert startup < _STARTUP_BUDGET_US, \
+            'Startup imports took {} us'.format(startup)
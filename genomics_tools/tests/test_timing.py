@@ -0,0 +1,119 @@
+###################################################################
+#
+# Tests for the timing module
+#
+# Author: Milan Patel
+# Contact: https://github.com/theMPatel
+# Version 1.0
+#
+###################################################################
+
+import json
+import os
+import threading
+import pytest
+
+from genomics_tools.tools.timing import SampleTimer
+from genomics_tools.tools.timing import Tracer
+from genomics_tools.tools.timing import span
+
+class TestTiming:
+
+    @pytest.fixture(autouse=True)
+    def no_tracer(self):
+        Tracer.current = None
+        yield
+        Tracer.current = None
+
+    def test_span_without_listeners(self):
+        with span('nothing'):
+            pass
+
+    def test_sample_timer_adds_up_stages(self, tmp_path):
+        with SampleTimer('sample.fasta') as timer:
+            with span('blastn'):
+                pass
+
+            with span('blastn'):
+                pass
+
+            with span('find_mutations'):
+                pass
+
+        # Spans outside of the sample don't count towards it
+        with span('blastn'):
+            pass
+
+        metrics = timer.metrics()
+        assert metrics['sample'] == 'sample.fasta'
+        assert list(metrics['stages']) == ['blastn', 'find_mutations']
+        assert metrics['stages']['blastn']['calls'] == 2
+        assert metrics['total_seconds'] >= \
+            metrics['stages']['blastn']['seconds']
+
+        path = timer.write(os.path.join(str(tmp_path), 'metrics', 'a.json'))
+
+        with open(path, 'r') as f:
+            assert json.load(f)['stages']['find_mutations']['calls'] == 1
+
+    def test_trace_has_a_row_per_worker(self, tmp_path):
+        tracer = Tracer()
+
+        # Keep both threads alive at the same time so they
+        # can't end up with the same ident
+        barrier = threading.Barrier(2)
+
+        def work(sample):
+            with SampleTimer(sample):
+                with span('blastn'):
+                    barrier.wait()
+
+        threads = [threading.Thread(target=work, args=(sample,),
+            name='worker-{}'.format(i)) for i, sample in \
+                enumerate(['a.fasta', 'b.fasta'])]
+
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+        path = tracer.write(os.path.join(str(tmp_path), 'trace.json'))
+
+        with open(path, 'r') as f:
+            events = json.load(f)['traceEvents']
+
+        spans = [event for event in events if event['ph'] == 'X']
+        names = [event for event in events if event['ph'] == 'M']
+
+        assert len(spans) == 4
+        assert sorted(event['args']['name'] for event in names) == \
+            ['worker-0', 'worker-1']
+        assert len(set(event['tid'] for event in spans)) == 2
+
+        blastn = [event for event in spans if event['name'] == 'blastn']
+        assert sorted(event['args']['sample'] for event in blastn) == \
+            ['a.fasta', 'b.fasta']
+
+    def test_trace_rotates(self, tmp_path):
+        path = os.path.join(str(tmp_path), 'trace.json')
+        tracer = Tracer(rotate_path=path, rotate_events=3)
+
+        for i in range(7):
+            with span('stage-{}'.format(i)):
+                pass
+
+        # Only what wasn't written out yet is kept around
+        assert tracer.rotate() == os.path.join(str(tmp_path),
+            'trace.0003.json')
+        assert tracer.rotate() is None
+        assert not os.path.exists(path)
+
+        names = []
+        for i in range(1, 4):
+            with open(os.path.join(str(tmp_path),
+                'trace.{:04d}.json'.format(i)), 'r') as f:
+                names.extend(event['name'] for event in \
+                    json.load(f)['traceEvents'] if event['ph'] == 'X')
+
+        assert names == ['stage-{}'.format(i) for i in range(7)]
@@ -14,7 +14,11 @@ import pytest
 from genomics_tools.tools.tools import check_b64encoded
 from genomics_tools.tools.tools import check_mismatches
 from genomics_tools.tools.tools import codon_translation
+from genomics_tools.tools.tools import fasta_index
+from genomics_tools.tools.tools import fasta_index_path
 from genomics_tools.tools.tools import fasta_iterator
+from genomics_tools.tools.tools import fasta_sequence_at
+from genomics_tools.tools.tools import fasta_sequences_at
 from genomics_tools.tools.tools import get_all_file_exts
 from genomics_tools.tools.tools import get_non_iupac
 from genomics_tools.tools.tools import is_fasta
@@ -102,6 +106,39 @@ class TestGenericTools:
         records = dict(fasta_iterator(f))
         assert len(records) == 2
 
+    def test_fasta_index(self):
+        lines = (
+                b">SEQUENCE_1 description\n"
+                b"acgtacgt\n"
+                b"ACGT\n"
+                b"\n"
+                b">SEQUENCE_2\n"
+                b"TTTT\n"
+            )
+        f = io.BytesIO(lines)
+        index = list(fasta_index(f))
+
+        assert [(key, length) for key, _, length in index] == \
+            [("SEQUENCE_1", 12), ("SEQUENCE_2", 4)]
+
+        for key, offset, length in index:
+            f.seek(offset)
+            assert f.readline().strip().upper() in (b"ACGTACGT", b"TTTT")
+
+    def test_fasta_sequences_at(self, tmp_path):
+        path = str(tmp_path / "sequences.fasta")
+        with open(path, "w") as f:
+            f.write(">SEQUENCE_1\nacgt\nACGT\n\n>SEQUENCE_2\nTTTT\n"
+                ">SEQUENCE_3\nGGGG\n")
+
+        offsets = [offset for key, offset, _ in fasta_index_path(path)
+            if key != "SEQUENCE_2"]
+
+        assert fasta_sequences_at(path, offsets) == {
+            offset: fasta_sequence_at(path, offset) for offset in offsets}
+        assert sorted(fasta_sequences_at(path, offsets).values()) == \
+            ["ACGTACGT", "GGGG"]
+
     @pytest.mark.parametrize(
         "codon, expected", (
             ("GCT", "A"),
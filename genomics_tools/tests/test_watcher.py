@@ -0,0 +1,61 @@
+###################################################################
+#
+# Tests for the watcher module
+#
+# Author: Milan Patel
+# Contact: https://github.com/theMPatel
+# Version 1.0
+#
+###################################################################
+
+import os
+import pytest
+
+from genomics_tools.tools.watcher import ContentLedger
+from genomics_tools.tools.watcher import DirectoryWatcher
+
+def _write(path, content):
+    with open(path, 'w') as f:
+        f.write(content)
+
+class TestDirectoryWatcher:
+
+    def test_only_stable_files(self, tmp_path):
+        directory = str(tmp_path)
+        sample = os.path.join(directory, 'sample.fasta')
+        _write(sample, '>contig_1\nACGT\n')
+        _write(os.path.join(directory, 'notes.txt'), 'not a sample')
+
+        watcher = DirectoryWatcher(directory, settle_time=5.)
+
+        try:
+            # First sighting, then not settled long enough
+            assert watcher.scan(now=100.) == []
+            assert watcher.scan(now=102.) == []
+
+            # Still being written to
+            with open(sample, 'a') as f:
+                f.write('ACGT\n')
+
+            assert watcher.scan(now=106.) == []
+            assert watcher.scan(now=112.) == [sample]
+
+            # Never handed off twice
+            assert watcher.scan(now=200.) == []
+
+        finally:
+            watcher.close()
+
+class TestContentLedger:
+
+    def test_survives_reload(self, tmp_path):
+        path = os.path.join(str(tmp_path), 'ledger', 'processed.txt')
+
+        ledger = ContentLedger(path)
+        ledger.add('abc', '/some/sample.fasta')
+        ledger.add('abc', '/some/copy.fasta')
+
+        reloaded = ContentLedger(path)
+        assert 'abc' in reloaded
+        assert 'def' not in reloaded
+        assert len(reloaded) == 1